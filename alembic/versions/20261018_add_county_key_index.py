@@ -0,0 +1,34 @@
+"""index incident_requests on the county key alone, for replies with no known state
+
+Revision ID: 20261018_add_county_key_index
+Revises: 20261018_add_state
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_county_key_index'
+down_revision = '20261018_add_state'
+branch_labels = None
+depends_on = None
+
+COUNTY_KEY_INDEX = 'ix_incident_requests_county_key'
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    if 'incident_requests' not in inspector.get_table_names():
+        return
+    # expression index: the inspector does not report it on every backend, hence if_not_exists
+    op.create_index(COUNTY_KEY_INDEX, 'incident_requests', [sa.text('lower(trim(county))')],
+                    unique=False, if_not_exists=True)
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    if 'incident_requests' not in inspector.get_table_names():
+        return
+    op.drop_index(COUNTY_KEY_INDEX, table_name='incident_requests', if_exists=True)
@@ -0,0 +1,42 @@
+"""add idempotency key and matched request id to inbound_emails
+
+Revision ID: 20261018_add_inbound_idempotency
+Revises: 20250829_add_forward_tracking
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_inbound_idempotency'
+down_revision = '20250829_add_forward_tracking'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    cols = [c['name'] for c in inspector.get_columns('inbound_emails')]
+    indexes = [i['name'] for i in inspector.get_indexes('inbound_emails')]
+
+    if 'idempotency_key' not in cols:
+        op.add_column("inbound_emails", sa.Column("idempotency_key", sa.String(), nullable=True))
+    if 'matched_request_id' not in cols:
+        op.add_column("inbound_emails", sa.Column("matched_request_id", sa.Integer(), nullable=True))
+    if 'ix_inbound_emails_idempotency_key' not in indexes:
+        op.create_index('ix_inbound_emails_idempotency_key', 'inbound_emails', ['idempotency_key'], unique=True)
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    cols = [c['name'] for c in inspector.get_columns('inbound_emails')]
+    indexes = [i['name'] for i in inspector.get_indexes('inbound_emails')]
+
+    if 'ix_inbound_emails_idempotency_key' in indexes:
+        op.drop_index('ix_inbound_emails_idempotency_key', table_name='inbound_emails')
+    if 'idempotency_key' in cols:
+        op.drop_column("inbound_emails", "idempotency_key")
+    if 'matched_request_id' in cols:
+        op.drop_column("inbound_emails", "matched_request_id")
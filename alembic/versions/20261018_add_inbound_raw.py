@@ -0,0 +1,51 @@
+"""add compressed inbound_raw table and narrow indexes on inbound_emails
+
+Revision ID: 20261018_add_inbound_raw
+Revises: 20261018_add_inbound_idempotency
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_inbound_raw'
+down_revision = '20261018_add_inbound_idempotency'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    cols = [c['name'] for c in inspector.get_columns('inbound_emails')]
+    indexes = [i['name'] for i in inspector.get_indexes('inbound_emails')]
+
+    if 'inbound_raw' not in inspector.get_table_names():
+        op.create_table(
+            'inbound_raw',
+            sa.Column('inbound_id', sa.Integer(), sa.ForeignKey('inbound_emails.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('codec', sa.String(), nullable=False),
+            sa.Column('text_z', sa.LargeBinary(), nullable=True),
+            sa.Column('html_z', sa.LargeBinary(), nullable=True),
+            sa.Column('headers_z', sa.LargeBinary(), nullable=True),
+            sa.Column('raw_bytes', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('stored_bytes', sa.Integer(), nullable=False, server_default='0'),
+            sa.PrimaryKeyConstraint('inbound_id'),
+        )
+    if 'ix_inbound_emails_sender' not in indexes:
+        op.create_index('ix_inbound_emails_sender', 'inbound_emails', ['sender'], unique=False)
+    if 'created_at' in cols and 'ix_inbound_emails_created_at' not in indexes:
+        op.create_index('ix_inbound_emails_created_at', 'inbound_emails', ['created_at'], unique=False)
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    indexes = [i['name'] for i in inspector.get_indexes('inbound_emails')]
+
+    if 'ix_inbound_emails_created_at' in indexes:
+        op.drop_index('ix_inbound_emails_created_at', table_name='inbound_emails')
+    if 'ix_inbound_emails_sender' in indexes:
+        op.drop_index('ix_inbound_emails_sender', table_name='inbound_emails')
+    if 'inbound_raw' in inspector.get_table_names():
+        op.drop_table('inbound_raw')
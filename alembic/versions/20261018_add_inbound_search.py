@@ -0,0 +1,47 @@
+"""add inbound_search full-text index (tsvector + GIN on Postgres)
+
+Revision ID: 20261018_add_inbound_search
+Revises: 20261018_add_stored_attachments
+Create Date: 2026-10-18
+
+SQLite uses an FTS5 virtual table that app.search creates on first use.
+Existing rows are indexed from their subject / sender / parsed fields / body
+preview here; run `python -m app.search --reindex` afterwards to index full
+bodies from inbound_raw.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_inbound_search'
+down_revision = '20261018_add_stored_attachments'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+    inspector = inspect(conn)
+    if 'inbound_search' in inspector.get_table_names():
+        return
+    op.execute(
+        "CREATE TABLE inbound_search ("
+        " inbound_id integer PRIMARY KEY,"
+        " tsv tsvector NOT NULL)"
+    )
+    op.execute("CREATE INDEX ix_inbound_search_tsv ON inbound_search USING gin (tsv)")
+    op.execute(
+        "INSERT INTO inbound_search (inbound_id, tsv) "
+        "SELECT id, setweight(to_tsvector('simple', lower(concat_ws(' ', subject, sender, parsed_address, "
+        "parsed_county, parsed_datetime))), 'A') || setweight(to_tsvector('simple', lower(coalesce(body, ''))), 'B') "
+        "FROM inbound_emails"
+    )
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+    op.execute("DROP TABLE IF EXISTS inbound_search")
@@ -0,0 +1,48 @@
+"""add normalized match-key index on incident_requests and unmatched-reply index on inbound_emails
+
+Revision ID: 20261018_add_match_key_indexes
+Revises: 20261018_add_inbound_search
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_match_key_indexes'
+down_revision = '20261018_add_inbound_search'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    tables = inspector.get_table_names()
+    req_indexes = [i['name'] for i in inspector.get_indexes('incident_requests')] if 'incident_requests' in tables else None
+    inb_indexes = [i['name'] for i in inspector.get_indexes('inbound_emails')]
+
+    # same expressions app.matching compares on
+    if req_indexes is not None and 'ix_incident_requests_match_key' not in req_indexes:
+        op.create_index(
+            'ix_incident_requests_match_key', 'incident_requests',
+            [sa.text('lower(trim(county))'), sa.text('lower(trim(incident_address))'),
+             sa.text('trim(incident_datetime)')],
+            unique=False,
+        )
+    # the re-match scan only looks at unmatched replies
+    if 'ix_inbound_emails_unmatched' not in inb_indexes:
+        op.create_index(
+            'ix_inbound_emails_unmatched', 'inbound_emails', ['created_at'], unique=False,
+            postgresql_where=sa.text('matched_request_id IS NULL'),
+            sqlite_where=sa.text('matched_request_id IS NULL'),
+        )
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    if 'ix_inbound_emails_unmatched' in [i['name'] for i in inspector.get_indexes('inbound_emails')]:
+        op.drop_index('ix_inbound_emails_unmatched', table_name='inbound_emails')
+    if 'incident_requests' in inspector.get_table_names() and \
+            'ix_incident_requests_match_key' in [i['name'] for i in inspector.get_indexes('incident_requests')]:
+        op.drop_index('ix_incident_requests_match_key', table_name='incident_requests')
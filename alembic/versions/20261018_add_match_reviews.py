@@ -0,0 +1,46 @@
+"""add match_reviews (ambiguous scored matches awaiting a decision)
+
+Revision ID: 20261018_add_match_reviews
+Revises: 20261018_add_parser_templates
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_match_reviews'
+down_revision = '20261018_add_parser_templates'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    if 'match_reviews' not in inspector.get_table_names():
+        op.create_table(
+            'match_reviews',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('inbound_id', sa.Integer(), nullable=False),
+            sa.Column('candidates', sa.Text(), nullable=False),
+            sa.Column('top_score', sa.Float(), nullable=True),
+            sa.Column('status', sa.String(), nullable=False, server_default='pending'),
+            sa.Column('resolved_request_id', sa.Integer(), nullable=True),
+            sa.Column('resolved_by', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.Column('resolved_at', sa.DateTime(timezone=True), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_match_reviews_id', 'match_reviews', ['id'], unique=False)
+        op.create_index('ix_match_reviews_inbound_id', 'match_reviews', ['inbound_id'], unique=False)
+        op.create_index('ix_match_reviews_status', 'match_reviews', ['status'], unique=False)
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    if 'match_reviews' in inspector.get_table_names():
+        op.drop_index('ix_match_reviews_status', table_name='match_reviews')
+        op.drop_index('ix_match_reviews_inbound_id', table_name='match_reviews')
+        op.drop_index('ix_match_reviews_id', table_name='match_reviews')
+        op.drop_table('match_reviews')
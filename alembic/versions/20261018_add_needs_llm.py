@@ -0,0 +1,35 @@
+"""add inbound_emails.needs_llm (LLM parse deferred under load)
+
+Revision ID: 20261018_add_needs_llm
+Revises: 20261018_add_match_reviews
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_needs_llm'
+down_revision = '20261018_add_match_reviews'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    cols = [c['name'] for c in inspector.get_columns('inbound_emails')]
+    indexes = [i['name'] for i in inspector.get_indexes('inbound_emails')]
+
+    if 'needs_llm' not in cols:
+        op.add_column('inbound_emails', sa.Column('needs_llm', sa.Boolean(), nullable=False, server_default=sa.false()))
+    if 'ix_inbound_emails_needs_llm' not in indexes:
+        op.create_index('ix_inbound_emails_needs_llm', 'inbound_emails', ['needs_llm'], unique=False)
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    if 'ix_inbound_emails_needs_llm' in [i['name'] for i in inspector.get_indexes('inbound_emails')]:
+        op.drop_index('ix_inbound_emails_needs_llm', table_name='inbound_emails')
+    if 'needs_llm' in [c['name'] for c in inspector.get_columns('inbound_emails')]:
+        op.drop_column('inbound_emails', 'needs_llm')
@@ -0,0 +1,38 @@
+"""add parser_templates (per-sender-domain extraction labels)
+
+Revision ID: 20261018_add_parser_templates
+Revises: 20261018_add_parser_version
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_parser_templates'
+down_revision = '20261018_add_parser_version'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    if 'parser_templates' not in inspector.get_table_names():
+        op.create_table(
+            'parser_templates',
+            sa.Column('domain', sa.String(), nullable=False),
+            sa.Column('address_label', sa.String(), nullable=True),
+            sa.Column('datetime_label', sa.String(), nullable=True),
+            sa.Column('county_label', sa.String(), nullable=True),
+            sa.Column('support', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('samples', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.PrimaryKeyConstraint('domain'),
+        )
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    if 'parser_templates' in inspector.get_table_names():
+        op.drop_table('parser_templates')
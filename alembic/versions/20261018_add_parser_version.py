@@ -0,0 +1,36 @@
+"""add inbound_emails.parser_version for incremental re-parse
+
+Revision ID: 20261018_add_parser_version
+Revises: 20261018_add_match_key_indexes
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_parser_version'
+down_revision = '20261018_add_match_key_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    cols = [c['name'] for c in inspector.get_columns('inbound_emails')]
+    indexes = [i['name'] for i in inspector.get_indexes('inbound_emails')]
+
+    # existing rows get 0 ("unknown"), so the first re-parse run covers them
+    if 'parser_version' not in cols:
+        op.add_column('inbound_emails', sa.Column('parser_version', sa.Integer(), nullable=False, server_default='0'))
+    if 'ix_inbound_emails_parser_version' not in indexes:
+        op.create_index('ix_inbound_emails_parser_version', 'inbound_emails', ['parser_version'], unique=False)
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    if 'ix_inbound_emails_parser_version' in [i['name'] for i in inspector.get_indexes('inbound_emails')]:
+        op.drop_index('ix_inbound_emails_parser_version', table_name='inbound_emails')
+    if 'parser_version' in [c['name'] for c in inspector.get_columns('inbound_emails')]:
+        op.drop_column('inbound_emails', 'parser_version')
@@ -0,0 +1,85 @@
+"""add denormalized status columns to incident_requests (+ keyset index for "my requests")
+
+Revision ID: 20261018_add_request_status
+Revises: 20261018_add_needs_llm
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_request_status'
+down_revision = '20261018_add_needs_llm'
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    sa.Column('status', sa.String(), nullable=False, server_default='pending'),
+    sa.Column('request_sg_message_id', sa.String(), nullable=True),
+    sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('replied_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('reply_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('last_inbound_id', sa.Integer(), nullable=True),
+    sa.Column('forward_sg_message_id', sa.String(), nullable=True),
+    sa.Column('forwarded_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('delivered_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+]
+REQ_INDEXES = {
+    'ix_incident_requests_created_by_id': ['created_by', 'id'],
+    'ix_incident_requests_request_sg_message_id': ['request_sg_message_id'],
+    'ix_incident_requests_forward_sg_message_id': ['forward_sg_message_id'],
+}
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    inb_indexes = [i['name'] for i in inspector.get_indexes('inbound_emails')]
+    # the SendGrid event webhook looks forwards up by message id
+    if 'ix_inbound_emails_forward_sg_message_id' not in inb_indexes:
+        op.create_index('ix_inbound_emails_forward_sg_message_id', 'inbound_emails', ['forward_sg_message_id'],
+                        unique=False)
+    if 'incident_requests' not in inspector.get_table_names():
+        return
+    cols = [c['name'] for c in inspector.get_columns('incident_requests')]
+    req_indexes = [i['name'] for i in inspector.get_indexes('incident_requests')]
+
+    for col in COLUMNS:
+        if col.name not in cols:
+            op.add_column('incident_requests', col)
+    for name, on in REQ_INDEXES.items():
+        if name not in req_indexes:
+            op.create_index(name, 'incident_requests', on, unique=False)
+
+    # backfill from matched replies; requests before this revision are assumed sent
+    op.execute(
+        "UPDATE incident_requests SET "
+        "reply_count = (SELECT count(*) FROM inbound_emails e WHERE e.matched_request_id = incident_requests.id), "
+        "replied_at = (SELECT min(e.created_at) FROM inbound_emails e WHERE e.matched_request_id = incident_requests.id), "
+        "last_inbound_id = (SELECT max(e.id) FROM inbound_emails e WHERE e.matched_request_id = incident_requests.id), "
+        "forwarded_at = (SELECT max(e.forwarded_at) FROM inbound_emails e WHERE e.matched_request_id = incident_requests.id)"
+    )
+    op.execute(
+        "UPDATE incident_requests SET status = CASE "
+        "WHEN forwarded_at IS NOT NULL THEN 'forwarded' "
+        "WHEN replied_at IS NOT NULL THEN 'replied' ELSE 'sent' END "
+        "WHERE status = 'pending'"
+    )
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    if 'ix_inbound_emails_forward_sg_message_id' in [i['name'] for i in inspector.get_indexes('inbound_emails')]:
+        op.drop_index('ix_inbound_emails_forward_sg_message_id', table_name='inbound_emails')
+    if 'incident_requests' not in inspector.get_table_names():
+        return
+    req_indexes = [i['name'] for i in inspector.get_indexes('incident_requests')]
+    for name in REQ_INDEXES:
+        if name in req_indexes:
+            op.drop_index(name, table_name='incident_requests')
+    cols = [c['name'] for c in inspector.get_columns('incident_requests')]
+    for col in reversed(COLUMNS):
+        if col.name in cols:
+            op.drop_column('incident_requests', col.name)
@@ -0,0 +1,33 @@
+"""add incident_requests.row_version (ETag validator for "my requests")
+
+Revision ID: 20261018_add_row_version
+Revises: 20261018_add_request_status
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_row_version'
+down_revision = '20261018_add_request_status'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    if 'incident_requests' not in inspector.get_table_names():
+        return
+    if 'row_version' not in [c['name'] for c in inspector.get_columns('incident_requests')]:
+        op.add_column('incident_requests',
+                      sa.Column('row_version', sa.Integer(), nullable=False, server_default='1'))
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    if 'incident_requests' not in inspector.get_table_names():
+        return
+    if 'row_version' in [c['name'] for c in inspector.get_columns('incident_requests')]:
+        op.drop_column('incident_requests', 'row_version')
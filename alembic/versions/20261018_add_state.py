@@ -0,0 +1,44 @@
+"""key county requests and replies by state: incident_requests.state, inbound_emails.parsed_state
+
+Revision ID: 20261018_add_state
+Revises: 20261018_add_row_version
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_state'
+down_revision = '20261018_add_row_version'
+branch_labels = None
+depends_on = None
+
+STATE_COUNTY_INDEX = 'ix_incident_requests_state_county'
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    if 'parsed_state' not in [c['name'] for c in inspector.get_columns('inbound_emails')]:
+        op.add_column('inbound_emails', sa.Column('parsed_state', sa.String(length=2), nullable=True))
+    if 'incident_requests' not in inspector.get_table_names():
+        return
+    # every request before this revision went to the California directory
+    if 'state' not in [c['name'] for c in inspector.get_columns('incident_requests')]:
+        op.add_column('incident_requests',
+                      sa.Column('state', sa.String(length=2), nullable=False, server_default='CA'))
+    # expression index: the inspector does not report it on every backend, hence if_not_exists
+    op.create_index(STATE_COUNTY_INDEX, 'incident_requests', ['state', sa.text('lower(trim(county))')],
+                    unique=False, if_not_exists=True)
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    if 'parsed_state' in [c['name'] for c in inspector.get_columns('inbound_emails')]:
+        op.drop_column('inbound_emails', 'parsed_state')
+    if 'incident_requests' not in inspector.get_table_names():
+        return
+    op.drop_index(STATE_COUNTY_INDEX, table_name='incident_requests', if_exists=True)
+    if 'state' in [c['name'] for c in inspector.get_columns('incident_requests')]:
+        op.drop_column('incident_requests', 'state')
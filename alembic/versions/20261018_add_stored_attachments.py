@@ -0,0 +1,44 @@
+"""add stored_attachments table for link-forwarded attachments
+
+Revision ID: 20261018_add_stored_attachments
+Revises: 20261018_partition_inbound_emails
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_stored_attachments'
+down_revision = '20261018_partition_inbound_emails'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if 'stored_attachments' not in inspector.get_table_names():
+        op.create_table(
+            'stored_attachments',
+            sa.Column('id', sa.String(), nullable=False),
+            sa.Column('inbound_id', sa.Integer(), nullable=True),
+            sa.Column('filename', sa.String(), nullable=False),
+            sa.Column('content_type', sa.String(), nullable=False, server_default='application/octet-stream'),
+            sa.Column('size', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('sha256', sa.String(), nullable=False),
+            sa.Column('path', sa.String(), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_stored_attachments_inbound_id', 'stored_attachments', ['inbound_id'], unique=False)
+        op.create_index('ix_stored_attachments_sha256', 'stored_attachments', ['sha256'], unique=False)
+        op.create_index('ix_stored_attachments_expires_at', 'stored_attachments', ['expires_at'], unique=False)
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    if 'stored_attachments' in inspector.get_table_names():
+        op.drop_table('stored_attachments')
@@ -0,0 +1,160 @@
+"""move idempotency keys to inbound_idempotency; range-partition inbound_emails by month (Postgres)
+
+Revision ID: 20261018_partition_inbound_emails
+Revises: 20261018_add_inbound_raw
+Create Date: 2026-10-18
+
+Postgres cannot enforce a unique index (or an incoming FK) on a partitioned
+table unless it includes the partition key, so:
+  * idempotency keys move to their own table (primary key = key),
+  * the inbound_raw -> inbound_emails FK is dropped,
+  * inbound_emails is rebuilt as PARTITION BY RANGE (created_at) with one
+    partition per month (plus a DEFAULT partition) and the rows copied over.
+SQLite only gets the idempotency change.
+"""
+
+from datetime import date, datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = '20261018_partition_inbound_emails'
+down_revision = '20261018_add_inbound_raw'
+branch_labels = None
+depends_on = None
+
+AHEAD = 2
+
+def _add_months(d, n):
+    m = d.month - 1 + n
+    return date(d.year + m // 12, m % 12 + 1, 1)
+
+def _ensure_created_at(inspector):
+    # older databases built purely from this migration chain never got created_at
+    cols = [c['name'] for c in inspector.get_columns('inbound_emails')]
+    indexes = [i['name'] for i in inspector.get_indexes('inbound_emails')]
+    if 'created_at' not in cols:
+        with op.batch_alter_table('inbound_emails') as batch:
+            batch.add_column(sa.Column('created_at', sa.DateTime(timezone=True),
+                                       server_default=sa.func.now(), nullable=False))
+    if 'ix_inbound_emails_created_at' not in indexes:
+        op.create_index('ix_inbound_emails_created_at', 'inbound_emails', ['created_at'])
+
+def _move_idempotency_keys(conn, inspector):
+    if 'inbound_idempotency' not in inspector.get_table_names():
+        op.create_table(
+            'inbound_idempotency',
+            sa.Column('key', sa.String(), nullable=False),
+            sa.Column('inbound_id', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.PrimaryKeyConstraint('key'),
+        )
+        op.create_index('ix_inbound_idempotency_inbound_id', 'inbound_idempotency', ['inbound_id'])
+        op.create_index('ix_inbound_idempotency_created_at', 'inbound_idempotency', ['created_at'])
+
+    cols = [c['name'] for c in inspector.get_columns('inbound_emails')]
+    if 'idempotency_key' in cols:
+        op.execute(
+            "INSERT INTO inbound_idempotency (key, inbound_id, created_at) "
+            "SELECT idempotency_key, id, created_at FROM inbound_emails WHERE idempotency_key IS NOT NULL"
+        )
+        indexes = [i['name'] for i in inspector.get_indexes('inbound_emails')]
+        with op.batch_alter_table('inbound_emails') as batch:
+            if 'ix_inbound_emails_idempotency_key' in indexes:
+                batch.drop_index('ix_inbound_emails_idempotency_key')
+            batch.drop_column('idempotency_key')
+
+def _partition(conn):
+    is_partitioned = conn.exec_driver_sql(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = 'inbound_emails'"
+    ).scalar()
+    if is_partitioned:
+        return
+
+    for fk in inspect(conn).get_foreign_keys('inbound_raw'):
+        if fk.get('referred_table') == 'inbound_emails' and fk.get('name'):
+            op.drop_constraint(fk['name'], 'inbound_raw', type_='foreignkey')
+
+    seq = conn.exec_driver_sql("SELECT pg_get_serial_sequence('inbound_emails', 'id')").scalar()
+    op.execute("ALTER TABLE inbound_emails RENAME TO inbound_emails_legacy")
+    op.execute("ALTER INDEX IF EXISTS inbound_emails_pkey RENAME TO inbound_emails_legacy_pkey")
+    for name in ('ix_inbound_emails_id', 'ix_inbound_emails_sender', 'ix_inbound_emails_created_at'):
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute(
+        "CREATE TABLE inbound_emails (LIKE inbound_emails_legacy INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (created_at)"
+    )
+    op.execute("ALTER TABLE inbound_emails ADD PRIMARY KEY (id, created_at)")
+    if seq:
+        op.execute(f"ALTER SEQUENCE {seq} OWNED BY inbound_emails.id")
+
+    oldest = conn.exec_driver_sql("SELECT MIN(created_at) FROM inbound_emails_legacy").scalar()
+    today = datetime.now(timezone.utc).date()
+    month = date((oldest or today).year, (oldest or today).month, 1)
+    last = _add_months(date(today.year, today.month, 1), AHEAD)
+    while month <= last:
+        nxt = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE inbound_emails_p{month:%Y%m} PARTITION OF inbound_emails "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{nxt.isoformat()}')"
+        )
+        month = nxt
+    op.execute("CREATE TABLE inbound_emails_pdefault PARTITION OF inbound_emails DEFAULT")
+
+    op.execute("INSERT INTO inbound_emails SELECT * FROM inbound_emails_legacy")
+    op.execute("DROP TABLE inbound_emails_legacy")
+
+    op.create_index('ix_inbound_emails_id', 'inbound_emails', ['id'])
+    op.create_index('ix_inbound_emails_sender', 'inbound_emails', ['sender'])
+    op.create_index('ix_inbound_emails_created_at', 'inbound_emails', ['created_at'])
+
+def _unpartition(conn):
+    is_partitioned = conn.exec_driver_sql(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = 'inbound_emails'"
+    ).scalar()
+    if not is_partitioned:
+        return
+    seq = conn.exec_driver_sql("SELECT pg_get_serial_sequence('inbound_emails', 'id')").scalar()
+    op.execute("ALTER TABLE inbound_emails RENAME TO inbound_emails_partitioned")
+    op.execute("ALTER INDEX IF EXISTS inbound_emails_pkey RENAME TO inbound_emails_partitioned_pkey")
+    for name in ('ix_inbound_emails_id', 'ix_inbound_emails_sender', 'ix_inbound_emails_created_at'):
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute("CREATE TABLE inbound_emails (LIKE inbound_emails_partitioned INCLUDING DEFAULTS)")
+    op.execute("ALTER TABLE inbound_emails ADD PRIMARY KEY (id)")
+    if seq:
+        op.execute(f"ALTER SEQUENCE {seq} OWNED BY inbound_emails.id")
+    op.execute("INSERT INTO inbound_emails SELECT * FROM inbound_emails_partitioned")
+    op.execute("DROP TABLE inbound_emails_partitioned CASCADE")
+    op.create_index('ix_inbound_emails_id', 'inbound_emails', ['id'])
+    op.create_index('ix_inbound_emails_sender', 'inbound_emails', ['sender'])
+    op.create_index('ix_inbound_emails_created_at', 'inbound_emails', ['created_at'])
+    op.create_foreign_key('inbound_raw_inbound_id_fkey', 'inbound_raw', 'inbound_emails',
+                          ['inbound_id'], ['id'], ondelete='CASCADE')
+
+def upgrade():
+    conn = op.get_bind()
+    _ensure_created_at(inspect(conn))
+    _move_idempotency_keys(conn, inspect(conn))
+    if conn.dialect.name == 'postgresql':
+        _partition(conn)
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == 'postgresql':
+        _unpartition(conn)
+
+    inspector = inspect(conn)
+    cols = [c['name'] for c in inspector.get_columns('inbound_emails')]
+    if 'idempotency_key' not in cols:
+        op.add_column("inbound_emails", sa.Column("idempotency_key", sa.String(), nullable=True))
+        op.execute(
+            "UPDATE inbound_emails SET idempotency_key = "
+            "(SELECT k.key FROM inbound_idempotency k WHERE k.inbound_id = inbound_emails.id)"
+        )
+        op.create_index('ix_inbound_emails_idempotency_key', 'inbound_emails', ['idempotency_key'], unique=True)
+    if 'inbound_idempotency' in inspector.get_table_names():
+        op.drop_table('inbound_idempotency')
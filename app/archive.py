@@ -0,0 +1,259 @@
+# ================================
+# FILE: app/archive.py
+# ================================
+"""
+Retention / archival for inbound_emails.
+
+Postgres: inbound_emails is range-partitioned by created_at (one partition per
+month, see alembic 20261018_partition_inbound_emails). Partitions entirely older
+than the retention window are exported to gzip'd NDJSON, then detached (and
+dropped with --drop). Rows older than the cutoff that sit in the DEFAULT
+partition (written before their month existed) are exported the same way and
+deleted, since a partition cannot be detached in part. `ensure_partitions` pre-creates upcoming months. Postgres
+refuses to create a partition while the DEFAULT partition holds rows in its
+range, so such rows are first moved into a standalone table, which is then
+attached as the month's partition.
+
+SQLite: no partitions; rows older than the cutoff are exported month by month
+and deleted (archive-and-delete mode).
+
+    python -m app.archive --retain-months 6 --out /var/lib/irh/archive [--drop]
+"""
+import os
+import re
+import gzip
+import json
+import base64
+import logging
+import argparse
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app import search
+from app.raw_store import decompress
+
+log = logging.getLogger("uvicorn.error").getChild("archive")
+
+ARCHIVE_DIR      = os.getenv("ARCHIVE_DIR", "./archive")
+RETENTION_MONTHS = int(os.getenv("RETENTION_MONTHS", "6"))
+PARTITIONS_AHEAD = int(os.getenv("PARTITIONS_AHEAD", "2"))
+BATCH_SIZE       = 1000
+
+PARENT = "inbound_emails"
+DEFAULT_PARTITION = f"{PARENT}_pdefault"
+PARTITION_RE = re.compile(r"^inbound_emails_p(\d{4})(\d{2})$")
+
+
+def _add_months(d: date, n: int) -> date:
+    m = d.month - 1 + n
+    return date(d.year + m // 12, m % 12 + 1, 1)
+
+
+def _month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month:%Y%m}"
+
+
+def cutoff_for(retain_months: int, today: date | None = None) -> date:
+    """First day of the oldest month that is kept."""
+    return _add_months(_month_start(today or datetime.now(timezone.utc).date()), -retain_months)
+
+
+def _row_json(row: dict) -> str:
+    codec = row.pop("codec", None)
+    for part in ("text", "html", "headers"):
+        blob = row.pop(f"{part}_z", None)
+        if codec and blob is not None:
+            try:
+                row[part] = decompress(bytes(blob), codec)
+            except Exception:
+                # keep the bytes if this host can't decode them (e.g. zstd without zstandard)
+                row[f"{part}_z"] = base64.b64encode(bytes(blob)).decode()
+                row["codec"] = codec
+    return json.dumps(row, default=str, ensure_ascii=False)
+
+
+def _export(engine: Engine, where: str, params: dict, dest: Path, table: str = PARENT) -> int:
+    """Stream matching inbound rows (with raw content) into a gzip'd NDJSON file."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    sql = text(
+        f"SELECT e.*, r.codec, r.text_z, r.html_z, r.headers_z "
+        f"FROM {table} e LEFT JOIN inbound_raw r ON r.inbound_id = e.id WHERE {where} ORDER BY e.id"
+    )
+    n = 0
+    tmp = dest.with_suffix(dest.suffix + ".part")
+    with engine.connect() as conn, gzip.open(tmp, "wt", encoding="utf-8") as fh:
+        result = conn.execution_options(stream_results=True, yield_per=BATCH_SIZE).execute(sql, params)
+        for row in result.mappings():
+            fh.write(_row_json(dict(row)) + "\n")
+            n += 1
+    tmp.replace(dest)
+    return n
+
+
+def _delete_side_rows(conn, where: str, params: dict, table: str = PARENT) -> None:
+    ids = f"SELECT id FROM {table} e WHERE {where}"
+    conn.execute(text(f"DELETE FROM inbound_raw WHERE inbound_id IN ({ids})"), params)
+    conn.execute(text(f"DELETE FROM inbound_idempotency WHERE inbound_id IN ({ids})"), params)
+    conn.execute(text(f"DELETE FROM match_reviews WHERE inbound_id IN ({ids})"), params)
+    search.delete_where(conn, ids, params)
+
+
+# ---------- Postgres (partitioned) ----------
+
+def list_partitions(engine: Engine) -> list[str]:
+    sql = text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent ORDER BY c.relname"
+    )
+    with engine.connect() as conn:
+        return [r[0] for r in conn.execute(sql, {"parent": PARENT})]
+
+
+def ensure_partitions(engine: Engine, ahead: int = PARTITIONS_AHEAD, today: date | None = None) -> list[str]:
+    """Create monthly partitions for the current month and `ahead` months after it."""
+    existing = set(list_partitions(engine))
+    start = _month_start(today or datetime.now(timezone.utc).date())
+    created = []
+    with engine.begin() as conn:
+        for i in range(ahead + 1):
+            lo, hi = _add_months(start, i), _add_months(start, i + 1)
+            name = partition_name(lo)
+            if name in existing:
+                continue
+            bounds = f"FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"
+            in_range = "created_at >= :lo AND created_at < :hi"
+            params = {"lo": lo, "hi": hi}
+            stray = DEFAULT_PARTITION in existing and conn.execute(text(
+                f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})"), params).scalar()
+            if not stray:
+                conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT} FOR VALUES {bounds}"))
+            else:
+                # rows that landed in DEFAULT before the month existed: move them, then attach
+                conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+                moved = conn.execute(text(
+                    f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_range} RETURNING *) "
+                    f"INSERT INTO {name} SELECT * FROM moved"), params).rowcount
+                conn.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+                log.info("[archive] %s: moved %d row(s) out of %s", name, moved, DEFAULT_PARTITION)
+            created.append(name)
+    if created:
+        log.info("[archive] created partitions: %s", ", ".join(created))
+    return created
+
+
+def archive_partitions(engine: Engine, out_dir: Path, retain_months: int, drop: bool = False) -> list[str]:
+    """
+    Export + detach every monthly partition that ends before the retention
+    cutoff, then export + delete the DEFAULT partition's rows older than it.
+    """
+    cutoff = cutoff_for(retain_months)
+    done = []
+    partitions = list_partitions(engine)
+    for name in partitions:
+        m = PARTITION_RE.match(name)
+        if not m:
+            continue  # default partition: swept by created_at below
+        lo = date(int(m.group(1)), int(m.group(2)), 1)
+        if _add_months(lo, 1) > cutoff:
+            continue
+        where = "e.created_at >= :lo AND e.created_at < :hi"
+        params = {"lo": lo, "hi": _add_months(lo, 1)}
+        n = _export(engine, where, params, out_dir / f"{name}.ndjson.gz")
+        with engine.begin() as conn:
+            _delete_side_rows(conn, where, params)
+            conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+            if drop:
+                conn.execute(text(f"DROP TABLE {name}"))
+        log.info("[archive] %s: exported %d row(s), detached%s", name, n, " + dropped" if drop else "")
+        done.append(name)
+    if DEFAULT_PARTITION in partitions and _sweep_default(engine, out_dir, cutoff):
+        done.append(DEFAULT_PARTITION)
+    return done
+
+
+def _sweep_default(engine: Engine, out_dir: Path, cutoff: date) -> int:
+    """Export + delete DEFAULT-partition rows older than the cutoff; returns how many."""
+    where = "e.created_at < :cutoff"
+    params = {"cutoff": cutoff}
+    dest = out_dir / f"{DEFAULT_PARTITION}_before{cutoff:%Y%m}.ndjson.gz"
+    n = _export(engine, where, params, dest, table=DEFAULT_PARTITION)
+    if not n:
+        dest.unlink(missing_ok=True)
+        return 0
+    with engine.begin() as conn:
+        _delete_side_rows(conn, where, params, table=DEFAULT_PARTITION)
+        conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} e WHERE {where}"), params)
+    log.info("[archive] %s: exported + deleted %d row(s) older than %s", DEFAULT_PARTITION, n, cutoff)
+    return n
+
+
+# ---------- SQLite (archive-and-delete) ----------
+
+def archive_and_delete(engine: Engine, out_dir: Path, retain_months: int) -> list[str]:
+    """Export rows older than the cutoff month by month, then delete them."""
+    cutoff = cutoff_for(retain_months)
+    with engine.connect() as conn:
+        oldest = conn.execute(text(f"SELECT MIN(created_at) FROM {PARENT}")).scalar()
+    if not oldest:
+        return []
+    if isinstance(oldest, str):
+        oldest = datetime.fromisoformat(oldest)
+    done = []
+    month = _month_start(oldest.date() if isinstance(oldest, datetime) else oldest)
+    while month < cutoff:
+        nxt = _add_months(month, 1)
+        # SQLite stores timestamps as text; compare on the ISO prefix
+        where = "e.created_at >= :lo AND e.created_at < :hi"
+        params = {"lo": month.isoformat(), "hi": nxt.isoformat()}
+        name = partition_name(month)
+        n = _export(engine, where, params, out_dir / f"{name}.ndjson.gz")
+        if n:
+            with engine.begin() as conn:
+                _delete_side_rows(conn, where, params)
+                conn.execute(text(f"DELETE FROM {PARENT} WHERE id IN (SELECT id FROM {PARENT} e WHERE {where})"), params)
+            log.info("[archive] %s: exported + deleted %d row(s)", name, n)
+            done.append(name)
+        else:
+            (out_dir / f"{name}.ndjson.gz").unlink(missing_ok=True)
+        month = nxt
+    return done
+
+
+def run(engine: Engine, out_dir: str | Path = ARCHIVE_DIR, retain_months: int = RETENTION_MONTHS,
+        drop: bool = False) -> list[str]:
+    out = Path(out_dir)
+    if engine.dialect.name == "postgresql":
+        ensure_partitions(engine)
+        return archive_partitions(engine, out, retain_months, drop=drop)
+    return archive_and_delete(engine, out, retain_months)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Archive old inbound_emails to gzip'd NDJSON")
+    ap.add_argument("--retain-months", type=int, default=RETENTION_MONTHS)
+    ap.add_argument("--out", default=ARCHIVE_DIR)
+    ap.add_argument("--drop", action="store_true", help="Postgres: drop partitions after detaching")
+    args = ap.parse_args()
+
+    from app.database import engine
+    from app.database import SessionLocal
+    from app.attachment_store import purge_expired
+    done = run(engine, args.out, args.retain_months, drop=args.drop)
+    db = SessionLocal()
+    try:
+        purged = purge_expired(db)
+    finally:
+        db.close()
+    print(json.dumps({"archived": done, "expired_attachments": purged}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# ================================
+# FILE: app/attachment_store.py
+# ================================
+"""
+Local storage + signed links for attachments too large to forward by email.
+
+SendGrid caps the whole message (after base64, which adds a third) at 30 MB.
+When a reply's attachments exceed ATTACHMENT_INLINE_MAX_BYTES, the largest
+files are moved into ATTACHMENT_DIR (content-addressed by sha256, so a retry
+or a second forward does not copy the bytes again) and the requester gets
+time-limited links instead. The files never get read into Python memory
+or base64-encoded.
+
+Links are /attachments/{id}?exp=<unix>&sig=<hmac>, where sig is
+HMAC-SHA256(SECRET_KEY, "id.exp"). The download route serves them with
+FileResponse, which supports Range requests. With
+ATTACHMENT_ACCEL_REDIRECT=/protected/ the app only returns an X-Accel-Redirect
+header, and nginx sends the file itself with sendfile.
+"""
+import os
+import hmac
+import shutil
+import hashlib
+import logging
+import secrets
+import base64
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Dict, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import SECRET_KEY
+
+log = logging.getLogger("uvicorn.error").getChild("attachment_store")
+
+ATTACHMENT_DIR = Path(os.getenv("ATTACHMENT_DIR", "/tmp/irh_attachments"))
+# raw bytes we still send inline; base64 makes 22 MB ~= 29.3 MB on the wire
+ATTACHMENT_INLINE_MAX_BYTES = int(os.getenv("ATTACHMENT_INLINE_MAX_BYTES", str(22 * 1024 * 1024)))
+ATTACHMENT_LINK_TTL_SECS    = int(os.getenv("ATTACHMENT_LINK_TTL_SECS", str(7 * 24 * 3600)))
+PUBLIC_BASE_URL             = os.getenv("PUBLIC_BASE_URL", "https://incidentreports-1.onrender.com").rstrip("/")
+ATTACHMENT_ACCEL_REDIRECT   = os.getenv("ATTACHMENT_ACCEL_REDIRECT", "")  # e.g. /protected/ (nginx internal location)
+
+
+def split_for_email(files: List[Dict], limit: int | None = None) -> Tuple[List[Dict], List[Dict]]:
+    """
+    (inline, linked): keep the smallest files inline while the running total fits
+    under `limit`; everything else goes out as a link.
+    """
+    limit = ATTACHMENT_INLINE_MAX_BYTES if limit is None else limit
+    inline, linked, total = [], [], 0
+    for f in sorted(files, key=lambda f: _size(f)):
+        size = _size(f)
+        if total + size <= limit:
+            inline.append(f)
+            total += size
+        else:
+            linked.append(f)
+    return inline, linked
+
+
+def _size(f: Dict) -> int:
+    if "size" not in f:
+        try:
+            f["size"] = os.path.getsize(f["path"])
+        except OSError:
+            f["size"] = 0
+    return f["size"]
+
+
+def _sign(att_id: str, exp: int) -> str:
+    mac = hmac.new(SECRET_KEY.encode(), f"{att_id}.{exp}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(mac).rstrip(b"=").decode()
+
+
+def verify(att_id: str, exp: int, sig: str, now: datetime | None = None) -> str | None:
+    """None when the link is valid; otherwise 'bad_signature' or 'expired'."""
+    if not hmac.compare_digest(_sign(att_id, exp), sig or ""):
+        return "bad_signature"
+    now = now or datetime.now(timezone.utc)
+    if exp < int(now.timestamp()):
+        return "expired"
+    return None
+
+
+def download_url(att: models.StoredAttachment) -> str:
+    exp = int(_aware(att.expires_at).timestamp())
+    return f"{PUBLIC_BASE_URL}/attachments/{att.id}?exp={exp}&sig={_sign(att.id, exp)}"
+
+
+def _aware(dt: datetime) -> datetime:
+    # SQLite hands back naive datetimes
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def store(db: Session, inbound_id: int | None, f: Dict, ttl_secs: int | None = None) -> models.StoredAttachment:
+    """Move a saved upload into ATTACHMENT_DIR and record it (commits)."""
+    ttl_secs = ATTACHMENT_LINK_TTL_SECS if ttl_secs is None else ttl_secs
+    digest = f.get("sha256") or _file_sha256(f["path"])
+    dest = ATTACHMENT_DIR / digest[:2] / digest
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.exists():
+        Path(f["path"]).unlink(missing_ok=True)  # same bytes already stored
+    else:
+        shutil.move(f["path"], dest)  # rename when on the same filesystem
+    att = models.StoredAttachment(
+        id=secrets.token_urlsafe(18),
+        inbound_id=inbound_id,
+        filename=f.get("filename") or "file",
+        content_type=f.get("type") or "application/octet-stream",
+        size=_size(f),
+        sha256=digest,
+        path=str(dest),
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=ttl_secs),
+    )
+    db.add(att); db.commit(); db.refresh(att)
+    return att
+
+
+def as_file(att: models.StoredAttachment) -> Dict:
+    """File dict (as built by /inbound) for an already-stored attachment."""
+    return {"path": att.path, "filename": att.filename, "type": att.content_type, "size": att.size,
+            "sha256": att.sha256, "stored": att.id}
+
+
+def store_as_links(db: Session, inbound_id: int | None, files: List[Dict]) -> List[Dict]:
+    """Store each file and return [{filename, size, url, expires_at}] for the forward email."""
+    links = []
+    for f in files:
+        if f.get("stored"):
+            # kept from an earlier delivery: just make sure the link lives a full TTL
+            att = db.get(models.StoredAttachment, f["stored"])
+            att.expires_at = max(_aware(att.expires_at),
+                                 datetime.now(timezone.utc) + timedelta(seconds=ATTACHMENT_LINK_TTL_SECS))
+            db.commit()
+        else:
+            att = store(db, inbound_id, f)
+        links.append({"filename": att.filename, "size": att.size, "url": download_url(att),
+                      "expires_at": _aware(att.expires_at)})
+        log.info("[attachments] stored %s (%d bytes) as %s", att.filename, att.size, att.id)
+    return links
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def purge_expired(db: Session, now: datetime | None = None) -> int:
+    """Delete expired rows, and their files when no other row still points at them."""
+    now = now or datetime.now(timezone.utc)
+    expired = db.query(models.StoredAttachment).filter(models.StoredAttachment.expires_at < now).all()
+    paths = {a.path for a in expired}
+    for a in expired:
+        db.delete(a)
+    db.commit()
+    still_used = {p for (p,) in db.query(models.StoredAttachment.path)
+                  .filter(models.StoredAttachment.path.in_(paths)).all()} if paths else set()
+    for p in paths - still_used:
+        Path(p).unlink(missing_ok=True)
+    return len(expired)
@@ -1,13 +1,14 @@
 # =============================
 # FILE: app/config.py
 # =============================
-import os, json, csv, logging
+import os, sys, json, csv, logging
 from pathlib import Path
 from dotenv import load_dotenv
 
 log = logging.getLogger("uvicorn.error").getChild("config")
 
-# Load .env from repo root (helpful locally)
+# Load .env from repo root (helpful locally). This is the only place .env is read;
+# main.py imports this module first so later modules see the values.
 root_env = Path(__file__).resolve().parent.parent / ".env"
 if root_env.exists():
     load_dotenv(dotenv_path=root_env, override=True)
@@ -34,39 +35,114 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
 # --- County contact sources ---
 # 1) CSV (primary; your original flow). Set COUNTY_CSV_PATH to an absolute or app-relative path.
 #    Example: /opt/render/project/src/ca_all_counties_fire_records_contacts.csv
+#    An optional 'state' column (code or name) keys rows by (state, county); rows without one
+#    belong to COUNTY_DEFAULT_STATE, so the California-only file keeps working as is.
 COUNTY_CSV_PATH   = os.getenv("COUNTY_CSV_PATH", "ca_all_counties_fire_records_contacts_template.csv")
 
-# 2) Env JSON fallback (optional)
+# 2) Env JSON fallback (optional). Keys are "County" (default state) or "ST:County".
 COUNTY_EMAIL_MAP_JSON = os.getenv("COUNTY_EMAIL_MAP", "")
 
+COUNTY_DEFAULT_STATE = os.getenv("COUNTY_DEFAULT_STATE", "CA").upper()
+
+# shared mailbox providers say nothing about which state a sender is in
+_FREEMAIL_DOMAINS = {"gmail.com", "yahoo.com", "outlook.com", "hotmail.com", "aol.com", "icloud.com"}
+
+class CountyDirectory:
+    """
+    (state, county) -> records email, for ~3,100 counties in a few hundred KB.
+
+    Keys are (two-letter state, county_key) tuples; every string is interned, so
+    the 50-odd state codes and the (far fewer than counties) inboxes are held once.
+    Two side tables answer the inference questions without a scan:
+    county key -> states that have it, and email domain -> states it serves.
+    """
+    __slots__ = ("entries", "by_county", "by_domain")
+
+    def __init__(self, rows: list[tuple[str, str, str]]):
+        from app.county_index import county_key
+        intern = sys.intern
+        self.entries: dict[tuple[str, str], tuple[str, str]] = {}  # (state, key) -> (name, email)
+        by_county: dict[str, set[str]] = {}
+        by_domain: dict[str, set[str]] = {}
+        for state, name, email in rows:
+            state, key = intern(state), intern(county_key(name))
+            if not key:
+                continue
+            self.entries[(state, key)] = (intern(name.strip()), intern(email.strip()))
+            by_county.setdefault(key, set()).add(state)
+            domain = email.rpartition("@")[2].strip().lower()
+            if domain and domain not in _FREEMAIL_DOMAINS:
+                by_domain.setdefault(intern(domain), set()).add(state)
+        self.by_county = {k: tuple(sorted(v)) for k, v in by_county.items()}
+        self.by_domain = {k: tuple(sorted(v)) for k, v in by_domain.items()}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _get(self, state: str | None, county: str) -> tuple[str, str] | None:
+        from app.county_index import county_key
+        return self.entries.get(((state or COUNTY_DEFAULT_STATE).upper(), county_key(county)))
+
+    def email(self, state: str | None, county: str) -> str | None:
+        hit = self._get(state, county)
+        return hit[1] if hit else None
+
+    def canonical(self, state: str | None, county: str) -> str | None:
+        """The directory's spelling of `county` in `state`; None if it is not listed."""
+        hit = self._get(state, county)
+        return hit[0] if hit else None
+
+    def states_for(self, county: str) -> tuple[str, ...]:
+        from app.county_index import county_key
+        return self.by_county.get(county_key(county), ())
+
+    def states_for_domain(self, domain: str) -> tuple[str, ...]:
+        return self.by_domain.get((domain or "").strip().lower(), ())
+
+    def as_dict(self) -> dict[tuple[str, str], str]:
+        return {(state, name): email for (state, _), (name, email) in self.entries.items()}
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "states": len({s for s, _ in self.entries}),
+                "domains": len(self.by_domain)}
+
 # Cache to avoid re-parsing on every request
-__COUNTY_MAP_CACHE: dict[str, str] | None = None
+__COUNTY_DIRECTORY: CountyDirectory | None = None
+
+def _split_key(key: str) -> tuple[str, str]:
+    """'FL:Orange' -> ('FL', 'Orange'); 'Orange' -> (COUNTY_DEFAULT_STATE, 'Orange')."""
+    from app.county_index import canonical_state
+    head, sep, rest = key.partition(":")
+    state = canonical_state(head) if sep else None
+    return (state, rest.strip()) if state else (COUNTY_DEFAULT_STATE, key.strip())
 
-def _read_env_json() -> dict[str, str]:
+def _read_env_json() -> list[tuple[str, str, str]]:
     if not COUNTY_EMAIL_MAP_JSON:
-        return {}
+        return []
     try:
         data = json.loads(COUNTY_EMAIL_MAP_JSON)
-        return {str(k).strip(): str(v).strip() for k, v in data.items() if str(v).strip()}
+        return [(*_split_key(str(k)), str(v).strip()) for k, v in data.items() if str(v).strip()]
     except Exception as e:
         log.warning(f"[county-map] bad COUNTY_EMAIL_MAP JSON: {e}")
-        return {}
+        return []
 
-def _read_csv(path: str) -> dict[str, str]:
+def _read_csv(path: str) -> list[tuple[str, str, str]]:
     """
     Flexible CSV reader. We try common header names and pick the first non-empty email-like value.
     Expected to include a 'county' column (case-insensitive). Email column may be one of:
     'email', 'records_email', 'contact_email', 'fire_records_email', etc.
+    An optional 'state' / 'state_code' / 'st' column gives each row's state.
     """
+    from app.county_index import canonical_state
     p = Path(path)
     if not p.exists():
         log.warning(f"[county-map] CSV not found at {p.resolve()}")
-        return {}
+        return []
 
     with p.open(newline="", encoding="utf-8") as fh:
         reader = csv.DictReader(fh)
         if not reader.fieldnames:
-            return {}
+            return []
 
         # normalize headers once
         headers_norm = {h: h.lower().strip() for h in reader.fieldnames}
@@ -78,7 +154,8 @@ def _read_csv(path: str) -> dict[str, str]:
                 break
         if not county_key:
             log.warning("[county-map] No 'county' column found in CSV headers: %s", reader.fieldnames)
-            return {}
+            return []
+        state_key = next((h for h, hl in headers_norm.items() if hl in {"state", "state_code", "st"}), None)
 
         # possible email headers, by priority
         email_candidates = [
@@ -93,11 +170,17 @@ def _read_csv(path: str) -> dict[str, str]:
         # pick existing email columns in order
         available_email_cols = [inv[c] for c in email_candidates if c in inv]
 
-        result: dict[str, str] = {}
+        result: list[tuple[str, str, str]] = []
         for row in reader:
             county_val = str(row.get(county_key, "")).strip()
             if not county_val:
                 continue
+            state_val = COUNTY_DEFAULT_STATE
+            if state_key and str(row.get(state_key) or "").strip():
+                state_val = canonical_state(str(row[state_key]))
+                if not state_val:
+                    log.warning("[county-map] unknown state %r for county %r", row[state_key], county_val)
+                    continue
             email_val = ""
             # prefer first non-empty from available candidates
             for col in available_email_cols:
@@ -113,42 +196,52 @@ def _read_csv(path: str) -> dict[str, str]:
                         email_val = s
                         break
             if email_val:
-                result[county_val] = email_val
+                result.append((state_val, county_val, email_val))
         return result
 
-def get_county_email_map() -> dict[str, str]:
+def get_county_directory() -> CountyDirectory:
     """Primary = CSV; Fallback = env JSON. Cached after first load."""
-    global __COUNTY_MAP_CACHE
-    if __COUNTY_MAP_CACHE is not None:
-        return __COUNTY_MAP_CACHE
+    global __COUNTY_DIRECTORY
+    if __COUNTY_DIRECTORY is not None:
+        return __COUNTY_DIRECTORY
 
-    csv_map = _read_csv(COUNTY_CSV_PATH) if COUNTY_CSV_PATH else {}
-    env_map = _read_env_json()
+    csv_rows = _read_csv(COUNTY_CSV_PATH) if COUNTY_CSV_PATH else []
+    env_rows = _read_env_json()
 
     # CSV wins; env fills gaps
-    merged = dict(env_map)
-    merged.update(csv_map)  # CSV overrides/env fills missing
-    __COUNTY_MAP_CACHE = merged
-    log.info("[county-map] loaded: %d entries (csv=%d, env=%d)", len(merged), len(csv_map), len(env_map))
-    return merged
-
-def get_county_email(county_name: str) -> str | None:
-    """Convenience lookup with light normalization."""
-    m = get_county_email_map()
+    directory = CountyDirectory(env_rows + csv_rows)  # later rows override earlier ones
+    __COUNTY_DIRECTORY = directory
+    log.info("[county-map] loaded: %s (csv=%d, env=%d)", directory.stats(), len(csv_rows), len(env_rows))
+    return directory
+
+def get_county_email_map() -> dict[tuple[str, str], str]:
+    """(state, county) -> email, as listed."""
+    return get_county_directory().as_dict()
+
+def get_county_email(county_name: str, state: str | None = None) -> str | None:
+    """Convenience lookup with light normalization; `state` defaults to COUNTY_DEFAULT_STATE."""
     if not county_name:
         return None
-    # try exact
-    if county_name in m:
-        return m[county_name]
-    # try case-insensitive match
-    lc = county_name.lower().strip()
-    for k, v in m.items():
-        if k.lower().strip() == lc:
-            return v
-    return None
+    return get_county_directory().email(state, county_name)
+
+def infer_state(address: str, sender: str = "") -> str | None:
+    """
+    State of a request or reply: named in the address, else from the sender's
+    domain (a county inbox listed for one state only, then *.<st>.us / <st>.gov).
+    """
+    from email.utils import parseaddr
+    from app.county_index import state_from_address, state_from_domain
+    state = state_from_address(address)
+    if state or not sender:
+        return state
+    domain = parseaddr(sender)[1].rpartition("@")[2].lower()
+    states = get_county_directory().states_for_domain(domain)
+    if len(states) == 1:
+        return states[0]
+    return state_from_domain(domain)
 
 def refresh_county_cache() -> int:
     """Clear and reload cache; return number of entries."""
-    global __COUNTY_MAP_CACHE
-    __COUNTY_MAP_CACHE = None
-    return len(get_county_email_map())
+    global __COUNTY_DIRECTORY
+    __COUNTY_DIRECTORY = None
+    return len(get_county_directory())
@@ -0,0 +1,250 @@
+# ================================
+# FILE: app/county_index.py
+# ================================
+"""
+Offline California ZIP / city -> county lookup.
+
+Bundled data (app/data, override the directory with COUNTY_INDEX_DIR):
+
+- ca_zip_county.csv   zip_from,zip_to,county. Inclusive ranges, or one ZIP
+                      per row with zip_to left empty (the shape of a
+                      ZIP-county crosswalk export). Adjacent rows for the
+                      same county are merged on load.
+- ca_city_county.csv  city,county. Incorporated cities plus common
+                      community / postal place names.
+
+ZIP ranges are held in three parallel arrays (start, end, county number) and
+searched with bisect. That is about 700 ranges in a few KB, and a lookup never
+leaves the process. ZIPs that straddle county lines, or that the data does
+not cover, simply return None.
+
+Used by the parser, to infer the county from the address when a reply has no
+County line, and by IncidentRequestCreate, to validate / canonicalize county.
+
+Outside California there is no ZIP / city data; counties there are known only
+from the county directory (app.config). This module supplies what the
+directory and the matcher need for every state: US_STATES,
+canonical_state, county_key (name normalization), and state inference from an
+address ("..., Orlando, FL 32801") or a government sender domain
+(records.co.orange.ny.us, fire.ca.gov).
+"""
+import os
+import re
+import csv
+import bisect
+import logging
+import threading
+import unicodedata
+from array import array
+from pathlib import Path
+
+log = logging.getLogger("uvicorn.error").getChild("county_index")
+
+COUNTY_INDEX_DIR = Path(os.getenv("COUNTY_INDEX_DIR", str(Path(__file__).resolve().parent / "data")))
+
+CA_COUNTIES = (
+    "Alameda", "Alpine", "Amador", "Butte", "Calaveras", "Colusa", "Contra Costa", "Del Norte", "El Dorado",
+    "Fresno", "Glenn", "Humboldt", "Imperial", "Inyo", "Kern", "Kings", "Lake", "Lassen", "Los Angeles",
+    "Madera", "Marin", "Mariposa", "Mendocino", "Merced", "Modoc", "Mono", "Monterey", "Napa", "Nevada",
+    "Orange", "Placer", "Plumas", "Riverside", "Sacramento", "San Benito", "San Bernardino", "San Diego",
+    "San Francisco", "San Joaquin", "San Luis Obispo", "San Mateo", "Santa Barbara", "Santa Clara",
+    "Santa Cruz", "Shasta", "Sierra", "Siskiyou", "Solano", "Sonoma", "Stanislaus", "Sutter", "Tehama",
+    "Trinity", "Tulare", "Tuolumne", "Ventura", "Yolo", "Yuba",
+)
+_COUNTY_NO = {c.lower(): i for i, c in enumerate(CA_COUNTIES)}
+
+US_STATES = {
+    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas", "CA": "California", "CO": "Colorado",
+    "CT": "Connecticut", "DE": "Delaware", "DC": "District of Columbia", "FL": "Florida", "GA": "Georgia",
+    "HI": "Hawaii", "ID": "Idaho", "IL": "Illinois", "IN": "Indiana", "IA": "Iowa", "KS": "Kansas",
+    "KY": "Kentucky", "LA": "Louisiana", "ME": "Maine", "MD": "Maryland", "MA": "Massachusetts",
+    "MI": "Michigan", "MN": "Minnesota", "MS": "Mississippi", "MO": "Missouri", "MT": "Montana",
+    "NE": "Nebraska", "NV": "Nevada", "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico",
+    "NY": "New York", "NC": "North Carolina", "ND": "North Dakota", "OH": "Ohio", "OK": "Oklahoma",
+    "OR": "Oregon", "PA": "Pennsylvania", "RI": "Rhode Island", "SC": "South Carolina", "SD": "South Dakota",
+    "TN": "Tennessee", "TX": "Texas", "UT": "Utah", "VT": "Vermont", "VA": "Virginia", "WA": "Washington",
+    "WV": "West Virginia", "WI": "Wisconsin", "WY": "Wyoming", "PR": "Puerto Rico",
+}
+_STATE_NO = {**{c.lower(): c for c in US_STATES}, **{n.lower(): c for c, n in US_STATES.items()}, "calif": "CA"}
+
+_ZIP_RE = re.compile(r"\b(9[0-6]\d{3})(?:-\d{4})?\b")
+_STATE_RE = re.compile(r"\b(?:ca|calif|california|usa|us)\b\.?", re.I)
+_US_TAIL = r"\.?\s*(?:,?\s*USA?\.?)?\s*$"
+_ADDR_STATE_RES = (
+    re.compile(r",\s*([A-Za-z][A-Za-z .]*?)\.?\s*(?:\d{5}(?:-\d{4})?)?" + _US_TAIL),  # ", Orlando, FL 32801"
+    re.compile(r"\s([A-Za-z]{2})\.?\s+\d{5}(?:-\d{4})?" + _US_TAIL),              # "... Orlando FL 32801"
+)
+_COUNTY_WORDS = re.compile(r"^county of |^parish of | (?:county|parish|borough|census area)$")
+_STREET_TYPES = {
+    "st", "street", "ave", "avenue", "av", "blvd", "boulevard", "rd", "road", "dr", "drive", "ln", "lane",
+    "ct", "court", "pl", "place", "way", "hwy", "highway", "pkwy", "parkway", "cir", "circle", "ter",
+    "terrace", "trl", "trail", "sq", "plz", "plaza", "loop", "row", "aly", "fwy", "expy",
+}
+MAX_CITY_WORDS = 4
+
+
+def _key(s: str) -> str:
+    """Lower-case, accent-free, punctuation-free, single-spaced."""
+    s = unicodedata.normalize("NFKD", s or "").encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^a-z0-9' ]+", " ", s.lower()).split())
+
+
+def canonical_county(name: str) -> str | None:
+    """'los angeles county' / 'County of Los Angeles' / 'LOS ANGELES' -> 'Los Angeles'; None if not a CA county."""
+    k = _key(_STATE_RE.sub(" ", name or ""))
+    k = re.sub(r"^county of ", "", k)
+    k = re.sub(r" county$", "", k)
+    i = _COUNTY_NO.get(k)
+    return CA_COUNTIES[i] if i is not None else None
+
+
+def canonical_state(name: str) -> str | None:
+    """'fl' / 'Florida' / 'Calif.' -> two-letter code; None if not a state."""
+    return _STATE_NO.get(_key(name).rstrip("."))
+
+
+def county_key(name: str) -> str:
+    """Lookup key for a county in any state: 'Orange County' / 'county of orange' -> 'orange'."""
+    return _COUNTY_WORDS.sub("", _key(name)).strip()
+
+
+def state_from_address(address: str) -> str | None:
+    """
+    The state an address names at its end ('..., Orlando, FL 32801'); a CA ZIP
+    counts as CA. A bare two-letter code only counts right after a comma or
+    before a ZIP: '500 Capitol Mall NE' is a directional, not Nebraska.
+    """
+    s = (address or "").strip()
+    for pattern in _ADDR_STATE_RES:
+        m = pattern.search(s)
+        words = m.group(1).split() if m else ()
+        for n in range(min(len(words), 3), 0, -1):  # 'New York', 'District of Columbia'
+            if n < len(words) and len(words[-1]) == 2:  # ', Capitol Mall NE'
+                break
+            state = canonical_state(" ".join(words[-n:]))
+            if state:
+                return state
+    if any(s[:z.start()].strip() and get_index().county_for_zip(z.group(1)) for z in _ZIP_RE.finditer(s)):
+        return "CA"
+    return None
+
+
+def state_from_domain(domain: str) -> str | None:
+    """Government domains that carry the state: *.<st>.us, <st>.gov ('co.orange.ny.us', 'fire.ca.gov')."""
+    labels = (domain or "").strip().lower().rstrip(".").split(".")
+    if len(labels) >= 2 and labels[-1] in ("us", "gov") and labels[-2].upper() in US_STATES:
+        return labels[-2].upper()
+    return None
+
+
+class CountyIndex:
+    __slots__ = ("zip_lo", "zip_hi", "zip_county", "cities")
+
+    def __init__(self, zip_rows: list[tuple[int, int, int]], cities: dict[str, int]):
+        self.zip_lo = array("I")
+        self.zip_hi = array("I")
+        self.zip_county = array("B")
+        for lo, hi, c in sorted(zip_rows):
+            if self.zip_lo and lo <= self.zip_hi[-1]:
+                log.warning("[county-index] overlapping ZIP range %05d-%05d ignored", lo, hi)
+                continue
+            if self.zip_lo and lo == self.zip_hi[-1] + 1 and c == self.zip_county[-1]:
+                self.zip_hi[-1] = hi
+                continue
+            self.zip_lo.append(lo); self.zip_hi.append(hi); self.zip_county.append(c)
+        self.cities = cities
+
+    def county_for_zip(self, zip5: str | int) -> str | None:
+        try:
+            z = int(str(zip5)[:5])
+        except ValueError:
+            return None
+        i = bisect.bisect_right(self.zip_lo, z) - 1
+        if i >= 0 and z <= self.zip_hi[i]:
+            return CA_COUNTIES[self.zip_county[i]]
+        return None
+
+    def county_for_city(self, city: str) -> str | None:
+        i = self.cities.get(_key(city))
+        return CA_COUNTIES[i] if i is not None else None
+
+    def infer(self, address: str) -> str | None:
+        """
+        California county for a free-form address: its ZIP first, then its city.
+        None when the address names another state (Glendale, AZ is not Los Angeles).
+        """
+        s = address or ""
+        if state_from_address(s) not in (None, "CA"):
+            return None
+        for m in reversed(list(_ZIP_RE.finditer(s))):
+            if s[:m.start()].strip():  # a leading 5-digit number is the house number
+                county = self.county_for_zip(m.group(1))
+                if county:
+                    return county
+        s = _STATE_RE.sub(" ", _ZIP_RE.sub(" ", s))
+        parts = s.split(",")
+        if len(parts) > 1:
+            for part in parts[1:]:
+                county = self.county_for_city(part) or canonical_county(part)
+                if county:
+                    return county
+            return None
+        # no commas: the words after the last street type ("77 Mission St San Francisco")
+        words = _key(s).split()
+        street = max((i for i, w in enumerate(words) if w in _STREET_TYPES), default=None)
+        if street is None:
+            return None
+        tail = words[street + 1:]
+        for n in range(min(len(tail), MAX_CITY_WORDS), 0, -1):
+            county = self.cities.get(" ".join(tail[-n:]))
+            if county is not None:
+                return CA_COUNTIES[county]
+        return None
+
+    def stats(self) -> dict:
+        return {"zip_ranges": len(self.zip_lo), "cities": len(self.cities),
+                "bytes": sum(a.itemsize * len(a) for a in (self.zip_lo, self.zip_hi, self.zip_county))}
+
+
+def _county_no(name: str, where: str) -> int | None:
+    c = canonical_county(name)
+    if c is None:
+        log.warning("[county-index] unknown county %r in %s", name, where)
+        return None
+    return _COUNTY_NO[c.lower()]
+
+
+def load(data_dir: Path = COUNTY_INDEX_DIR) -> CountyIndex:
+    zip_rows, cities = [], {}
+    zip_path, city_path = data_dir / "ca_zip_county.csv", data_dir / "ca_city_county.csv"
+    with zip_path.open(newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            c = _county_no(row["county"], zip_path.name)
+            if c is not None:
+                lo = int(row["zip_from"])
+                zip_rows.append((lo, int(row.get("zip_to") or lo), c))
+    with city_path.open(newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            c = _county_no(row["county"], city_path.name)
+            if c is not None:
+                cities[_key(row["city"])] = c
+    idx = CountyIndex(zip_rows, cities)
+    log.info("[county-index] loaded %s", idx.stats())
+    return idx
+
+
+_INDEX: CountyIndex | None = None
+_LOCK = threading.Lock()
+
+
+def get_index() -> CountyIndex:
+    global _INDEX
+    if _INDEX is None:
+        with _LOCK:
+            if _INDEX is None:
+                _INDEX = load()
+    return _INDEX
+
+
+def infer_county(address: str) -> str | None:
+    return get_index().infer(address)
@@ -1,20 +1,275 @@
 # ================================
 # FILE: app/database.py
 # ================================
-from sqlalchemy import create_engine
+from collections import deque
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-import os
+from sqlalchemy.pool import QueuePool
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# --- Optional read replica for read-only endpoints (see get_read_db) ---
+DATABASE_REPLICA_URL    = os.getenv("DATABASE_REPLICA_URL", "")
+DB_REPLICA_MAX_LAG_SECS = float(os.getenv("DB_REPLICA_MAX_LAG_SECS", "5"))  # staler than this: read the primary
+DB_REPLICA_CHECK_SECS   = float(os.getenv("DB_REPLICA_CHECK_SECS", "5"))    # how long one lag reading is reused
+
+# --- Pool / timeout settings (env-driven; ignored for SQLite except busy timeout) ---
+DB_POOL_SIZE            = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW         = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT         = float(os.getenv("DB_POOL_TIMEOUT", "10"))      # secs to wait for a free connection
+DB_POOL_RECYCLE         = int(os.getenv("DB_POOL_RECYCLE", "1800"))      # secs; < server/proxy idle cutoff
+DB_POOL_PRE_PING        = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))  # 0 disables
+
+
+class _PoolStats:
+    """Counters fed by pool events; wait times come from _TimedQueuePool."""
+
+    def __init__(self, samples: int = 1024):
+        self._samples = samples
+        self.reset()
+
+    def reset(self) -> None:
+        """Start from zero (also used by forked workers, which must not inherit the parent's lock)."""
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._waits = deque(maxlen=self._samples)
+
+    def incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def record_wait(self, secs: float) -> None:
+        with self._lock:
+            self.wait_count += 1
+            self.wait_total += secs
+            self.wait_max = max(self.wait_max, secs)
+            self._waits.append(secs)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            p = lambda q: round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000, 3) if waits else 0.0
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_count": self.wait_count,
+                "wait_ms_avg": round(self.wait_total / self.wait_count * 1000, 3) if self.wait_count else 0.0,
+                "wait_ms_p50": p(0.50),
+                "wait_ms_p95": p(0.95),
+                "wait_ms_p99": p(0.99),
+                "wait_ms_max": round(self.wait_max * 1000, 3),
+            }
+
+
+POOL_STATS = _PoolStats()
+
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {})
+class _TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:  # only a full pool; connect errors are outages, not pressure
+            POOL_STATS.incr("timeouts")
+            raise
+        finally:
+            POOL_STATS.record_wait(time.perf_counter() - t0)
+
+
+def _engine_kwargs(is_sqlite: bool = IS_SQLITE, poolclass=_TimedQueuePool) -> dict:
+    if is_sqlite:
+        return {"connect_args": {"check_same_thread": False,
+                                 "timeout": max(DB_STATEMENT_TIMEOUT_MS, 1000) / 1000}}
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+engine = create_engine(DATABASE_URL, **_engine_kwargs())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+
+def _set_statement_timeout(dbapi_conn) -> None:
+    cur = dbapi_conn.cursor()
+    try:
+        cur.execute(f"SET statement_timeout = {int(DB_STATEMENT_TIMEOUT_MS)}")
+    finally:
+        cur.close()
+    dbapi_conn.commit()
+
+@event.listens_for(engine, "connect")
+def _on_connect(dbapi_conn, _record):
+    POOL_STATS.incr("connects")
+    if not IS_SQLITE and DB_STATEMENT_TIMEOUT_MS:
+        _set_statement_timeout(dbapi_conn)
+
+@event.listens_for(engine, "checkout")
+def _on_checkout(*_):
+    POOL_STATS.incr("checkouts")
+
+@event.listens_for(engine, "checkin")
+def _on_checkin(*_):
+    POOL_STATS.incr("checkins")
+
+@event.listens_for(engine, "invalidate")
+def _on_invalidate(*_):
+    POOL_STATS.incr("invalidations")
+
+
+def pool_stats() -> dict:
+    """Live pool state plus event counters."""
+    pool = engine.pool
+    out = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        out.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "max_overflow": DB_MAX_OVERFLOW,
+            "timeout_secs": DB_POOL_TIMEOUT,
+        })
+    out.update(POOL_STATS.snapshot())
+    return out
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+# ---------- read replica ----------
+#
+# Read-only endpoints (admin listings, search, raw messages, forward status)
+# depend on get_read_db instead of get_db. With DATABASE_REPLICA_URL set, they
+# read the replica while its measured lag is at most DB_REPLICA_MAX_LAG_SECS,
+# so they stay off the primary's pool, which the inbound write path needs.
+# Otherwise, and whenever the replica is unreachable, they read the primary.
+# The lag is measured at most every DB_REPLICA_CHECK_SECS by whichever request
+# finds the last reading stale. Other requests use the previous reading
+# meanwhile; none of them wait. The replica has its own pool (not in
+# POOL_STATS, so its waits never show up as primary pool pressure).
+
+# Postgres standby: 0 while replay has caught up with what was received (an
+# idle primary must not make the replica look lagged), else the age of the last
+# replayed transaction. Caught up only means something while a WAL receiver is
+# streaming: a disconnected one stops receiving too, so that case is unhealthy.
+# The role needs pg_read_all_stats (or pg_monitor) to see the receiver status.
+_PG_LAG_SQL = (
+    "SELECT pg_is_in_recovery(), "
+    "CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END, "
+    "EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming')"
+)
+
+
+def _replica_engine(url: str):
+    eng = create_engine(url, **_engine_kwargs(url.startswith("sqlite"), QueuePool))
+    if not url.startswith("sqlite") and DB_STATEMENT_TIMEOUT_MS:
+        event.listen(eng, "connect", lambda dbapi_conn, _record: _set_statement_timeout(dbapi_conn))
+
+    @event.listens_for(eng, "handle_error")
+    def _on_replica_error(ctx):
+        if ctx.is_disconnect:
+            _mark_replica(None, str(ctx.original_exception)[:300])  # primary until the next check
+
+    return eng
+
+
+replica_engine = _replica_engine(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else None
+ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine) if replica_engine else None
+
+_REPLICA = {"lag": None, "error": None, "checked_at": None}
+_REPLICA_LOCK = threading.Lock()
+_READS = {"replica": 0, "primary": 0}
+
+
+def _mark_replica(lag: float | None, error: str | None) -> None:
+    _REPLICA.update(lag=lag, error=error, checked_at=time.monotonic())
+
+
+def _pg_lag(in_recovery: bool, replay_age, streaming: bool) -> float:
+    if not in_recovery:
+        return 0.0  # promoted (or pointed at a primary): nothing to lag behind
+    if not streaming:
+        raise RuntimeError("replica has no streaming WAL receiver")
+    if replay_age is None:
+        raise RuntimeError("replica has not replayed any transaction yet")
+    return max(float(replay_age), 0.0)
+
+
+def _measure_replica_lag() -> float:
+    with replica_engine.connect() as conn:
+        if replica_engine.dialect.name == "postgresql":
+            return _pg_lag(*conn.execute(text(_PG_LAG_SQL)).one())
+        conn.exec_driver_sql("select 1")
+        return 0.0  # nothing replicates into it (e.g. a local copy): only reachability counts
+
+
+def replica_lag() -> float | None:
+    """Last lag reading in seconds, re-measured when stale; None without a (reachable) replica."""
+    if replica_engine is None:
+        return None
+    checked_at = _REPLICA["checked_at"]
+    if (checked_at is None or time.monotonic() - checked_at >= DB_REPLICA_CHECK_SECS) \
+            and _REPLICA_LOCK.acquire(blocking=False):
+        try:
+            _mark_replica(_measure_replica_lag(), None)
+        except Exception as e:
+            _mark_replica(None, str(e)[:300])
+        finally:
+            _REPLICA_LOCK.release()
+    return _REPLICA["lag"]
+
+
+def use_replica() -> bool:
+    lag = replica_lag()
+    return lag is not None and lag <= DB_REPLICA_MAX_LAG_SECS
+
+
+def get_read_db():
+    """Session for read-only endpoints: the replica when it is fresh enough, else the primary."""
+    target = "replica" if use_replica() else "primary"
+    db = (ReplicaSessionLocal if target == "replica" else SessionLocal)()
+    db.info["db_target"] = target
+    _READS[target] += 1
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def replica_stats() -> dict:
+    lag = replica_lag()
+    return {"configured": replica_engine is not None, "lag_s": None if lag is None else round(lag, 3),
+            "max_lag_s": DB_REPLICA_MAX_LAG_SECS, "using": "replica" if use_replica() else "primary",
+            "error": _REPLICA["error"], "reads": dict(_READS)}
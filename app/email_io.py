@@ -5,8 +5,10 @@ import os
 import base64
 import logging
 from typing import List, Dict
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, Email, To, Content, Attachment
+
+from app.resilience import protected
+
+# sendgrid is imported on first use (see _sg / the send_* helpers) to keep cold start fast
 
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 FROM_EMAIL       = os.getenv("FROM_EMAIL", "request@repo.incidentreportshub.com")
@@ -18,8 +20,15 @@ log = logging.getLogger("uvicorn.error").getChild("email_io")
 def _sg():
     if not SENDGRID_API_KEY:
         raise RuntimeError("Missing SENDGRID_API_KEY")
+    from sendgrid import SendGridAPIClient
     return SendGridAPIClient(SENDGRID_API_KEY)
 
+def _send(msg, op: str):
+    with protected("sendgrid_send", "sendgrid", op) as timeout:
+        sg = _sg()
+        sg.client.timeout = timeout  # python_http_client passes it to urlopen
+        return sg.send(msg)
+
 def _extract_msg_id(resp) -> str | None:
     try:
         headers = getattr(resp, "headers", {}) or {}
@@ -35,6 +44,7 @@ def send_request_email(
     county: str,
 ) -> str | None:
     """Send the county request. One field per line (text & HTML) + IRH_META."""
+    from sendgrid.helpers.mail import Mail, Email, To, Content
     plain_text = (
         "Please provide the incident report for the following details:\n\n"
         f"Address: {incident_address}\n"
@@ -67,16 +77,33 @@ def send_request_email(
     if REPLY_TO_EMAIL:
         msg.reply_to = Email(REPLY_TO_EMAIL)
 
-    resp = _sg().send(msg)
+    resp = _send(msg, "send_request")
     msg_id = _extract_msg_id(resp)
     log.info("[email] sent request to %s status=%s sg_msg_id=%s",
              to_email, getattr(resp, "status_code", "?"), msg_id)
     return msg_id
 
-def send_attachments_to_user(to_email: str, subject: str, body: str, files: List[Dict]) -> str | None:
-    """Forward attachments to the requester and return SendGrid message id."""
+def _links_text(links: List[Dict]) -> str:
+    lines = ["", "Some files were too large to attach. Download them here:"]
+    for l in links:
+        lines.append(f"- {l['filename']} ({l['size'] / 1e6:.1f} MB): {l['url']}")
+    exp = min(l["expires_at"] for l in links)
+    lines.append(f"Links expire {exp:%Y-%m-%d %H:%M} UTC.")
+    return "\n".join(lines)
+
+def send_attachments_to_user(to_email: str, subject: str, body: str, files: List[Dict],
+                             links: List[Dict] | None = None) -> str | None:
+    """
+    Forward attachments to the requester and return SendGrid message id.
+    `links` (from attachment_store.store_as_links) are listed in the body for
+    files that were too large to attach.
+    """
+    from sendgrid.helpers.mail import Mail, Email, Content, Attachment
     msg = Mail(from_email=FROM_EMAIL, to_emails=to_email, subject=subject)
-    msg.add_content(Content("text/plain", body or "Attached are the files we received."))
+    text = body or "Attached are the files we received."
+    if links:
+        text += "\n" + _links_text(links)
+    msg.add_content(Content("text/plain", text))
 
     if REPLY_TO_EMAIL:
         msg.reply_to = Email(REPLY_TO_EMAIL)
@@ -92,14 +119,15 @@ def send_attachments_to_user(to_email: str, subject: str, body: str, files: List
         att.disposition = "attachment"
         msg.add_attachment(att)
 
-    resp = _sg().send(msg)
+    resp = _send(msg, "forward")
     msg_id = _extract_msg_id(resp)
-    log.info("[email] forwarded %d attachment(s) to %s status=%s sg_msg_id=%s",
-             len(files), to_email, getattr(resp, "status_code", "?"), msg_id)
+    log.info("[email] forwarded %d attachment(s) + %d link(s) to %s status=%s sg_msg_id=%s",
+             len(files), len(links or []), to_email, getattr(resp, "status_code", "?"), msg_id)
     return msg_id
 
 def send_alert_no_attachments(to_email: str, subject: str,
                               incident_address: str, incident_datetime: str, county: str) -> str | None:
+    from sendgrid.helpers.mail import Mail, Email, Content
     msg = Mail(from_email=FROM_EMAIL, to_emails=to_email or ALERT_EMAIL, subject=subject)
     plain = (
         "A reply was received but contained no attachments.\n\n"
@@ -117,7 +145,7 @@ def send_alert_no_attachments(to_email: str, subject: str,
     if REPLY_TO_EMAIL:
         msg.reply_to = Email(REPLY_TO_EMAIL)
 
-    resp = _sg().send(msg)
+    resp = _send(msg, "alert")
     msg_id = _extract_msg_id(resp)
     log.info("[email] sent no-attachment alert to %s status=%s sg_msg_id=%s",
              to_email or ALERT_EMAIL, getattr(resp, "status_code", "?"), msg_id)
@@ -5,6 +5,11 @@ import os
 import re
 import json
 import logging
+from typing import NamedTuple
+
+from app.metrics import PARSER_OUTCOMES
+from app.resilience import protected
+from app.llm_governor import GOVERNOR, LLMSaturated, LLM_MAX_OUTPUT_TOKENS, get_client
 
 logger = logging.getLogger("uvicorn.error").getChild("email_parser")
 
@@ -14,6 +19,10 @@ USE_LLM = os.getenv("PARSER_USE_LLM", "0") == "1"  # used only if MODE=regex_fir
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
 
+# Bump whenever extraction logic changes; rows with an older inbound_emails.parser_version
+# are picked up by `python -m app.reparse`.
+PARSER_VERSION = 3  # 2: sender-domain templates; 3: county inferred from the address
+
 # Prefer IRH_META first (DOTALL; county stops at '<' or end)
 RE_META = re.compile(
     r"IRH_META:\s*Address=(.*?)\s*\|\s*DateTime=(.*?)\s*\|\s*County=(.*?)(?:<|$)",
@@ -25,6 +34,13 @@ RE_DT   = re.compile(r"(?:Date/Time|Datetime)\s*:\s*(.+?)(?=\s*(?:County\s*:|$))
 RE_CNTY = re.compile(r"County\s*:\s*(.+?)\s*$", re.I | re.S)
 
 
+class ParseResult(NamedTuple):
+    address: str
+    datetime: str
+    county: str
+    source: str  # template | meta | regex_raw | regex_dequoted | llm_fallback | llm_only | llm_deferred | llm_error | none
+
+
 def _strip_quotes(text: str) -> str:
     out = []
     for ln in (text or "").splitlines():
@@ -35,69 +51,141 @@ def _strip_quotes(text: str) -> str:
 
 
 def _llm_extract(text: str):
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
     prompt = (
         "Extract Address, DateTime, County from this email body. "
         "Return ONLY strict JSON with keys: address, datetime, county. "
         "Datetime should be 'YYYY-MM-DD HH:MM' 24h if present.\n\n" + (text or "")
     )
-    resp = client.chat.completions.create(
-        model=LLM_MODEL,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0,
-        response_format={"type": "json_object"},
-    )
+    with GOVERNOR.slot(prompt) as ticket, protected("openai", "openai", "chat") as timeout:
+        resp = get_client(OPENAI_API_KEY).chat.completions.create(
+            model=LLM_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            response_format={"type": "json_object"},
+            max_tokens=LLM_MAX_OUTPUT_TOKENS,
+            timeout=timeout,
+        )
+        ticket.used = getattr(getattr(resp, "usage", None), "total_tokens", None)
     out = resp.choices[0].message.content or "{}"
     data = json.loads(out)
     return (data.get("address", ""), data.get("datetime", ""), data.get("county", ""))
 
 
-def parse_inbound_email(text: str, html: str = ""):
+def parse_inbound_email(text: str, html: str = "", sender: str = ""):
+    """(address, datetime, county); blanks when nothing could be extracted."""
+    a, d, c, _ = parse_inbound(text, html, sender)
+    return a, d, c
+
+
+def parse_inbound(text: str, html: str = "", sender: str = "") -> ParseResult:
+    """Like parse_inbound_email, but also reports which path produced the result."""
+    res = _parse(text, html, sender)
+    PARSER_OUTCOMES.inc(outcome=res.source)
+    return res
+
+
+def _infer_county(address: str) -> str:
+    """County from the address's ZIP / city (offline index); '' when unknown."""
+    from app.county_index import infer_county
+    county = infer_county(address) or ""
+    if county:
+        logger.info("[parser] county inferred from address: %s", county)
+    return county
+
+
+def _labeled(a, d, c) -> tuple[str, str, str] | None:
+    """Label matches -> fields; without a County label, infer it (date/time is then cut at its line end)."""
+    if not (a and d):
+        return None
+    if c:
+        return a.group(1).strip(), d.group(1).strip(), c.group(1).strip()
+    address, dt = a.group(1).strip(), d.group(1).strip().splitlines()[0].strip()
+    county = _infer_county(address)
+    return (address, dt, county) if county else None
+
+
+def _template_parse(text: str, html: str, sender: str) -> ParseResult | None:
+    from app.parser_templates import lookup, sender_domain, extract
+    tpl = lookup(sender_domain(sender))
+    if not tpl:
+        return None
+    hit = extract(tpl, text, html)
+    if not hit:
+        return None
+    logger.info("[parser] template_hit (%s)", tpl.domain)
+    return ParseResult(*hit, "template")
+
+
+def _parse(text: str, html: str, sender: str = "") -> ParseResult:
     # llm_only mode: skip regex/IRH_META entirely
     if MODE == "llm_only":
         if not OPENAI_API_KEY:
             logger.info("[parser] llm_only but no OPENAI_API_KEY; returning blanks")
-            return "", "", ""
+            return ParseResult("", "", "", "none")
         try:
             a, d, c = _llm_extract(text)
+            c = c or (_infer_county(a) if a else "")
             logger.info("[parser] llm_only hit")
-            return a, d, c
+            return ParseResult(a, d, c, "llm_only")
+        except LLMSaturated as e:
+            logger.info("[parser] %s; regex only, LLM deferred", e)
+            return ParseResult(*_regex_parse(text, html, sender)[:3], "llm_deferred")
         except Exception as e:
             logger.warning(f"[parser] llm_only failed: {e}")
-            return "", "", ""
+            return ParseResult("", "", "", "llm_error")
 
     # regex_first mode (default)
+    res = _regex_parse(text, html, sender)
+    if res.source != "none":
+        return res
+
+    # 4) Optional LLM fallback
+    if USE_LLM and OPENAI_API_KEY:
+        try:
+            a, d, c = _llm_extract(text)
+            c = c or (_infer_county(a) if a else "")
+            logger.info("[parser] llm_fallback hit")
+            return ParseResult(a, d, c, "llm_fallback")
+        except LLMSaturated as e:
+            logger.info("[parser] %s; LLM fallback deferred", e)
+            return ParseResult("", "", "", "llm_deferred")
+        except Exception as e:
+            logger.warning(f"[parser] LLM fallback failed: {e}")
+            return ParseResult("", "", "", "llm_error")
+
+    logger.info("[parser] no hit; returning blanks")
+    return ParseResult("", "", "", "none")
+
+
+def _regex_parse(text: str, html: str, sender: str = "") -> ParseResult:
+    """Template -> IRH_META -> labels -> dequoted labels; source 'none' when nothing hit."""
+    # 0) learned template for the sender's domain (dict lookup)
+    if sender:
+        res = _template_parse(text, html, sender)
+        if res:
+            return res
+
     # 1) IRH_META from either part
     for src in (text or "", html or ""):
         m = RE_META.search(src)
         if m:
             a, d, c = (s.strip() for s in m.groups())
+            c = c or _infer_county(a)
             logger.info("[parser] meta_hit")
-            return a, d, c
+            return ParseResult(a, d, c, "meta")
 
     # 2) Labels on raw text
     body = (text or "").strip()
-    a = RE_ADDR.search(body); d = RE_DT.search(body); c = RE_CNTY.search(body)
-    if a and d and c:
+    hit = _labeled(RE_ADDR.search(body), RE_DT.search(body), RE_CNTY.search(body))
+    if hit:
         logger.info("[parser] regex_hit (raw)")
-        return a.group(1).strip(), d.group(1).strip(), c.group(1).strip()
+        return ParseResult(*hit, "regex_raw")
 
     # 3) Dequote and try again
     cleaned = _strip_quotes(text or "")
-    a = RE_ADDR.search(cleaned); d = RE_DT.search(cleaned); c = RE_CNTY.search(cleaned)
-    if a and d and c:
+    hit = _labeled(RE_ADDR.search(cleaned), RE_DT.search(cleaned), RE_CNTY.search(cleaned))
+    if hit:
         logger.info("[parser] regex_hit (dequoted)")
-        return a.group(1).strip(), d.group(1).strip(), c.group(1).strip()
-
-    # 4) Optional LLM fallback
-    if USE_LLM and OPENAI_API_KEY:
-        try:
-            a, d, c = _llm_extract(text)
-            logger.info("[parser] llm_fallback hit")
-            return a, d, c
-        except Exception as e:
-            logger.warning(f"[parser] LLM fallback failed: {e}")
+        return ParseResult(*hit, "regex_dequoted")
 
-    logger.info("[parser] no hit; returning blanks")
-    return "", "", ""
\ No newline at end of file
+    return ParseResult("", "", "", "none")
@@ -0,0 +1,197 @@
+# ================================
+# FILE: app/health.py
+# ================================
+"""
+Cached liveness / readiness.
+
+A background prober (one daemon thread per worker, started from the app
+lifespan) runs every HEALTH_PROBE_INTERVAL_SECS and stores its result. The
+/livez, /readyz and /healthz endpoints only read that result, so a platform
+probing every few seconds costs nothing and never waits for a pool
+connection.
+
+Checks ("critical" ones make /readyz answer 503):
+
+- db      critical  `select 1` over the prober's own single-connection engine,
+                    not the app pool, with a short statement timeout.
+- pool    critical  app pool checked-out / (size + overflow) at or above
+                    HEALTH_POOL_SATURATION, or any checkout timeouts since the
+                    previous probe.
+- disk    critical  free space where INBOUND_TMP lives below HEALTH_MIN_FREE_MB.
+- outbox  warning   matched replies from the last HEALTH_OUTBOX_WINDOW_HOURS
+                    that are not forwarded yet. Above HEALTH_OUTBOX_MAX the
+                    status is "warn", but the instance stays ready: the backlog
+                    is shared, so taking a worker out of rotation would not help.
+
+If the cached result is older than HEALTH_STALE_SECS (the prober is not
+running, or it is stuck), /readyz runs one probe inline. /livez is in-process
+only: it fails when the prober thread has died or has not finished a probe in
+HEALTH_LIVE_STALE_SECS.
+"""
+import os
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from app.metrics import REGISTRY
+
+log = logging.getLogger("uvicorn.error").getChild("health")
+
+HEALTH_PROBE_INTERVAL_SECS = float(os.getenv("HEALTH_PROBE_INTERVAL_SECS", "10"))
+HEALTH_STALE_SECS          = float(os.getenv("HEALTH_STALE_SECS", str(3 * HEALTH_PROBE_INTERVAL_SECS)))
+HEALTH_LIVE_STALE_SECS     = float(os.getenv("HEALTH_LIVE_STALE_SECS", "120"))
+HEALTH_DB_TIMEOUT_MS       = int(os.getenv("HEALTH_DB_TIMEOUT_MS", "2000"))
+HEALTH_POOL_SATURATION     = float(os.getenv("HEALTH_POOL_SATURATION", "0.9"))
+HEALTH_MIN_FREE_MB         = float(os.getenv("HEALTH_MIN_FREE_MB", "200"))
+HEALTH_OUTBOX_MAX          = int(os.getenv("HEALTH_OUTBOX_MAX", "50"))
+HEALTH_OUTBOX_WINDOW_HOURS = float(os.getenv("HEALTH_OUTBOX_WINDOW_HOURS", "24"))
+HEALTH_OUTBOX_GRACE_SECS   = float(os.getenv("HEALTH_OUTBOX_GRACE_SECS", "60"))  # replies still being forwarded
+
+CRITICAL = ("db", "pool", "disk")
+
+_LOCK = threading.Lock()
+_PROBE_LOCK = threading.Lock()  # one probe at a time (prober thread vs. an inline /readyz probe)
+_STATE = {"status": None, "checked_at": None, "started_at": time.monotonic()}
+_THREAD: threading.Thread | None = None
+_LAST_TIMEOUTS = {"n": 0}
+_ENGINE = None
+
+
+def _probe_engine():
+    """A one-connection engine of its own, so probes never take (or wait for) an app pool slot."""
+    global _ENGINE
+    if _ENGINE is None:
+        from sqlalchemy import create_engine
+        from app.database import DATABASE_URL, IS_SQLITE, DB_POOL_RECYCLE
+        if IS_SQLITE:
+            _ENGINE = create_engine(DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 1})
+        else:
+            _ENGINE = create_engine(DATABASE_URL, pool_size=1, max_overflow=0, pool_timeout=1,
+                                    pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=True,
+                                    connect_args={"connect_timeout": max(1, HEALTH_DB_TIMEOUT_MS // 1000),
+                                                  "options": f"-c statement_timeout={HEALTH_DB_TIMEOUT_MS}"})
+    return _ENGINE
+
+
+def _check_db_and_outbox() -> tuple[dict, dict]:
+    from sqlalchemy import text
+    now = datetime.now(timezone.utc)
+    t0 = time.perf_counter()
+    try:
+        with _probe_engine().connect() as conn:
+            conn.exec_driver_sql("select 1")
+            db = {"ok": True, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+            n = conn.execute(text(
+                "SELECT count(*) FROM inbound_emails WHERE matched_request_id IS NOT NULL "
+                "AND forwarded_at IS NULL AND created_at >= :since AND created_at < :until"
+            ), {"since": now - timedelta(hours=HEALTH_OUTBOX_WINDOW_HOURS),
+                "until": now - timedelta(seconds=HEALTH_OUTBOX_GRACE_SECS)}).scalar() or 0
+            outbox = {"ok": n <= HEALTH_OUTBOX_MAX, "pending": n}
+    except Exception as e:
+        db = {"ok": False, "error": str(e)[:300]}
+        outbox = {"ok": True, "pending": None}  # unknown; the db check already reports the failure
+    return db, outbox
+
+
+def _check_pool() -> dict:
+    from app.database import pool_stats
+    s = pool_stats()
+    timeouts = s.get("timeouts", 0)
+    new_timeouts, _LAST_TIMEOUTS["n"] = timeouts - _LAST_TIMEOUTS["n"], timeouts
+    if "size" not in s:  # SQLite: no QueuePool
+        return {"ok": True, "pool": s["pool"]}
+    capacity = s["size"] + s["max_overflow"]
+    used = s["checked_out"] / capacity if capacity else 0.0
+    return {"ok": used < HEALTH_POOL_SATURATION and new_timeouts == 0, "checked_out": s["checked_out"],
+            "capacity": capacity, "utilization": round(used, 2), "new_timeouts": new_timeouts}
+
+
+def _check_disk() -> dict:
+    from app.routes_inbound import TMP_DIR
+    path = Path(TMP_DIR)
+    while not path.exists() and path != path.parent:  # the dir is created on first use
+        path = path.parent
+    try:
+        free_mb = shutil.disk_usage(path).free / 2**20
+    except OSError as e:
+        return {"ok": False, "error": str(e)}
+    return {"ok": free_mb >= HEALTH_MIN_FREE_MB, "path": str(TMP_DIR), "free_mb": round(free_mb)}
+
+
+def probe() -> dict:
+    """Run every check once and cache the result."""
+    with _PROBE_LOCK:
+        db, outbox = _check_db_and_outbox()
+        checks = {"db": db, "pool": _check_pool(), "disk": _check_disk(), "outbox": outbox}
+    ready = all(checks[c]["ok"] for c in CRITICAL)
+    status = {"ready": ready, "status": ("ok" if outbox["ok"] else "warn") if ready else "fail", "checks": checks}
+    with _LOCK:
+        prev = _STATE["status"]
+        _STATE["status"], _STATE["checked_at"] = status, time.monotonic()
+    if prev is None or prev["ready"] != ready:
+        failing = [c for c in CRITICAL if not checks[c]["ok"]]
+        (log.info if ready else log.warning)("[health] ready=%s%s", ready, f" failing={failing}" if failing else "")
+    return status
+
+
+def _loop(interval: float) -> None:
+    while True:
+        try:
+            probe()
+        except Exception as e:
+            log.warning("[health] probe failed: %s", e)
+        time.sleep(interval)
+
+
+def start_prober() -> None:
+    """Called from the app lifespan; HEALTH_PROBE_INTERVAL_SECS=0 disables the thread (probes run inline)."""
+    global _THREAD
+    if HEALTH_PROBE_INTERVAL_SECS > 0 and (_THREAD is None or not _THREAD.is_alive()):
+        _THREAD = threading.Thread(target=_loop, args=(HEALTH_PROBE_INTERVAL_SECS,), name="irh-health",
+                                   daemon=True)
+        _THREAD.start()
+
+
+def _age() -> float | None:
+    checked_at = _STATE["checked_at"]
+    return None if checked_at is None else time.monotonic() - checked_at
+
+
+def readiness() -> dict:
+    """Cached status (probing inline only when it is missing or stale)."""
+    age = _age()
+    if age is None or age > HEALTH_STALE_SECS:
+        status = probe()
+        age = 0.0
+    else:
+        status = _STATE["status"]
+    return {**status, "age_s": round(age, 1)}
+
+
+def liveness() -> dict:
+    age = _age()
+    prober = "off" if _THREAD is None else ("running" if _THREAD.is_alive() else "dead")
+    stuck = prober == "running" and (age if age is not None else time.monotonic() - _STATE["started_at"]) \
+        > HEALTH_LIVE_STALE_SECS
+    return {"ok": prober != "dead" and not stuck, "prober": prober,
+            "probe_age_s": None if age is None else round(age, 1),
+            "uptime_s": round(time.monotonic() - _STATE["started_at"], 1)}
+
+
+def _gauges():
+    status = _STATE["status"]
+    if status is None:
+        return []
+    out = [("irh_ready", "1 when the last health probe passed every critical check", {}, int(status["ready"]))]
+    out += [("irh_health_check_ok", "Last health probe result per check", {"check": name}, int(c["ok"]))
+            for name, c in status["checks"].items()]
+    if status["checks"]["outbox"].get("pending") is not None:
+        out.append(("irh_outbox_pending", "Matched replies not yet forwarded", {},
+                    status["checks"]["outbox"]["pending"]))
+    return out
+
+
+REGISTRY.add_gauge_collector(_gauges)
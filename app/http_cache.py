@@ -0,0 +1,199 @@
+# ================================
+# FILE: app/http_cache.py
+# ================================
+"""
+Conditional GET for the read endpoints clients poll (/incident_requests/mine,
+/admin/match-reviews, /admin/parser-templates, stored /admin/forward-status).
+
+Each endpoint passes the tables it reads and a *validator*: one cheap
+aggregate over its query scope, e.g. count / max(id) / sum(row_version) of the
+caller's requests. The strong ETag is a hash of route, query string, caller
+and validator:
+
+- If-None-Match still matches: 304, no rows loaded or serialized.
+- Otherwise the rendered JSON body is kept in a small in-process LRU. A poll
+  whose validator has not changed gets the stored bytes back.
+
+The validator comes from the database, so writes made by other workers and by
+CLI jobs are picked up. Writes committed through a Session in this process
+(ORM flushes and Core / text DML alike) bump a per-table generation, and that
+drops every cached entry over those tables at once. An entry validated less
+than HTTP_CACHE_TTL_SECS ago, with no local write since, is answered without
+touching the database at all. Writes from elsewhere therefore show up at most
+that late; 0 validates on every request.
+"""
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Iterable
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+from app.metrics import REGISTRY, Counter
+
+HTTP_CACHE_TTL_SECS       = float(os.getenv("HTTP_CACHE_TTL_SECS", "2"))
+HTTP_CACHE_MAX_ENTRIES    = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "1024"))
+HTTP_CACHE_MAX_BODY_BYTES = int(os.getenv("HTTP_CACHE_MAX_BODY_BYTES", str(256 * 1024)))
+
+CACHE_CONTROL = "private, no-cache"  # clients may store, but must revalidate
+
+HTTP_CACHE = REGISTRY.register(Counter(
+    "irh_http_cache_total", "Conditional GETs by outcome", ("route", "outcome")))  # not_modified|hit|miss
+
+_WRITES = "irh_written_tables"
+_DML = re.compile(r"^\s*(?:UPDATE|INSERT\s+INTO|DELETE\s+FROM)\s+\"?(\w+)", re.IGNORECASE)
+
+
+class _Entry:
+    __slots__ = ("gens", "etag", "body", "checked")
+
+    def __init__(self, gens: tuple, etag: str, body: bytes | None, checked: float):
+        self.gens, self.etag, self.body, self.checked = gens, etag, body, checked
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = HTTP_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._gens: dict[str, int] = {}
+
+    def generations(self, tables: Iterable[str]) -> tuple:
+        with self._lock:
+            return tuple(self._gens.get(t, 0) for t in tables)
+
+    def invalidate(self, *tables: str) -> None:
+        """Mark `tables` as written: entries over them are dropped on next use."""
+        with self._lock:
+            for t in tables:
+                self._gens[t] = self._gens.get(t, 0) + 1
+
+    def get(self, key: tuple, gens: tuple) -> _Entry | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.gens != gens:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: _Entry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "ttl_secs": HTTP_CACHE_TTL_SECS}
+
+
+CACHE = ResponseCache()
+invalidate = CACHE.invalidate
+
+
+def make_etag(*parts: Any) -> str:
+    return '"' + hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest() + '"'
+
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+
+
+def cached_json(
+    request: Request,
+    *,
+    route: str,
+    tables: tuple[str, ...],
+    validator: Callable[[], Any],
+    render: Callable[[], Any],
+    vary: Any = None,
+) -> Response:
+    """
+    Answer a GET from `validator` (cheap) when possible, else from `render` (the
+    full query). `vary` separates callers that see different rows (the username).
+    """
+    key = (route, request.url.query, vary)
+    gens = CACHE.generations(tables)
+    entry = CACHE.get(key, gens)
+    now = time.monotonic()
+    if entry is None or now - entry.checked >= HTTP_CACHE_TTL_SECS:
+        etag = make_etag(key, validator())
+        if entry is None or entry.etag != etag:
+            entry = _Entry(gens, etag, None, now)
+        else:
+            entry.checked = now
+        CACHE.put(key, entry)
+    headers = {"ETag": entry.etag, "Cache-Control": CACHE_CONTROL}
+
+    if _matches(request.headers.get("if-none-match"), entry.etag):
+        HTTP_CACHE.inc(route=route, outcome="not_modified")
+        return Response(status_code=304, headers=headers)
+    if entry.body is not None:
+        HTTP_CACHE.inc(route=route, outcome="hit")
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    HTTP_CACHE.inc(route=route, outcome="miss")
+    body = JSONResponse(content=jsonable_encoder(render())).body
+    if len(body) <= HTTP_CACHE_MAX_BODY_BYTES:
+        entry.body = body
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# ---------- local write tracking ----------
+
+def _written(session) -> set:
+    return session.info.setdefault(_WRITES, set())
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context) -> None:
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        name = getattr(obj, "__tablename__", None)
+        if name:
+            _written(session).add(name)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_execute(state) -> None:
+    stmt = state.statement
+    if state.is_insert or state.is_update or state.is_delete:
+        name = getattr(getattr(stmt, "table", None), "name", None)
+        if name:
+            _written(state.session).add(name)
+    elif isinstance(stmt, TextClause):
+        m = _DML.match(stmt.text)
+        if m:
+            _written(state.session).add(m.group(1).lower())
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_written(session) -> None:
+    tables = session.info.pop(_WRITES, None)
+    if tables:
+        CACHE.invalidate(*tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written(session) -> None:
+    session.info.pop(_WRITES, None)
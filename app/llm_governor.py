@@ -0,0 +1,154 @@
+# ================================
+# FILE: app/llm_governor.py
+# ================================
+"""
+Admission control for LLM extraction calls.
+
+Every _llm_extract goes through one per-process Governor, using one shared
+OpenAI client (connection pool reused, no per-call construction):
+
+- at most LLM_MAX_IN_FLIGHT calls run at once,
+- at most LLM_QUEUE_MAX more wait for a slot, each for no longer than
+  LLM_QUEUE_WAIT_SECS (or whatever the request deadline leaves),
+- a token bucket holds LLM_TOKENS_PER_MIN and refills continuously. A call
+  reserves an estimate (prompt chars / 4 + LLM_MAX_OUTPUT_TOKENS) and is
+  settled with the usage the API reports, so the budget tracks real spend.
+
+slot() blocks the calling thread while it waits, so callers on an event loop
+(/inbound) run the parse in a worker thread. When a call is refused, slot()
+raises LLMSaturated. The parser then answers
+from regex only (source "llm_deferred"), and /inbound stores the row with
+needs_llm set. `python -m app.reparse --allow-llm` re-parses those rows later.
+"""
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from app.metrics import REGISTRY, Counter
+
+log = logging.getLogger("uvicorn.error").getChild("llm_governor")
+
+LLM_MAX_IN_FLIGHT     = int(os.getenv("LLM_MAX_IN_FLIGHT", "4"))
+LLM_QUEUE_MAX         = int(os.getenv("LLM_QUEUE_MAX", "8"))
+LLM_QUEUE_WAIT_SECS   = float(os.getenv("LLM_QUEUE_WAIT_SECS", "2"))
+LLM_TOKENS_PER_MIN    = int(os.getenv("LLM_TOKENS_PER_MIN", "60000"))
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "200"))
+
+LLM_ADMISSIONS = REGISTRY.register(Counter(
+    "irh_llm_admission_total", "LLM calls by admission outcome", ("outcome",)))  # admitted|queue_full|wait_timeout|budget
+
+
+class LLMSaturated(RuntimeError):
+    def __init__(self, reason: str):
+        super().__init__(f"LLM saturated ({reason})")
+        self.reason = reason
+
+
+def estimate_tokens(prompt: str) -> int:
+    return len(prompt) // 4 + LLM_MAX_OUTPUT_TOKENS
+
+
+class Ticket:
+    """One admitted call; set `used` to the reported token count to settle the reservation."""
+    __slots__ = ("reserved", "used")
+
+    def __init__(self, reserved: int):
+        self.reserved, self.used = reserved, None
+
+
+class Governor:
+    def __init__(self, max_in_flight: int = LLM_MAX_IN_FLIGHT, queue_max: int = LLM_QUEUE_MAX,
+                 wait_secs: float = LLM_QUEUE_WAIT_SECS, tokens_per_min: int = LLM_TOKENS_PER_MIN):
+        self.max_in_flight, self.queue_max, self.wait_secs = max_in_flight, queue_max, wait_secs
+        self.tokens_per_min = tokens_per_min
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.tokens = float(tokens_per_min)
+        self._refilled = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.tokens_per_min, self.tokens + (now - self._refilled) * self.tokens_per_min / 60)
+        self._refilled = now
+
+    def _reject(self, reason: str):
+        LLM_ADMISSIONS.inc(outcome=reason)
+        raise LLMSaturated(reason)
+
+    def _admit(self, est: int) -> None:
+        from app.resilience import remaining
+        with self._cond:
+            self._refill()
+            if self.tokens < est:
+                self._reject("budget")
+            if self.in_flight >= self.max_in_flight:
+                if self.waiting >= self.queue_max:
+                    self._reject("queue_full")
+                left = remaining()
+                wait = self.wait_secs if left is None else max(0.0, min(self.wait_secs, left))
+                self.waiting += 1
+                try:
+                    free = self._cond.wait_for(lambda: self.in_flight < self.max_in_flight, timeout=wait)
+                finally:
+                    self.waiting -= 1
+                if not free:
+                    self._reject("wait_timeout")
+                self._refill()
+                if self.tokens < est:
+                    self._reject("budget")
+            self.in_flight += 1
+            self.tokens -= est
+        LLM_ADMISSIONS.inc(outcome="admitted")
+
+    def _release(self, ticket: Ticket) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if ticket.used is not None:
+                self.tokens += ticket.reserved - ticket.used  # may go negative: the overrun is paid back first
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, prompt: str):
+        """Admit one call (or raise LLMSaturated); yields a Ticket."""
+        ticket = Ticket(estimate_tokens(prompt))
+        self._admit(ticket.reserved)
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._refill()
+            return {"in_flight": self.in_flight, "waiting": self.waiting, "max_in_flight": self.max_in_flight,
+                    "queue_max": self.queue_max, "tokens_available": int(self.tokens),
+                    "tokens_per_min": self.tokens_per_min}
+
+
+GOVERNOR = Governor()
+
+REGISTRY.add_gauge_collector(lambda: [
+    ("irh_llm_in_flight", "LLM calls in flight", {}, GOVERNOR.in_flight),
+    ("irh_llm_waiting", "LLM calls waiting for a slot", {}, GOVERNOR.waiting),
+    ("irh_llm_tokens_available", "LLM token budget left this minute", {}, int(GOVERNOR.tokens)),
+])
+
+
+# ---------- shared client ----------
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client(api_key: str):
+    """One OpenAI client per process (its HTTP pool is reused across calls)."""
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                from openai import OpenAI
+                _CLIENT = OpenAI(api_key=api_key, max_retries=0)  # retries would outlive the request deadline
+    return _CLIENT
@@ -0,0 +1,220 @@
+# ================================
+# FILE: app/matching.py
+# ================================
+"""
+Matching inbound replies to incident requests.
+
+Keys are normalized in SQL the same way app.utils.normalize /
+normalize_datetime do in Python: lower(trim()) for address and county,
+trim() for the date/time string. Both the live path (/inbound) and the
+re-match engine use them, so a county spelled "los angeles" matches a request
+filed as "Los Angeles". County names repeat across states (Orange: CA, FL, NY,
+...), so a reply whose state is known (inbound_emails.parsed_state, inferred
+from its address or sender domain) only matches requests in that state; one
+with no known state matches the county in any state. The first lookup is
+served by ix_incident_requests_state_county, the second (state unknown, so no
+leading state column to seek on) by ix_incident_requests_county_key.
+
+Re-match: replies that arrived before their IncidentRequest existed (or that
+missed for any other reason) are joined to incident_requests in a single
+UPDATE ... RETURNING. It only claims rows that are still unmatched, so
+concurrent runs never forward the same reply twice. Newly matched replies are
+then forwarded with the attachments kept for them (see attachment_store).
+The claim commits before the forward, so each run also retries replies that
+are matched but still unforwarded (forwarded_at IS NULL) once they are older
+than REMATCH_FORWARD_GRACE_SECS, whether the earlier forward came from
+/inbound or from a previous run (/inbound keeps the files of a failed forward
+for this). Replies with no recipient address are marked
+forward_status = 'no_recipient', and replies whose files are no longer stored
+'attachments_missing'; both are left alone.
+The engine runs:
+
+- after every POST /incident_request, scoped to that request (background task)
+- every REMATCH_INTERVAL_SECS in-process when set, or from cron:
+      python -m app.matching [--window-days 30] [--no-forward]
+- POST /admin/rematch
+"""
+import os
+import time
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import bindparam, func, text, DateTime
+from sqlalchemy.orm import Session
+
+from app import models
+from app.metrics import MATCH_RESULTS
+from app.request_status import mark_replied
+
+log = logging.getLogger("uvicorn.error").getChild("matching")
+
+REMATCH_WINDOW_DAYS   = int(os.getenv("REMATCH_WINDOW_DAYS", "30"))     # how far back unmatched replies are retried
+REMATCH_INTERVAL_SECS = float(os.getenv("REMATCH_INTERVAL_SECS", "0"))  # 0 = no in-process schedule
+REMATCH_FORWARD_GRACE_SECS = float(os.getenv("REMATCH_FORWARD_GRACE_SECS", "120"))  # forwards still in flight
+
+_KEYS = (
+    "lower(trim(r.incident_address)) = lower(trim(inbound_emails.parsed_address)) "
+    "AND trim(r.incident_datetime) = trim(inbound_emails.parsed_datetime) "
+    "AND lower(trim(r.county)) = lower(trim(inbound_emails.parsed_county)) "
+    "AND (inbound_emails.parsed_state IS NULL OR r.state = inbound_emails.parsed_state)"
+)
+
+
+def find_request(db: Session, address: str, dt_str: str, county: str,
+                 state: str | None = None) -> models.IncidentRequest | None:
+    """Oldest request whose normalized keys equal the parsed reply fields (in `state`, when known)."""
+    R = models.IncidentRequest
+    q = db.query(R).filter(func.lower(func.trim(R.county)) == county.strip().lower(),
+                           func.lower(func.trim(R.incident_address)) == address.strip().lower(),
+                           func.trim(R.incident_datetime) == dt_str.strip())
+    if state:
+        q = q.filter(R.state == state)
+    return q.order_by(R.id).first()
+
+
+def recipient_for(db: Session, req: models.IncidentRequest) -> str | None:
+    if req.requester_email:
+        return req.requester_email
+    if req.created_by:
+        u = db.query(models.User).filter(models.User.username == req.created_by).first()
+        return u.email if u else None
+    return None
+
+
+def rematch(db: Session, request_id: int | None = None, window_days: int = REMATCH_WINDOW_DAYS,
+            forward: bool = True) -> list[dict]:
+    """
+    Match every unmatched reply from the last `window_days` (optionally only
+    against `request_id`) in one statement; forward the new matches.
+    """
+    scope = " AND r.id = :rid" if request_id is not None else ""
+    sql = text(
+        "UPDATE inbound_emails SET matched_request_id = ("
+        f" SELECT min(r.id) FROM incident_requests r WHERE {_KEYS}{scope}) "
+        "WHERE matched_request_id IS NULL "
+        "AND parsed_address IS NOT NULL AND parsed_datetime IS NOT NULL AND parsed_county IS NOT NULL "
+        "AND created_at >= :since "
+        f"AND EXISTS (SELECT 1 FROM incident_requests r WHERE {_KEYS}{scope}) "
+        "RETURNING id, matched_request_id"
+    ).bindparams(bindparam("since", type_=DateTime(timezone=True)))
+    params = {"since": datetime.now(timezone.utc) - timedelta(days=window_days)}
+    if request_id is not None:
+        params["rid"] = request_id
+    claimed = [{"inbound_id": i, "request_id": r} for i, r in db.execute(sql, params).all()]
+    mark_replied(db, [(m["request_id"], m["inbound_id"]) for m in claimed])
+    db.commit()
+    if claimed:
+        MATCH_RESULTS.inc(len(claimed), result="rematch")
+        log.info("[rematch] matched %d reply(ies): %s", len(claimed), claimed)
+    if not forward:
+        return claimed
+
+    retry = _unforwarded(db, request_id, params["since"])
+    if retry:
+        log.info("[rematch] retrying %d unforwarded reply(ies): %s", len(retry), retry)
+    for m in claimed + retry:
+        try:
+            m["forwarded_to"] = _forward(db, m["inbound_id"], m["request_id"])
+        except Exception as e:
+            db.rollback()
+            log.warning("[rematch] forward failed for inbound_id=%s: %s", m["inbound_id"], e)
+            m["forwarded_to"] = None
+    return claimed
+
+
+def _unforwarded(db: Session, request_id: int | None, since: datetime) -> list[dict]:
+    """Replies matched earlier whose forward never went out (failed, or the process died first)."""
+    E = models.InboundEmail
+    q = db.query(E.id, E.matched_request_id).filter(
+        E.matched_request_id.isnot(None), E.forwarded_at.is_(None),
+        E.forward_status.is_(None) | E.forward_status.notin_(("no_recipient", "attachments_missing")),
+        E.created_at >= since,
+        E.created_at < datetime.now(timezone.utc) - timedelta(seconds=REMATCH_FORWARD_GRACE_SECS))
+    if request_id is not None:
+        q = q.filter(E.matched_request_id == request_id)
+    rows = q.order_by(E.id).all()
+    db.rollback()  # no transaction held open across the sends
+    return [{"inbound_id": i, "request_id": r} for i, r in rows]
+
+
+def _forward(db: Session, inbound_id: int, request_id: int) -> str | None:
+    from app.routes_inbound import forward_reply
+    from app.attachment_store import as_file
+
+    row = db.get(models.InboundEmail, inbound_id)
+    req = db.get(models.IncidentRequest, request_id)
+    recipient = recipient_for(db, req) if req else None
+    if not (row and recipient):
+        log.info("[rematch] inbound_id=%s: no recipient email", inbound_id)
+        if row:
+            row.forward_status = "no_recipient"  # nothing to retry until someone fixes the request
+            db.commit()
+        return None
+    kept = (db.query(models.StoredAttachment)
+            .filter(models.StoredAttachment.inbound_id == inbound_id).all())
+    if row.has_attachments and not kept:
+        # the files are gone (expired or never kept): a "no attachments" alert would be false
+        log.warning("[rematch] inbound_id=%s: attachments no longer stored; not forwarding", inbound_id)
+        row.forward_status = "attachments_missing"
+        db.commit()
+        return None
+    forward_reply(db, row, recipient, [as_file(a) for a in kept])
+    return recipient
+
+
+def rematch_for_request(request_id: int) -> None:
+    """Background task after a request is created (own session; the request's is closed)."""
+    from app.database import SessionLocal
+    from app.resilience import detached
+    db = SessionLocal()
+    try:
+        with detached():  # runs after the response; the request's deadline no longer applies
+            rematch(db, request_id=request_id)
+    except Exception as e:
+        log.warning("[rematch] request_id=%s failed: %s", request_id, e)
+    finally:
+        db.close()
+
+
+# ---------- schedule ----------
+
+def _loop(interval: float) -> None:
+    from app.database import SessionLocal
+    while True:
+        time.sleep(interval)
+        db = SessionLocal()
+        try:
+            rematch(db)
+        except Exception as e:
+            log.warning("[rematch] scheduled run failed: %s", e)
+        finally:
+            db.close()
+
+
+def start_scheduler() -> None:
+    """Called from the app lifespan; no-op unless REMATCH_INTERVAL_SECS is set."""
+    if REMATCH_INTERVAL_SECS > 0:
+        threading.Thread(target=_loop, args=(REMATCH_INTERVAL_SECS,), name="irh-rematch", daemon=True).start()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Re-match unmatched inbound replies to incident requests")
+    ap.add_argument("--window-days", type=int, default=REMATCH_WINDOW_DAYS)
+    ap.add_argument("--request-id", type=int)
+    ap.add_argument("--no-forward", action="store_true", help="record matches only")
+    args = ap.parse_args()
+
+    import json
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        out = rematch(db, request_id=args.request_id, window_days=args.window_days, forward=not args.no_forward)
+    finally:
+        db.close()
+    print(json.dumps({"matched": out}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+# ================================
+# FILE: app/metrics.py
+# ================================
+"""
+Minimal in-process Prometheus-style metrics (text exposition format 0.0.4).
+
+No external dependency; every update is a dict lookup plus a few adds under a
+per-metric lock, cheap enough to leave on in production. Values are per
+process (each worker exposes its own /metrics).
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: Iterable[str] = ()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(n, "") for n in self.labels), 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labels, k)} {v:g}" for k, v in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: Iterable[str] = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def count(self, **labels) -> int:
+        s = self._series.get(tuple(labels.get(n, "") for n in self.labels))
+        return s[-1] if s else 0
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        out = []
+        for key, s in items:
+            cum = 0
+            for b, c in zip(self.buckets, s):
+                cum += c
+                le = 'le="%g"' % b
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {cum}")
+            inf = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, inf)} {s[-1]}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {s[-2]:.6f}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {s[-1]}")
+        return out
+
+
+class _Registry:
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: list[Callable[[], list[tuple[str, str, dict, float]]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_gauge_collector(self, fn: Callable[[], list[tuple[str, str, dict, float]]]) -> None:
+        """fn() -> [(name, doc, labels, value)], evaluated at scrape time."""
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines.append(f"# HELP {m.name} {m.doc}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.render())
+        seen = set()
+        for fn in self._collectors:
+            try:
+                samples = fn()
+            except Exception:
+                continue
+            for name, doc, labels, value in samples:
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# HELP {name} {doc}")
+                    lines.append(f"# TYPE {name} gauge")
+                names = tuple(labels)
+                lines.append(f"{name}{_fmt_labels(names, tuple(labels[n] for n in names))} {float(value):g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = _Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Histogram(
+    "irh_http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")))
+INBOUND_STAGE = REGISTRY.register(Histogram(
+    "irh_inbound_stage_seconds", "Time spent in each /inbound pipeline stage", ("stage",)))
+PARSER_OUTCOMES = REGISTRY.register(Counter(
+    "irh_parser_outcomes_total", "parse_inbound_email outcomes (meta/regex/llm/none)", ("outcome",)))
+MATCH_RESULTS = REGISTRY.register(Counter(
+    "irh_match_total", "Inbound-to-request match attempts", ("result",)))
+EXTERNAL_CALLS = REGISTRY.register(Histogram(
+    "irh_external_call_seconds", "Latency of calls to external providers", ("service", "op", "outcome")))
+
+
+@contextmanager
+def external_call(service: str, op: str):
+    """Time a provider call; outcome label is ok/error."""
+    t0 = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        EXTERNAL_CALLS.observe(time.perf_counter() - t0, service=service, op=op, outcome=outcome)
+
+
+class StageTimer:
+    """Records the time since the previous mark under INBOUND_STAGE{stage}."""
+
+    def __init__(self):
+        self._t = time.perf_counter()
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        INBOUND_STAGE.observe(now - self._t, stage=stage)
+        self._t = now
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route latency histogram (route template, not raw path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        status = {"code": 500}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUESTS.observe(time.perf_counter() - t0, method=scope.get("method", ""),
+                                  route=getattr(route, "path", "unmatched"), status=str(status["code"]))
+
+
+def _pool_gauges():
+    from app.database import pool_stats
+    s = pool_stats()
+    doc = "SQLAlchemy connection pool state"
+    return [(f"irh_db_pool_{k}", doc, {}, v) for k, v in s.items() if isinstance(v, (int, float))]
+
+
+REGISTRY.add_gauge_collector(_pool_gauges)
+
+
+def _replica_gauges():
+    from app.database import replica_stats
+    s = replica_stats()
+    if not s["configured"]:
+        return []
+    out = [("irh_db_replica_in_use", "1 while read-only endpoints read the replica", {}, int(s["using"] == "replica"))]
+    if s["lag_s"] is not None:
+        out.append(("irh_db_replica_lag_seconds", "Last measured replica lag", {}, s["lag_s"]))
+    out += [("irh_db_read_sessions", "Read-only sessions opened, by database", {"target": t}, n)
+            for t, n in s["reads"].items()]
+    return out
+
+
+REGISTRY.add_gauge_collector(_replica_gauges)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -1,7 +1,8 @@
 # ================================
 # FILE: app/models.py
 # ================================
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, LargeBinary, Index, func, false
+from sqlalchemy.orm import relationship
 from app.database import Base
 
 class User(Base):
@@ -23,19 +24,45 @@ class IncidentRequest(Base):
     incident_address = Column(String)
     incident_datetime = Column(String)
     county = Column(String)
+    state = Column(String(2), nullable=False, default="CA", server_default="CA")  # two-letter code; with county, keys the directory
 
     # where the original request was sent (county inbox)
     county_email = Column(String)
 
+    # denormalized progress, kept by app.request_status so "my requests" needs no join
+    status                = Column(String, nullable=False, default="pending", server_default="pending")  # pending/sent/send_failed/replied/forwarded/forward_failed/delivered
+    request_sg_message_id = Column(String, nullable=True, index=True)
+    sent_at               = Column(DateTime(timezone=True), nullable=True)
+    replied_at            = Column(DateTime(timezone=True), nullable=True)  # first matched reply
+    reply_count           = Column(Integer, nullable=False, default=0, server_default="0")
+    last_inbound_id       = Column(Integer, nullable=True)
+    forward_sg_message_id = Column(String, nullable=True, index=True)
+    forwarded_at          = Column(DateTime(timezone=True), nullable=True)
+    delivered_at          = Column(DateTime(timezone=True), nullable=True)
+    created_at            = Column(DateTime(timezone=True), server_default=func.now(), nullable=True)
+    row_version           = Column(Integer, nullable=False, default=1, server_default="1")  # bumped on every status write (ETags)
+
+    __table_args__ = (
+        # GET /incident_requests/mine: keyset scan over (created_by, id)
+        Index("ix_incident_requests_created_by_id", "created_by", "id"),
+        # matching / scoring candidates: state plus the county key app.matching compares on
+        Index("ix_incident_requests_state_county", state, func.lower(func.trim(county))),
+        # replies with no known state compare on the county key alone
+        Index("ix_incident_requests_county_key", func.lower(func.trim(county))),
+    )
+
 class InboundEmail(Base):
     __tablename__ = 'inbound_emails'
     id = Column(Integer, primary_key=True, index=True)
-    sender = Column(String)
+    sender = Column(String, index=True)
     subject = Column(String)
-    body = Column(String)
+    body = Column(String)  # short preview; full text/html/headers live in inbound_raw
     parsed_address = Column(String, nullable=True)
     parsed_datetime = Column(String, nullable=True)
     parsed_county = Column(String, nullable=True)
+    parsed_state = Column(String(2), nullable=True)  # inferred from the address / sender domain; NULL = any state
+    parser_version = Column(Integer, nullable=False, default=0, server_default="0", index=True)  # email_parser.PARSER_VERSION
+    needs_llm = Column(Boolean, nullable=False, default=False, server_default=false(), index=True)  # LLM skipped under load
 
     # attachment tracking
     has_attachments  = Column(Boolean, nullable=False, default=False)
@@ -43,9 +70,84 @@ class InboundEmail(Base):
 
     # forward tracking
     forwarded_to           = Column(String, nullable=True)
-    forward_sg_message_id  = Column(String, nullable=True)
+    forward_sg_message_id  = Column(String, nullable=True, index=True)  # looked up by the SendGrid event webhook
     forward_status         = Column(String, nullable=True)  # accepted/delivered/bounced/etc
     forwarded_at           = Column(DateTime(timezone=True), nullable=True)
 
+    # request this reply was matched to (if any)
+    matched_request_id = Column(Integer, nullable=True)
+
     # timestamps
-    created_at       = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at       = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    # loaded only when accessed (admin raw view, re-parse).
+    # No DB-level FK: on Postgres inbound_emails is range-partitioned by created_at.
+    raw = relationship("InboundRaw", uselist=False, lazy="select", cascade="all, delete-orphan",
+                       primaryjoin="InboundEmail.id == foreign(InboundRaw.inbound_id)")
+
+class InboundRaw(Base):
+    """Full, compressed message content kept out of the hot inbound_emails table."""
+    __tablename__ = 'inbound_raw'
+    inbound_id = Column(Integer, primary_key=True)  # inbound_emails.id
+    codec      = Column(String, nullable=False)     # zstd | zlib
+    text_z     = Column(LargeBinary, nullable=True)
+    html_z     = Column(LargeBinary, nullable=True)
+    headers_z  = Column(LargeBinary, nullable=True)
+    raw_bytes    = Column(Integer, nullable=False, default=0)  # uncompressed size
+    stored_bytes = Column(Integer, nullable=False, default=0)  # compressed size
+
+class InboundIdempotency(Base):
+    """
+    Dedupe keys for SendGrid retries (Message-ID header or payload hash).
+    Kept outside inbound_emails so uniqueness holds across partitions.
+    """
+    __tablename__ = 'inbound_idempotency'
+    key        = Column(String, primary_key=True)
+    inbound_id = Column(Integer, nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+class StoredAttachment(Base):
+    """
+    Attachment kept on local disk and forwarded as a signed download link
+    (used when the files are too large to send through SendGrid).
+    """
+    __tablename__ = 'stored_attachments'
+    id           = Column(String, primary_key=True)   # random token; part of the download URL
+    inbound_id   = Column(Integer, nullable=True, index=True)
+    filename     = Column(String, nullable=False)
+    content_type = Column(String, nullable=False, default="application/octet-stream")
+    size         = Column(Integer, nullable=False, default=0)
+    sha256       = Column(String, nullable=False, index=True)
+    path         = Column(String, nullable=False)     # content-addressed file under ATTACHMENT_DIR
+    created_at   = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at   = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class ParserTemplate(Base):
+    """
+    Per-sender-domain extraction labels learned from matched replies
+    (see app.parser_templates). A NULL label means the generic pattern is used for that field.
+    """
+    __tablename__ = 'parser_templates'
+    domain         = Column(String, primary_key=True)  # lower-cased sender domain
+    address_label  = Column(String, nullable=True)
+    datetime_label = Column(String, nullable=True)
+    county_label   = Column(String, nullable=True)
+    support        = Column(Integer, nullable=False, default=0)  # matched replies the labels were seen in
+    samples        = Column(Integer, nullable=False, default=0)  # matched replies from this domain
+    updated_at     = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+class MatchReview(Base):
+    """
+    Inbound reply whose scored candidates were too close to call (see app.scoring);
+    waits for an admin to pick a request or reject them all.
+    """
+    __tablename__ = 'match_reviews'
+    id                  = Column(Integer, primary_key=True, index=True)
+    inbound_id          = Column(Integer, nullable=False, index=True)
+    candidates          = Column(Text, nullable=False)   # JSON: [{request_id, score, address, datetime, sender}]
+    top_score           = Column(Float, nullable=True)
+    status              = Column(String, nullable=False, default="pending", server_default="pending", index=True)  # pending/accepted/rejected/already_matched
+    resolved_request_id = Column(Integer, nullable=True)
+    resolved_by         = Column(String, nullable=True)
+    created_at          = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    resolved_at         = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,250 @@
+# ================================
+# FILE: app/parser_templates.py
+# ================================
+"""
+Per-sender-domain extraction templates.
+
+Most counties answer from one domain in a fixed layout ("Incident Location:
+...", "Date of Loss: ..."). A template records, per domain, the label that
+precedes each field on its line. parse_inbound looks the template up by
+sender domain (a dict hit) before the generic meta -> regex -> dequote -> LLM
+cascade. Fields the template does not cover fall back to the standard
+"Address:" / "Date/Time:" / "County:" labels, matched on the same line.
+
+Templates are learned from history: for InboundEmail rows matched to an
+IncidentRequest, the request's values are located in the reply body and the
+text before them on that line becomes the label candidate. A label is kept
+when it shows up in at least PARSER_TEMPLATE_MIN_SUPPORT replies from the
+domain and in at least PARSER_TEMPLATE_MIN_SHARE of them. Labels the generic
+regexes already understand are not stored.
+
+Templates live in the parser_templates table. Each process caches them in a
+dict, loaded at startup (app.warmup, app.prefork, the reparse pool
+initializer). Once older than PARSER_TEMPLATE_TTL_SECS, a lookup starts one
+background reload and keeps answering from the current dict, so
+parse_inbound never waits on the database.
+
+    python -m app.parser_templates --learn [--days 365]
+"""
+import os
+import re
+import time
+import logging
+import argparse
+import threading
+from collections import Counter, defaultdict
+from email.utils import parseaddr
+from typing import NamedTuple
+
+log = logging.getLogger("uvicorn.error").getChild("parser_templates")
+
+PARSER_TEMPLATE_MIN_SUPPORT = int(os.getenv("PARSER_TEMPLATE_MIN_SUPPORT", "3"))
+PARSER_TEMPLATE_MIN_SHARE   = float(os.getenv("PARSER_TEMPLATE_MIN_SHARE", "0.6"))
+PARSER_TEMPLATE_TTL_SECS    = float(os.getenv("PARSER_TEMPLATE_TTL_SECS", "300"))
+MAX_LABEL_CHARS = 40
+
+FIELDS = ("address", "datetime", "county")
+# labels the generic regexes already handle; also the per-field fallback inside a template
+GENERIC_LABELS = {
+    "address": r"Address\s*:",
+    "datetime": r"(?:Date/Time|Datetime)\s*:",
+    "county": r"County\s*:",
+}
+_GENERIC_RE = {f: re.compile(p, re.I) for f, p in GENERIC_LABELS.items()}
+_BLOCK_RE = re.compile(r"<\s*(?:br|/p|/div|/tr|/li)[^>]*>", re.I)
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+class Template(NamedTuple):
+    domain: str
+    patterns: dict  # field -> compiled line pattern
+
+
+def _line_pattern(label_re: str) -> re.Pattern:
+    return re.compile(r"^[ \t]*" + label_re + r"[ \t]*(.+?)[ \t]*$", re.I | re.M)
+
+
+def compile_template(domain: str, labels: dict) -> Template:
+    return Template(domain, {
+        f: _line_pattern(re.escape(labels[f]) if labels.get(f) else GENERIC_LABELS[f]) for f in FIELDS
+    })
+
+
+def sender_domain(sender: str) -> str:
+    addr = parseaddr(sender or "")[1]
+    return addr.rpartition("@")[2].strip().lower()
+
+
+def visible_text(text: str, html: str) -> str:
+    """Unquoted plain text (or tag-stripped HTML): what templates are learned from and applied to."""
+    if text and text.strip():
+        return "\n".join(ln for ln in text.splitlines() if not ln.lstrip().startswith(">"))
+    return _TAG_RE.sub(" ", _BLOCK_RE.sub("\n", html or ""))
+
+
+def extract(tpl: Template, text: str, html: str = "") -> tuple[str, str, str] | None:
+    """(address, datetime, county) when every field is found; None otherwise."""
+    body = visible_text(text, html)
+    out = []
+    for f in FIELDS:
+        m = tpl.patterns[f].search(body)
+        if not m:
+            return None
+        out.append(m.group(1).strip())
+    return tuple(out)
+
+
+# ---------- cache ----------
+
+_LOCK = threading.Lock()
+_CACHE = {"loaded_at": None, "by_domain": {}}
+_RELOADING = threading.Event()
+
+
+def load(db) -> int:
+    """Replace the in-process cache from parser_templates; return the number loaded."""
+    from app.models import ParserTemplate
+    by_domain = {}
+    for t in db.query(ParserTemplate).all():
+        labels = {"address": t.address_label, "datetime": t.datetime_label, "county": t.county_label}
+        by_domain[t.domain] = compile_template(t.domain, labels)
+    with _LOCK:
+        _CACHE["by_domain"] = by_domain
+        _CACHE["loaded_at"] = time.monotonic()
+    return len(by_domain)
+
+
+def _reload() -> None:
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        load(db)
+    except Exception as e:
+        log.warning("[templates] load failed: %s", e)
+        with _LOCK:
+            _CACHE["loaded_at"] = time.monotonic()  # don't retry on every message
+    finally:
+        db.close()
+        _RELOADING.clear()
+
+
+def _reload_in_background() -> None:
+    with _LOCK:
+        if _RELOADING.is_set():
+            return
+        _RELOADING.set()
+    threading.Thread(target=_reload, name="parser-templates-reload", daemon=True).start()
+
+
+def lookup(domain: str) -> Template | None:
+    """The domain's template from the cache; a stale cache is refreshed off the caller's thread."""
+    loaded_at = _CACHE["loaded_at"]
+    if loaded_at is None or time.monotonic() - loaded_at > PARSER_TEMPLATE_TTL_SECS:
+        _reload_in_background()
+    return _CACHE["by_domain"].get(domain) if domain else None
+
+
+# ---------- learning ----------
+
+def _label_for(lines: list[str], value: str) -> str | None:
+    """Text before `value` on the line where it ends the line; None if it never does."""
+    v = (value or "").strip().lower()
+    if len(v) < 2:
+        return None
+    for ln in lines:
+        i = ln.lower().find(v)
+        if i <= 0 or ln[i + len(v):].strip(" \t.;,"):
+            continue
+        label = ln[:i].strip()
+        if label and len(label) <= MAX_LABEL_CHARS and re.search(r"[A-Za-z]", label) and "IRH_META" not in label:
+            return label
+    return None
+
+
+def derive(samples: list[tuple[str, str, str, dict]], min_support: int = PARSER_TEMPLATE_MIN_SUPPORT,
+           min_share: float = PARSER_TEMPLATE_MIN_SHARE) -> dict[str, dict]:
+    """
+    samples: (sender, text, html, {field: true value}) for matched replies.
+    Returns {domain: {"labels": {field: label | None}, "support": n, "samples": n}}
+    for domains with at least one non-generic label.
+    """
+    per_domain: dict[str, list] = defaultdict(list)
+    for sender, text, html, values in samples:
+        d = sender_domain(sender)
+        if d:
+            per_domain[d].append((visible_text(text, html).splitlines(), values))
+
+    out = {}
+    for domain, rows in per_domain.items():
+        labels, support = {}, []
+        for f in FIELDS:
+            counts = Counter(_label_for(lines, values.get(f)) for lines, values in rows)
+            counts.pop(None, None)
+            if not counts:
+                labels[f] = None
+                continue
+            label, n = counts.most_common(1)[0]
+            keep = n >= min_support and n / len(rows) >= min_share and not _GENERIC_RE[f].fullmatch(label)
+            labels[f] = label if keep else None
+            if keep:
+                support.append(n)
+        if any(labels.values()):
+            out[domain] = {"labels": labels, "support": min(support), "samples": len(rows)}
+    return out
+
+
+def learn(db, days: int = 365, max_rows: int = 20000) -> dict[str, dict]:
+    """Derive templates from matched replies of the last `days` days, store them and refresh the cache."""
+    from datetime import datetime, timedelta, timezone
+    from app import models
+    from app.raw_store import decompress
+
+    E, R = models.InboundEmail, models.IncidentRequest
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    q = (db.query(E, R).join(R, R.id == E.matched_request_id)
+         .filter(E.created_at >= since).order_by(E.id.desc()).limit(max_rows))
+    samples = []
+    for row, req in q.yield_per(500):
+        raw = row.raw
+        text = decompress(raw.text_z, raw.codec) if raw else (row.body or "")
+        html = decompress(raw.html_z, raw.codec) if raw else ""
+        samples.append((row.sender, text, html, {"address": req.incident_address,
+                                                 "datetime": req.incident_datetime, "county": req.county}))
+
+    learned = derive(samples)
+    seen = {d for d in {sender_domain(s[0]) for s in samples} if d}
+    for domain in seen - set(learned):
+        db.query(models.ParserTemplate).filter(models.ParserTemplate.domain == domain).delete()
+    for domain, t in learned.items():
+        db.merge(models.ParserTemplate(domain=domain, address_label=t["labels"]["address"],
+                                       datetime_label=t["labels"]["datetime"], county_label=t["labels"]["county"],
+                                       support=t["support"], samples=t["samples"]))
+    db.commit()
+    load(db)
+    log.info("[templates] learned %d template(s) from %d matched repl(ies)", len(learned), len(samples))
+    return learned
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Per-sender-domain parser templates")
+    ap.add_argument("--learn", action="store_true", help="derive templates from matched replies")
+    ap.add_argument("--days", type=int, default=365)
+    args = ap.parse_args()
+
+    import json
+    from app.database import SessionLocal
+    from app.models import ParserTemplate
+    db = SessionLocal()
+    try:
+        if args.learn:
+            learn(db, days=args.days)
+        rows = db.query(ParserTemplate).order_by(ParserTemplate.domain).all()
+        print(json.dumps([{"domain": t.domain, "address": t.address_label, "datetime": t.datetime_label,
+                           "county": t.county_label, "support": t.support, "samples": t.samples} for t in rows],
+                         indent=1))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# ================================
+# FILE: app/prefork.py
+# ================================
+"""
+Pre-fork launcher.
+
+The master process imports the app and builds the read-only state once
+(county directory + lower-case index, parser regexes and sender templates,
+ORM mappers, routers), moves it out of the GC's reach with gc.freeze() and
+then forks the workers, so those pages stay shared copy-on-write instead of
+being rebuilt per worker.
+
+After fork each worker drops the inherited DB pools, primary and replica
+(engine.dispose(close=False), as SQLAlchemy recommends for forked processes)
+and opens its own connections.
+Per-process state that must not be shared (the inbound rate-limit dict, pool
+counters, profiles) starts empty in each worker.
+
+    python -m app.prefork --workers 4 --host 0.0.0.0 --port 8000
+
+The master restarts workers that die and logs RSS / PSS / shared memory per
+worker every PREFORK_MEM_REPORT_SECS; /admin/workers returns the same report.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from pathlib import Path
+
+log = logging.getLogger("uvicorn.error").getChild("prefork")
+
+WEB_CONCURRENCY         = int(os.getenv("WEB_CONCURRENCY", "2"))
+PREFORK_MEM_REPORT_SECS = float(os.getenv("PREFORK_MEM_REPORT_SECS", "60"))  # 0 disables
+
+# set in the master's environment before forking; workers use it to find siblings
+MASTER_PID_ENV = "PREFORK_MASTER_PID"
+
+
+# ---------- shared state ----------
+
+def build_shared_state():
+    """Import the app and load everything read-only that workers would otherwise each build."""
+    from app.config import get_county_email_map
+    from app.county_index import get_index
+    import app.email_parser  # noqa: F401  (compiles RE_META / RE_ADDR / RE_DT / RE_CNTY)
+    from sqlalchemy.orm import configure_mappers
+    from main import app
+    from app.database import engine, replica_engine, SessionLocal
+    from app.parser_templates import load as load_templates
+
+    get_county_email_map()
+    get_index()
+    configure_mappers()
+    db = SessionLocal()
+    try:
+        load_templates(db)
+    except Exception as e:
+        log.warning("[prefork] parser templates not loaded: %s", e)
+    finally:
+        db.close()
+    # the master must not hand an open connection to its children
+    engine.dispose()
+    if replica_engine is not None:
+        replica_engine.dispose()
+    return app
+
+
+def _after_fork_in_worker() -> None:
+    from app.database import engine, replica_engine, POOL_STATS
+    from app import utils
+
+    for eng in (engine, replica_engine):
+        if eng is not None:
+            eng.dispose(close=False)  # forget inherited connections without closing the parent's sockets
+    POOL_STATS.reset()
+    utils._sender_hits.clear()
+    gc.enable()
+
+
+# ---------- memory report ----------
+
+_SMAPS_FIELDS = {"Rss": "rss_kb", "Pss": "pss_kb", "Shared_Clean": "shared_clean_kb",
+                 "Shared_Dirty": "shared_dirty_kb", "Private_Clean": "private_clean_kb",
+                 "Private_Dirty": "private_dirty_kb"}
+
+
+def process_memory(pid: int) -> dict:
+    """RSS / PSS / shared / private kB for one process, from /proc/<pid>/smaps_rollup."""
+    out = {"pid": pid}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as fh:
+            for ln in fh:
+                key, _, rest = ln.partition(":")
+                if key in _SMAPS_FIELDS:
+                    out[_SMAPS_FIELDS[key]] = int(rest.split()[0])
+    except OSError:
+        # no smaps_rollup (non-Linux / old kernel): RSS only
+        try:
+            with open(f"/proc/{pid}/statm") as fh:
+                out["rss_kb"] = int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+        except OSError:
+            pass
+    return out
+
+
+def _children(pid: int) -> list[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as fh:
+            return [int(p) for p in fh.read().split()]
+    except OSError:
+        return []
+
+
+def memory_report() -> dict:
+    """Master + every worker when running under the launcher; just this process otherwise."""
+    master = int(os.getenv(MASTER_PID_ENV, "0") or 0)
+    if not master or not Path(f"/proc/{master}").exists():
+        return {"mode": "single", "workers": [process_memory(os.getpid())]}
+    workers = [process_memory(p) for p in (_children(master) or [os.getpid()])]
+    for w in workers:
+        w["self"] = w["pid"] == os.getpid()
+    return {
+        "mode": "prefork",
+        "master": process_memory(master),
+        "workers": workers,
+        "total_pss_kb": sum(w.get("pss_kb", 0) for w in workers),
+        "total_rss_kb": sum(w.get("rss_kb", 0) for w in workers),
+    }
+
+
+# ---------- master ----------
+
+def _bind(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _spawn(app, sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    # ---- worker ----
+    code = 0
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        _after_fork_in_worker()
+        import uvicorn
+        config = uvicorn.Config(app, log_level=args.log_level, proxy_headers=True,
+                                timeout_keep_alive=args.keep_alive)
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException:
+        log.exception("[prefork] worker %d crashed", os.getpid())
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def serve(args) -> None:
+    # keep the GC from touching (and so un-sharing) the pages we are about to freeze
+    gc.disable()
+    t0 = time.perf_counter()
+    app = build_shared_state()
+    gc.freeze()
+    log.info("[prefork] shared state built in %.0fms (%d objects frozen)",
+             (time.perf_counter() - t0) * 1000, gc.get_freeze_count())
+
+    sock = _bind(args.host, args.port, args.backlog)
+    os.environ[MASTER_PID_ENV] = str(os.getpid())
+    workers = {_spawn(app, sock, args) for _ in range(args.workers)}
+    log.info("[prefork] listening on %s:%d with %d workers: %s", args.host, args.port, len(workers), sorted(workers))
+
+    stopping = False
+
+    def _stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    next_report = time.monotonic() + PREFORK_MEM_REPORT_SECS
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            workers.discard(pid)
+            if not stopping:
+                log.warning("[prefork] worker %d exited (status %d); restarting", pid, status)
+                workers.add(_spawn(app, sock, args))
+            continue
+        if PREFORK_MEM_REPORT_SECS and time.monotonic() >= next_report:
+            next_report = time.monotonic() + PREFORK_MEM_REPORT_SECS
+            for w in memory_report()["workers"]:
+                log.info("[prefork] worker %d rss=%skB pss=%skB shared=%skB", w["pid"], w.get("rss_kb"),
+                         w.get("pss_kb"), w.get("shared_clean_kb", 0) + w.get("shared_dirty_kb", 0))
+        time.sleep(0.2)
+    sock.close()
+    log.info("[prefork] all workers stopped")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Pre-fork launcher: build shared state once, fork uvicorn workers")
+    ap.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    ap.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    ap.add_argument("--backlog", type=int, default=2048)
+    ap.add_argument("--keep-alive", type=int, default=5)
+    ap.add_argument("--log-level", default="info")
+    args = ap.parse_args()
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    serve(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# ================================
+# FILE: app/profiling.py
+# ================================
+"""
+On-demand statistical profiling of individual requests.
+
+A request is profiled when it carries `X-Profile: 1` together with a valid
+`X-Admin-Token`, or when it falls into PROFILE_SAMPLE_RATE. A sampler thread
+snapshots Python stacks every PROFILE_INTERVAL_MS while the request runs and
+keeps only the request's own: on the event loop thread, stacks that pass
+through this request's middleware frame (other requests' coroutines
+interleave there); on threadpool workers, stacks whose copied context carries
+this request's marker (sync endpoints and dependencies). The result is stored
+under the request id and served by
+/admin/profiles/{id}: top-N functions (self / inclusive samples) plus
+collapsed stacks that flamegraph.pl / speedscope read directly.
+
+The id is the client's X-Request-ID when it matches [A-Za-z0-9_-]{1,64} and is
+not taken yet, else a server-generated one; it is returned as X-Profile-Id.
+
+Requests that are not profiled only pay for the trigger check.
+"""
+import os
+import re
+import sys
+import time
+import uuid
+import hmac
+import random
+import logging
+import threading
+import contextvars
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.config import ADMIN_TOKEN
+
+log = logging.getLogger("uvicorn.error").getChild("profiling")
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_TOP_N       = int(os.getenv("PROFILE_TOP_N", "30"))
+PROFILE_KEEP        = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_DIR         = os.getenv("PROFILE_DIR", "")  # optional: also write <id>.collapsed / .json here
+
+_ROOT = str(Path(__file__).resolve().parent.parent)
+_ID_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+_CURRENT: contextvars.ContextVar = contextvars.ContextVar("irh_profile", default=None)  # copied into threadpool work
+_PROFILES: "OrderedDict[str, dict]" = OrderedDict()
+_LOCK = threading.Lock()
+
+
+def is_admin_token(token: str | None) -> bool:
+    return bool(ADMIN_TOKEN and token and hmac.compare_digest(token, ADMIN_TOKEN))
+
+
+def _frame_label(code) -> str:
+    fn = code.co_filename
+    if fn.startswith(_ROOT):
+        fn = fn[len(_ROOT) + 1:]
+    else:
+        fn = os.path.basename(fn)
+    return f"{code.co_name} ({fn})"
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, interval: float, thread_id: int, entry_frame, marker: object):
+        super().__init__(daemon=True, name="irh-profiler")
+        self.interval = interval
+        self.thread_id, self.entry_frame, self.marker = thread_id, entry_frame, marker
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_evt = threading.Event()
+
+    def _ours(self, tid: int, frame) -> bool:
+        """Is this thread running the profiled request right now?"""
+        f = frame
+        while f is not None:
+            if f is self.entry_frame:
+                return True
+            # threadpool workers run the request's work inside context.run(...)
+            if tid != self.thread_id and "context" in f.f_code.co_varnames:
+                ctx = f.f_locals.get("context")
+                if isinstance(ctx, contextvars.Context) and ctx.get(_CURRENT) is self.marker:
+                    return True
+            f = f.f_back
+        return False
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._stop_evt.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me or not self._ours(tid, frame):
+                    continue
+                stack = []
+                f = frame
+                while f is not None:
+                    stack.append(_frame_label(f.f_code))
+                    f = f.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def stop(self):
+        self._stop_evt.set()
+        self.join()
+
+
+def _top(stacks: Counter, total: int, n: int) -> list[dict]:
+    self_c, incl_c = Counter(), Counter()
+    for stack, c in stacks.items():
+        frames = stack.split(";")
+        self_c[frames[-1]] += c
+        for fr in set(frames):
+            incl_c[fr] += c
+    rows = []
+    for fn, inc in incl_c.most_common():
+        rows.append({
+            "function": fn,
+            "self_samples": self_c.get(fn, 0),
+            "total_samples": inc,
+            "self_pct": round(100.0 * self_c.get(fn, 0) / total, 2) if total else 0.0,
+            "total_pct": round(100.0 * inc / total, 2) if total else 0.0,
+        })
+    rows.sort(key=lambda r: (r["self_samples"], r["total_samples"]), reverse=True)
+    return rows[:n]
+
+
+def _store(profile: dict) -> None:
+    with _LOCK:
+        _PROFILES[profile["request_id"]] = profile
+        while len(_PROFILES) > PROFILE_KEEP:
+            _PROFILES.popitem(last=False)
+    if PROFILE_DIR:
+        try:
+            import json
+            d = Path(PROFILE_DIR); d.mkdir(parents=True, exist_ok=True)
+            (d / f"{profile['request_id']}.collapsed").write_text(profile["collapsed"])
+            (d / f"{profile['request_id']}.json").write_text(
+                json.dumps({k: v for k, v in profile.items() if k != "collapsed"}, default=str))
+        except Exception as e:
+            log.warning("[profile] failed to write %s: %s", profile["request_id"], e)
+
+
+def _request_id(client_id: str) -> str:
+    """The client's X-Request-ID when safe to use as a key / file name and still free, else a fresh one."""
+    if _ID_RE.fullmatch(client_id):
+        with _LOCK:
+            if client_id not in _PROFILES:
+                return client_id
+    return uuid.uuid4().hex
+
+
+def get_profile(request_id: str) -> dict | None:
+    with _LOCK:
+        return _PROFILES.get(request_id)
+
+
+def list_profiles() -> list[dict]:
+    with _LOCK:
+        return [{k: p[k] for k in ("request_id", "method", "path", "started_at", "duration_ms", "samples")}
+                for p in reversed(_PROFILES.values())]
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware; see module docstring for triggers."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _should_profile(self, headers: dict) -> bool:
+        if headers.get(b"x-profile") == b"1" and is_admin_token(headers.get(b"x-admin-token", b"").decode()):
+            return True
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or ())
+        if not self._should_profile(headers):
+            return await self.app(scope, receive, send)
+
+        request_id = _request_id(headers.get(b"x-request-id", b"").decode("latin-1"))
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", request_id.encode())]
+            await send(message)
+
+        marker = object()
+        reset = _CURRENT.set(marker)
+        sampler = _Sampler(PROFILE_INTERVAL_MS / 1000.0, threading.get_ident(), sys._getframe(), marker)
+        started = datetime.now(timezone.utc)
+        t0 = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            sampler.stop()
+            _CURRENT.reset(reset)
+            duration_ms = round((time.perf_counter() - t0) * 1000, 3)
+            _store({
+                "request_id": request_id,
+                "method": scope.get("method"),
+                "path": scope.get("path"),
+                "started_at": started.isoformat(),
+                "duration_ms": duration_ms,
+                "interval_ms": PROFILE_INTERVAL_MS,
+                "samples": sampler.samples,
+                "top": _top(sampler.stacks, sampler.samples, PROFILE_TOP_N),
+                "collapsed": "".join(f"{s} {c}\n" for s, c in sampler.stacks.most_common()),
+            })
+            log.info("[profile] %s %s id=%s %.1fms samples=%d", scope.get("method"), scope.get("path"),
+                     request_id, duration_ms, sampler.samples)
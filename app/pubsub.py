@@ -0,0 +1,156 @@
+# ================================
+# FILE: app/pubsub.py
+# ================================
+"""
+In-process pub/sub for live request status (the SSE stream behind
+GET /incident_requests/events).
+
+- Subscribers are keyed by username. Each subscriber is an asyncio.Queue of
+  SSE_BUFFER messages on the event loop that serves its connection. An idle
+  connection is one parked task plus an empty queue: no timers besides the
+  heartbeat, and no database access.
+- The request_status helpers stage changes in session.info. Only an
+  after_commit hook publishes them, so a rolled-back write is never
+  announced. Nothing is staged, and nothing is read back, unless the process
+  has at least one subscriber.
+- publish() may be called from any thread (sync endpoints run in the
+  threadpool, re-match in its own thread). Delivery hops onto the
+  subscriber's loop with call_soon_threadsafe.
+- A slow client never blocks publishers. When its buffer is full, the oldest
+  message is dropped and the stream sends a `resync` event; the client then
+  re-reads /incident_requests/mine.
+
+State is per process. With several workers, a change made in another worker
+is not pushed, so clients should also re-read /incident_requests/mine when
+they (re)connect.
+"""
+import os
+import json
+import asyncio
+import logging
+import threading
+from itertools import count
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.metrics import REGISTRY
+
+log = logging.getLogger("uvicorn.error").getChild("pubsub")
+
+SSE_BUFFER          = int(os.getenv("SSE_BUFFER", "32"))
+SSE_HEARTBEAT_SECS  = float(os.getenv("SSE_HEARTBEAT_SECS", "15"))
+SSE_MAX_CONNECTIONS = int(os.getenv("SSE_MAX_CONNECTIONS", "5000"))
+
+_STAGED = "irh_status_events"
+
+
+class Subscriber:
+    __slots__ = ("user", "queue", "loop", "lagged")
+
+    def __init__(self, user: str, loop: asyncio.AbstractEventLoop, buffer: int = SSE_BUFFER):
+        self.user, self.loop, self.lagged = user, loop, False
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+
+    def _put(self, msg: dict) -> None:  # on self.loop
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.lagged = True
+        self.queue.put_nowait(msg)
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs: dict[str, set[Subscriber]] = {}
+        self._n = 0
+        self._seq = count(1)
+        self.dropped_loops = 0
+
+    def active(self) -> bool:
+        return self._n > 0
+
+    def connections(self) -> int:
+        return self._n
+
+    def subscribe(self, user: str) -> Subscriber | None:
+        """None when SSE_MAX_CONNECTIONS is reached."""
+        sub = Subscriber(user, asyncio.get_running_loop())
+        with self._lock:
+            if self._n >= SSE_MAX_CONNECTIONS:
+                return None
+            self._subs.setdefault(user, set()).add(sub)
+            self._n += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            subs = self._subs.get(sub.user)
+            if subs and sub in subs:
+                subs.discard(sub)
+                self._n -= 1
+                if not subs:
+                    del self._subs[sub.user]
+
+    def publish(self, user: str, data: dict) -> int:
+        """Queue `data` for every connection of `user`; returns how many it went to."""
+        with self._lock:
+            subs = list(self._subs.get(user, ()))
+        msg = {"id": next(self._seq), "data": data}
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._put, msg)
+            except RuntimeError:  # loop closed (worker shutting down)
+                self.dropped_loops += 1
+        return len(subs)
+
+
+BROKER = Broker()
+
+
+def format_event(event_name: str, data: dict, event_id: int | None = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event_name}\ndata: {json.dumps(data, default=str, separators=(',', ':'))}\n\n"
+
+
+async def stream(sub: Subscriber, is_disconnected):
+    """SSE frames for one connection, until the client goes away."""
+    try:
+        yield "retry: 5000\n: connected\n\n"
+        while True:
+            try:
+                msg = await asyncio.wait_for(sub.queue.get(), timeout=SSE_HEARTBEAT_SECS)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    return
+                yield ": ping\n\n"
+                continue
+            if sub.lagged:
+                sub.lagged = False
+                yield format_event("resync", {})
+            yield format_event("status", msg["data"], msg["id"])
+    finally:
+        BROKER.unsubscribe(sub)
+
+
+# ---------- publish after commit ----------
+
+def stage(db: Session, changes: list[tuple[str, dict]]) -> None:
+    """Queue (username, payload) pairs to publish once `db` commits."""
+    if changes:
+        db.info.setdefault(_STAGED, []).extend(changes)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_staged(session) -> None:
+    for user, data in session.info.pop(_STAGED, ()):
+        BROKER.publish(user, data)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged(session) -> None:
+    session.info.pop(_STAGED, None)
+
+
+REGISTRY.add_gauge_collector(lambda: [("irh_sse_connections", "Open status-stream connections", {},
+                                       BROKER.connections())])
@@ -0,0 +1,73 @@
+# ================================
+# FILE: app/raw_store.py
+# ================================
+import os
+import zlib
+import logging
+
+from sqlalchemy.orm import Session
+
+from app import models
+
+log = logging.getLogger("uvicorn.error").getChild("raw_store")
+
+# zstd when the optional `zstandard` package is installed, zlib otherwise
+try:
+    import zstandard as _zstd
+except ImportError:  # optional dependency
+    _zstd = None
+
+CODEC = "zstd" if _zstd is not None else "zlib"
+ZLIB_LEVEL = int(os.getenv("RAW_ZLIB_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("RAW_ZSTD_LEVEL", "10"))
+PREVIEW_CHARS = int(os.getenv("INBOUND_PREVIEW_CHARS", "280"))
+
+
+def compress(s: str | None, codec: str = CODEC) -> bytes | None:
+    if not s:
+        return None
+    data = s.encode("utf-8", "surrogatepass")
+    if codec == "zstd":
+        return _zstd.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress(blob: bytes | None, codec: str) -> str:
+    if not blob:
+        return ""
+    if codec == "zstd":
+        if _zstd is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed rows")
+        data = _zstd.ZstdDecompressor().decompress(blob)
+    else:
+        data = zlib.decompress(blob)
+    return data.decode("utf-8", "surrogatepass")
+
+
+def preview(text: str, html: str) -> str:
+    """Narrow inline preview stored on inbound_emails.body."""
+    return (text or html or "")[:PREVIEW_CHARS]
+
+
+def build_raw(text: str, html: str, headers: str) -> models.InboundRaw:
+    """Compressed raw row; caller attaches it to an InboundEmail (same transaction)."""
+    text_z, html_z, headers_z = compress(text), compress(html), compress(headers)
+    raw_bytes = sum(len((s or "").encode("utf-8", "surrogatepass")) for s in (text, html, headers))
+    stored = sum(len(b) for b in (text_z, html_z, headers_z) if b)
+    return models.InboundRaw(codec=CODEC, text_z=text_z, html_z=html_z, headers_z=headers_z,
+                             raw_bytes=raw_bytes, stored_bytes=stored)
+
+
+def load_raw(db: Session, inbound_id: int) -> dict | None:
+    """Decompress the full text/html/headers for one inbound email."""
+    raw = db.get(models.InboundRaw, inbound_id)
+    if raw is None:
+        return None
+    return {
+        "text": decompress(raw.text_z, raw.codec),
+        "html": decompress(raw.html_z, raw.codec),
+        "headers": decompress(raw.headers_z, raw.codec),
+        "codec": raw.codec,
+        "raw_bytes": raw.raw_bytes,
+        "stored_bytes": raw.stored_bytes,
+    }
@@ -0,0 +1,210 @@
+# ================================
+# FILE: app/reparse.py
+# ================================
+"""
+Incremental re-parse of historical inbound emails.
+
+Rows whose inbound_emails.parser_version is older than
+email_parser.PARSER_VERSION are streamed through the current parser in
+id-ordered chunks:
+
+- the parent reads one chunk (compressed raw bodies only) per short query,
+- a process pool decompresses and parses (CPU-bound, off the web workers),
+- the parent writes the chunk back with one executemany UPDATE in its own
+  short transaction, and refreshes the search index for changed rows,
+- after every chunk, {version, last_id, counters} goes to a checkpoint file,
+  so an interrupted run resumes where it stopped.
+
+The LLM is off in the pool unless --allow-llm is given. With it, rows stored
+with needs_llm (the LLM was skipped under load, see app.llm_governor) are
+included as well, whatever their version; a row the LLM defers again keeps
+needs_llm, so once such a run finishes, the next one starts over from id 0
+instead of resuming past it. A new parse never replaces existing fields with
+blanks: those rows only get their version bumped. parsed_state is recomputed
+from the fields kept (as /inbound does), so rematch and scoring filter on the
+state of the current parse. The live webhook keeps writing the current
+version, and the UPDATE only touches rows still below it, so the job and
+/inbound never race on the same row. Use --sleep to throttle on a busy
+primary.
+
+    python -m app.reparse [--workers 4] [--chunk 500] [--sleep 0.05] [--rematch]
+"""
+import os
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+from sqlalchemy import bindparam, text, update
+
+log = logging.getLogger("uvicorn.error").getChild("reparse")
+
+REPARSE_CHECKPOINT = os.getenv("REPARSE_CHECKPOINT", "./reparse.checkpoint.json")
+REPARSE_CHUNK      = int(os.getenv("REPARSE_CHUNK", "500"))
+
+_FIELDS = ("parsed_address", "parsed_datetime", "parsed_county")
+
+
+# ---------- worker side ----------
+
+def _init_worker(allow_llm: bool) -> None:
+    import app.email_parser as ep
+    from app import parser_templates
+    from app.database import engine
+
+    logging.disable(logging.INFO)
+    engine.dispose(close=False)  # forget the parent's connections without closing its sockets
+    parser_templates._reload()  # once per worker (a failure is logged and leaves no templates)
+    parser_templates.PARSER_TEMPLATE_TTL_SECS = float("inf")  # never reload mid-run
+    if not allow_llm:
+        ep.USE_LLM = False
+        if ep.MODE == "llm_only":
+            ep.MODE = "regex_first"
+
+
+def reparse_row(row: dict) -> dict:
+    """Parse one row (runs in the pool). Returns new fields and, when they changed, the search document."""
+    from app.config import infer_state
+    from app.email_parser import parse_inbound
+    from app.raw_store import decompress
+    from app.search import document
+
+    if row["codec"]:
+        text_body = decompress(row["text_z"], row["codec"])
+        html = decompress(row["html_z"], row["codec"])
+    else:
+        text_body, html = row["body"] or "", ""  # rows stored before inbound_raw existed
+    res = parse_inbound(text_body, html, row["sender"] or "")
+    deferred = res.source == "llm_deferred"
+    new = dict(zip(_FIELDS, (res.address or None, res.datetime or None, res.county or None)))
+    old = {f: row[f] for f in _FIELDS}
+    kept = new if any(new.values()) else old  # a blank parse never wipes stored fields
+    # as /inbound does: None = the county's requests in any state
+    state = infer_state(kept["parsed_address"] or "", row["sender"] or "") if kept["parsed_county"] else None
+    if not any(new.values()) or new == old:
+        return {"id": row["id"], "changed": False, "source": res.source, "needs_llm": deferred, "parsed_state": state}
+    head, body = document(SimpleNamespace(subject=row["subject"], sender=row["sender"],
+                                          parsed_address=new["parsed_address"],
+                                          parsed_datetime=new["parsed_datetime"],
+                                          parsed_county=new["parsed_county"]), text_body, html)
+    return {"id": row["id"], "changed": True, "source": res.source, "needs_llm": deferred, **new,
+            "parsed_state": state, "head": head, "body": body}
+
+
+# ---------- parent side ----------
+
+def _load_checkpoint(path: Path, version: int, llm: bool = False) -> dict:
+    if path.exists():
+        cp = json.loads(path.read_text())
+        if cp.get("version") == version and cp.get("llm", False) == llm:  # the two modes select different rows
+            if not (llm and cp.get("done")):  # a finished LLM pass still leaves its deferred rows to retry
+                return cp
+    return {"version": version, "llm": llm, "last_id": 0, "scanned": 0, "updated": 0, "unchanged": 0}
+
+
+def _save_checkpoint(path: Path, cp: dict) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(cp))
+    tmp.replace(path)
+
+
+def _fetch(db, version: int, last_id: int, n: int, llm_backlog: bool = False) -> list[dict]:
+    stale = "(e.parser_version < :v OR e.needs_llm = :t)" if llm_backlog else "e.parser_version < :v"
+    sql = text(
+        "SELECT e.id, e.subject, e.sender, e.body, e.parsed_address, e.parsed_datetime, e.parsed_county, "
+        "r.codec, r.text_z, r.html_z "
+        "FROM inbound_emails e LEFT JOIN inbound_raw r ON r.inbound_id = e.id "
+        f"WHERE {stale} AND e.id > :last ORDER BY e.id LIMIT :n"
+    )
+    rows = db.execute(sql, {"v": version, "t": True, "last": last_id, "n": n}).mappings().all()
+    db.rollback()  # end the read transaction before the (long) parse
+    return [{**r, "text_z": bytes(r["text_z"]) if r["text_z"] is not None else None,
+             "html_z": bytes(r["html_z"]) if r["html_z"] is not None else None} for r in rows]
+
+
+def _write(db, version: int, results: list[dict]) -> None:
+    from app import models
+    from app.search import index_document
+
+    t = models.InboundEmail.__table__  # Core executemany: one round trip per chunk
+    guard = (t.c.id == bindparam("b_id")) & ((t.c.parser_version < version) | t.c.needs_llm)
+    changed = [r for r in results if r["changed"]]
+    if changed:
+        db.execute(update(t).where(guard).values(
+            parser_version=version,
+            needs_llm=bindparam("b_llm"),
+            parsed_address=bindparam("b_addr"),
+            parsed_datetime=bindparam("b_dt"),
+            parsed_county=bindparam("b_cnty"),
+            parsed_state=bindparam("b_state"),
+        ), [{"b_id": r["id"], "b_llm": r["needs_llm"], "b_addr": r["parsed_address"], "b_dt": r["parsed_datetime"],
+             "b_cnty": r["parsed_county"], "b_state": r["parsed_state"]} for r in changed])
+        for r in changed:
+            index_document(db, r["id"], r["head"], r["body"])
+    same = [{"b_id": r["id"], "b_llm": r["needs_llm"], "b_state": r["parsed_state"]}
+            for r in results if not r["changed"]]
+    if same:
+        db.execute(update(t).where(guard).values(parser_version=version, needs_llm=bindparam("b_llm"),
+                                                 parsed_state=bindparam("b_state")), same)
+    db.commit()
+
+
+def run(db, workers: int | None = None, chunk: int = REPARSE_CHUNK, checkpoint: str | Path = REPARSE_CHECKPOINT,
+        sleep: float = 0.0, allow_llm: bool = False, max_rows: int | None = None) -> dict:
+    from app.email_parser import PARSER_VERSION
+
+    cp_path = Path(checkpoint)
+    cp = _load_checkpoint(cp_path, PARSER_VERSION, allow_llm)
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(allow_llm,)) as pool:
+        while max_rows is None or cp["scanned"] < max_rows:
+            rows = _fetch(db, PARSER_VERSION, cp["last_id"], chunk, llm_backlog=allow_llm)
+            if not rows:
+                cp["done"] = True
+                _save_checkpoint(cp_path, cp)
+                break
+            results = list(pool.map(reparse_row, rows, chunksize=max(1, len(rows) // (workers * 4))))
+            _write(db, PARSER_VERSION, results)
+            n_changed = sum(r["changed"] for r in results)
+            cp.update(last_id=rows[-1]["id"], scanned=cp["scanned"] + len(rows),
+                      updated=cp["updated"] + n_changed, unchanged=cp["unchanged"] + len(rows) - n_changed)
+            _save_checkpoint(cp_path, cp)
+            log.info("[reparse] v%d through id=%d: scanned=%d updated=%d",
+                     PARSER_VERSION, cp["last_id"], cp["scanned"], cp["updated"])
+            if sleep:
+                time.sleep(sleep)
+    cp["elapsed_s"] = round(time.perf_counter() - t0, 2)
+    return cp
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Re-parse inbound emails stored with an older parser version")
+    ap.add_argument("--workers", type=int, default=None, help="parser processes (default: CPUs - 1)")
+    ap.add_argument("--chunk", type=int, default=REPARSE_CHUNK)
+    ap.add_argument("--checkpoint", default=REPARSE_CHECKPOINT)
+    ap.add_argument("--sleep", type=float, default=0.0, help="pause between chunks (secs)")
+    ap.add_argument("--max-rows", type=int, default=None)
+    ap.add_argument("--allow-llm", action="store_true",
+                    help="let the parser fall back to the LLM; also re-parses rows marked needs_llm")
+    ap.add_argument("--rematch", action="store_true", help="re-match (and forward) afterwards")
+    args = ap.parse_args()
+
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        out = run(db, workers=args.workers, chunk=args.chunk, checkpoint=args.checkpoint, sleep=args.sleep,
+                  allow_llm=args.allow_llm, max_rows=args.max_rows)
+        if args.rematch:
+            from app.matching import rematch
+            out["rematched"] = len(rematch(db))
+    finally:
+        db.close()
+    print(json.dumps(out))
+
+
+if __name__ == "__main__":
+    main()
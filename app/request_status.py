@@ -0,0 +1,148 @@
+# ================================
+# FILE: app/request_status.py
+# ================================
+"""
+Denormalized progress on incident_requests.
+
+The pipeline stamps each step on the request row as it happens, so
+GET /incident_requests/mine is one index range scan with no join to
+inbound_emails:
+
+    pending -> sent -> replied -> forwarded -> delivered
+          \\-> send_failed          \\-> forward_failed
+
+- sent       the county request went out (routes_requests)
+- replied    a reply was matched: /inbound, re-match, or an accepted review
+- forwarded  the reply went to the requester (routes_inbound.forward_reply)
+- delivered  SendGrid's event webhook reported delivery of that forward.
+             A bounce or drop of the forward means forward_failed; of the
+             county request, send_failed.
+
+Every write is one UPDATE whose CASE only moves status forward, so steps that
+arrive out of order (a late "sent" after a fast reply, a deferred event after
+delivered) never move a request back. The mark_* helpers do not commit: they
+run in the caller's transaction, next to the write they describe, and bump
+row_version, which the ETags of app.http_cache are built from. While anyone is
+connected to the status stream, each change is also staged for app.pubsub,
+which publishes it when that transaction commits.
+"""
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, case, func, select, update
+from sqlalchemy.orm import Session
+
+from app.models import IncidentRequest, InboundEmail
+from app.pubsub import BROKER, stage
+
+log = logging.getLogger("uvicorn.error").getChild("request_status")
+
+R = IncidentRequest.__table__
+
+# each status may be overwritten only by these later ones
+_BEFORE = {
+    "sent": ("pending", "send_failed"),
+    "send_failed": ("pending", "sent"),
+    "replied": ("pending", "sent", "send_failed"),
+    "forwarded": ("pending", "sent", "send_failed", "replied", "forward_failed"),
+    "forward_failed": ("forwarded",),
+    "delivered": ("pending", "sent", "send_failed", "replied", "forwarded", "forward_failed"),
+}
+FINAL_EVENTS = {"delivered", "bounce", "dropped"}
+TRACKED_EVENTS = FINAL_EVENTS | {"deferred"}
+
+
+PUBLIC_FIELDS = ("id", "incident_address", "incident_datetime", "county", "state", "status", "created_at", "sent_at",
+                 "replied_at", "reply_count", "forwarded_at", "delivered_at")
+
+
+def _announce(db: Session, where) -> None:
+    """Stage the new state of the matching requests for their owners' status streams."""
+    if not BROKER.active():
+        return
+    rows = db.execute(select(R.c.created_by, *(R.c[f] for f in PUBLIC_FIELDS)).where(where)).all()
+    stage(db, [(r.created_by, {f: getattr(r, f) for f in PUBLIC_FIELDS}) for r in rows if r.created_by])
+
+
+def _advance(to: str):
+    return case((R.c.status.in_(_BEFORE[to]), to), else_=R.c.status)
+
+
+def _bump():
+    return R.c.row_version + 1
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def mark_sent(db: Session, request_id: int, sg_msg_id: str | None) -> None:
+    db.execute(update(R).where(R.c.id == request_id).values(
+        status=_advance("sent"), row_version=_bump(), sent_at=_now(), request_sg_message_id=sg_msg_id))
+    _announce(db, R.c.id == request_id)
+
+
+def mark_send_failed(db: Session, request_id: int) -> None:
+    db.execute(update(R).where(R.c.id == request_id).values(
+        status=_advance("send_failed"), row_version=_bump()))
+    _announce(db, R.c.id == request_id)
+
+
+def mark_replied(db: Session, matches: list[tuple[int, int]]) -> None:
+    """matches: (request_id, inbound_id) pairs, one executemany."""
+    if not matches:
+        return
+    db.execute(update(R).where(R.c.id == bindparam("b_rid")).values(
+        status=_advance("replied"),
+        row_version=_bump(),
+        replied_at=func.coalesce(R.c.replied_at, _now()),
+        reply_count=R.c.reply_count + 1,
+        last_inbound_id=bindparam("b_iid"),
+    ), [{"b_rid": r, "b_iid": i} for r, i in matches])
+    _announce(db, R.c.id.in_({r for r, _ in matches}))
+
+
+def mark_forwarded(db: Session, request_id: int, sg_msg_id: str | None) -> None:
+    db.execute(update(R).where(R.c.id == request_id).values(
+        status=_advance("forwarded"), row_version=_bump(), forwarded_at=_now(), forward_sg_message_id=sg_msg_id))
+    _announce(db, R.c.id == request_id)
+
+
+def apply_events(db: Session, events: list[dict]) -> int:
+    """
+    SendGrid Event Webhook batch -> forward_status on the reply, status on the
+    request. Returns the number of events that matched a tracked message (commits).
+    """
+    E = InboundEmail.__table__
+    applied = 0
+    for ev in events:
+        kind = ev.get("event")
+        msg_id = (ev.get("sg_message_id") or "").split(".")[0]  # "<X-Message-Id>.filter..."
+        if kind not in TRACKED_EVENTS or not msg_id:
+            continue
+        at = datetime.fromtimestamp(ev["timestamp"], timezone.utc) if ev.get("timestamp") else _now()
+        final = kind in FINAL_EVENTS
+        row = update(E).where(E.c.forward_sg_message_id == msg_id)
+        if not final:  # a late "deferred" never hides a delivery / bounce
+            row = row.where(E.c.forward_status.is_(None) | E.c.forward_status.notin_(FINAL_EVENTS))
+        n = db.execute(row.values(forward_status=kind)).rowcount
+        if kind == "delivered":
+            n += db.execute(update(R).where(R.c.forward_sg_message_id == msg_id).values(
+                status=_advance("delivered"), row_version=_bump(),
+                delivered_at=func.coalesce(R.c.delivered_at, at))).rowcount
+        elif final:
+            n += db.execute(update(R).where(R.c.forward_sg_message_id == msg_id)
+                            .values(status=_advance("forward_failed"), row_version=_bump())).rowcount
+            n += db.execute(update(R).where(R.c.request_sg_message_id == msg_id)
+                            .values(status=_advance("send_failed"), row_version=_bump())).rowcount
+        if final:
+            _announce(db, (R.c.forward_sg_message_id == msg_id) | (R.c.request_sg_message_id == msg_id))
+        applied += bool(n)
+    db.commit()
+    log.info("[events] %d of %d event(s) applied", applied, len(events))
+    return applied
+
+
+def public(req: IncidentRequest) -> dict:
+    """The requester-facing view of one request."""
+    return {f: getattr(req, f) for f in PUBLIC_FIELDS}
@@ -0,0 +1,220 @@
+# ================================
+# FILE: app/resilience.py
+# ================================
+"""
+Request deadlines and circuit breakers for external calls.
+
+Deadline: DeadlineMiddleware gives every HTTP request an absolute deadline
+(REQUEST_DEADLINE_SECS from arrival) in a contextvar. Sync endpoints and
+their helpers see it too, because Starlette's threadpool copies the context.
+Background work escapes it with `with detached():` and may set its own
+with `with deadline(secs):`. Each
+provider call asks `protected()` for its timeout, which is the smaller of
+the per-call cap and the time the request has left. A call is not started
+at all once the deadline has passed.
+
+Breakers, one per dependency (openai, sendgrid_send, sendgrid_activity):
+
+- closed:    calls go through. BREAKER_FAILURES consecutive failures open it.
+- open:      calls fail immediately with CircuitOpen for BREAKER_RESET_SECS.
+- half_open: up to BREAKER_HALF_OPEN_MAX probe calls go through. A success
+             closes the breaker; a failure opens it again.
+
+Client errors (HTTP 4xx other than 429) do not count as failures: the
+provider answered. State is per process. It is exposed at /admin/breakers
+and as irh_circuit_state on /metrics.
+"""
+import os
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from app.metrics import REGISTRY, Counter, external_call
+
+log = logging.getLogger("uvicorn.error").getChild("resilience")
+
+REQUEST_DEADLINE_SECS = float(os.getenv("REQUEST_DEADLINE_SECS", "25"))  # under the proxy's 30s
+BREAKER_FAILURES      = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECS    = float(os.getenv("BREAKER_RESET_SECS", "30"))
+BREAKER_HALF_OPEN_MAX = int(os.getenv("BREAKER_HALF_OPEN_MAX", "1"))
+
+# per-call caps; the request deadline can only shorten them
+CALL_TIMEOUTS = {
+    "openai": float(os.getenv("OPENAI_TIMEOUT_SECS", "20")),
+    "sendgrid_send": float(os.getenv("SENDGRID_TIMEOUT_SECS", "15")),
+    "sendgrid_activity": float(os.getenv("SENDGRID_ACTIVITY_TIMEOUT_SECS", "10")),
+}
+
+BREAKER_REJECTIONS = REGISTRY.register(Counter(
+    "irh_circuit_rejected_total", "Calls refused by an open breaker or an expired deadline", ("dependency", "reason")))
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpen(RuntimeError):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit open; retry in {retry_after:.0f}s")
+        self.name, self.retry_after = name, retry_after
+
+
+# ---------- deadlines ----------
+
+_DEADLINE: contextvars.ContextVar[float | None] = contextvars.ContextVar("irh_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Run the block under a deadline `seconds` from now (an outer, earlier deadline still wins)."""
+    at = time.monotonic() + seconds
+    cur = _DEADLINE.get()
+    token = _DEADLINE.set(at if cur is None else min(cur, at))
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+@contextmanager
+def detached():
+    """Run the block with no deadline (background work started from a request, e.g. BackgroundTasks)."""
+    token = _DEADLINE.set(None)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left before the current deadline; None when there is none."""
+    at = _DEADLINE.get()
+    return None if at is None else at - time.monotonic()
+
+
+def timeout_for(cap: float) -> float:
+    left = remaining()
+    if left is None:
+        return cap
+    if left <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+    return min(cap, left)
+
+
+class DeadlineMiddleware:
+    """Pure ASGI middleware: every HTTP request runs under REQUEST_DEADLINE_SECS."""
+
+    def __init__(self, app, seconds: float | None = None):
+        self.app = app
+        self.seconds = REQUEST_DEADLINE_SECS if seconds is None else seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.seconds <= 0:
+            return await self.app(scope, receive, send)
+        with deadline(self.seconds):
+            await self.app(scope, receive, send)
+
+
+# ---------- breakers ----------
+
+def _counts_as_failure(exc: BaseException) -> bool:
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return not (isinstance(status, int) and 400 <= status < 500 and status != 429)
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset_secs: float = BREAKER_RESET_SECS,
+                 half_open_max: int = BREAKER_HALF_OPEN_MAX):
+        self.name, self.failures, self.reset_secs, self.half_open_max = name, failures, reset_secs, half_open_max
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.last_error: str | None = None
+
+    def before(self) -> None:
+        """Raise CircuitOpen unless a call may go through now."""
+        with self._lock:
+            if self.state == "open":
+                wait = self.reset_secs - (time.monotonic() - self.opened_at)
+                if wait > 0:
+                    raise CircuitOpen(self.name, wait)
+                self.state, self.probes = "half_open", 0
+                log.info("[breaker] %s half-open", self.name)
+            if self.state == "half_open":
+                if self.probes >= self.half_open_max:
+                    raise CircuitOpen(self.name, self.reset_secs)
+                self.probes += 1
+
+    def success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                log.info("[breaker] %s closed", self.name)
+            self.state, self.consecutive, self.probes = "closed", 0, 0
+
+    def failure(self, exc: BaseException) -> None:
+        with self._lock:
+            self.last_error = f"{type(exc).__name__}: {exc}"[:300]
+            self.consecutive += 1
+            if self.state == "half_open" or self.consecutive >= self.failures:
+                if self.state != "open":
+                    log.warning("[breaker] %s open after %d failure(s): %s", self.name, self.consecutive,
+                                self.last_error)
+                self.state, self.opened_at, self.probes = "open", time.monotonic(), 0
+
+    def reset(self) -> None:
+        with self._lock:
+            self.state, self.consecutive, self.probes, self.last_error = "closed", 0, 0, None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = max(0.0, self.reset_secs - (time.monotonic() - self.opened_at)) if self.state == "open" else 0.0
+            return {"state": self.state, "consecutive_failures": self.consecutive,
+                    "retry_in_s": round(retry_in, 1), "last_error": self.last_error}
+
+
+BREAKERS = {name: CircuitBreaker(name) for name in CALL_TIMEOUTS}
+
+
+@contextmanager
+def protected(dependency: str, service: str, op: str):
+    """
+    Guard one provider call: yields the timeout to pass to the client, fails
+    fast on an expired deadline or open breaker, records the outcome.
+    """
+    br = BREAKERS[dependency]
+    try:
+        timeout = timeout_for(CALL_TIMEOUTS[dependency])
+        br.before()
+    except DeadlineExceeded:
+        BREAKER_REJECTIONS.inc(dependency=dependency, reason="deadline")
+        raise
+    except CircuitOpen:
+        BREAKER_REJECTIONS.inc(dependency=dependency, reason="open")
+        raise
+    try:
+        with external_call(service, op):
+            yield timeout
+    except BaseException as e:
+        if _counts_as_failure(e):
+            br.failure(e)
+        else:
+            br.success()
+        raise
+    br.success()
+
+
+def snapshot() -> dict:
+    return {name: br.snapshot() for name, br in BREAKERS.items()}
+
+
+_STATE_NO = {"closed": 0, "half_open": 1, "open": 2}
+REGISTRY.add_gauge_collector(lambda: [
+    ("irh_circuit_state", "Breaker state (0 closed, 1 half-open, 2 open)", {"dependency": n}, _STATE_NO[b.state])
+    for n, b in BREAKERS.items()
+])
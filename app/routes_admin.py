@@ -3,22 +3,35 @@
 # ================================
 import os
 import logging
-import httpx
-from fastapi import APIRouter, Query, HTTPException, Depends
+from fastapi import APIRouter, Query, HTTPException, Depends, Header, Request
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import get_db, get_read_db, pool_stats, replica_stats
 from app.models import InboundEmail
+from app.raw_store import load_raw
+from app.resilience import protected
+from app.http_cache import cached_json
+from app.profiling import is_admin_token, get_profile, list_profiles
+from app.matching import REMATCH_WINDOW_DAYS
 
 router = APIRouter(tags=["admin"])  # make sure main.py includes this router
 log = logging.getLogger("uvicorn.error").getChild("routes_admin")
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 
-@router.get("/admin/forward-status")
+def require_admin(x_admin_token: str | None = Header(default=None)):
+    """Gate for admin-only endpoints: X-Admin-Token must equal ADMIN_TOKEN."""
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@router.get("/admin/forward-status", dependencies=[Depends(require_admin)])
 def forward_status(
+    request: Request,
     inbound_id: int | None = Query(default=None),
     sg_msg_id: str | None = Query(default=None),
-    db: Session = Depends(get_db),
+    live: bool = Query(default=True, description="false: stored status only (kept current by /sendgrid/events); "
+                                                  "supports If-None-Match"),
+    db: Session = Depends(get_read_db),
 ):
     """Return stored forward tracking and (if available) live status from SendGrid Email Activity API."""
     if not (inbound_id or sg_msg_id):
@@ -39,17 +52,24 @@ def forward_status(
         "forwarded_at": getattr(row, "forwarded_at", None),
         "sg_msg_id": sg_msg_id,
     }
+    if not (live and sg_msg_id and SENDGRID_API_KEY):
+        return cached_json(request, route="forward_status", tables=("inbound_emails",),
+                           validator=lambda: tuple(out.values()), render=lambda: {**out, "activity": None})
 
     # Optional live lookup via SendGrid Email Activity API
     activity = None
     if sg_msg_id and SENDGRID_API_KEY:
         try:
+            import httpx
             q = f'msg_id="{sg_msg_id}"'
             url = "https://api.sendgrid.com/v3/messages"
             headers = {"Authorization": f"Bearer {SENDGRID_API_KEY}"}
             params = {"query": q, "limit": 1}
-            with httpx.Client(timeout=10.0) as client:
+            with protected("sendgrid_activity", "sendgrid", "activity") as timeout, \
+                    httpx.Client(timeout=timeout) as client:
                 r = client.get(url, headers=headers, params=params)
+                if r.status_code >= 500 or r.status_code == 429:
+                    r.raise_for_status()  # counts against the breaker
                 if r.status_code == 200:
                     activity = r.json()
                 else:
@@ -58,4 +78,167 @@ def forward_status(
             log.info("[admin] activity lookup error: %s", e)
 
     out["activity"] = activity
-    return out
\ No newline at end of file
+    return out
+
+@router.get("/admin/inbound/{inbound_id}/raw", dependencies=[Depends(require_admin)])
+def inbound_raw(inbound_id: int, db: Session = Depends(get_read_db)):
+    """Full (decompressed) text/html/headers for one inbound email."""
+    raw = load_raw(db, inbound_id)
+    if raw is None:
+        raise HTTPException(status_code=404, detail="Raw message not found")
+    return {"inbound_id": inbound_id, **raw}
+
+
+@router.get("/admin/search", dependencies=[Depends(require_admin)])
+def search_inbound(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: str | None = Query(default=None),
+    db: Session = Depends(get_read_db),
+):
+    """Ranked full-text search over inbound emails; pass next_cursor back as `cursor` for the next page."""
+    from app.search import search
+    try:
+        return search(db, q, limit=limit, cursor=cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.post("/admin/rematch", dependencies=[Depends(require_admin)])
+def rematch_now(
+    window_days: int = Query(default=REMATCH_WINDOW_DAYS, ge=1, le=3650),
+    forward: bool = Query(default=True),
+    db: Session = Depends(get_db),
+):
+    """Match (and forward) unmatched replies from the last `window_days` against all requests."""
+    from app.matching import rematch
+    return {"matched": rematch(db, window_days=window_days, forward=forward)}
+
+
+@router.get("/admin/match-reviews", dependencies=[Depends(require_admin)])
+def match_reviews(
+    request: Request,
+    status: str = Query(default="pending", pattern="^(pending|accepted|rejected|already_matched)$"),
+    limit: int = Query(default=50, ge=1, le=500),
+    db: Session = Depends(get_read_db),
+):
+    """Replies whose scored candidates were too close to call, newest first."""
+    import json
+    from sqlalchemy import func
+    from app.models import MatchReview
+
+    def validator():
+        return (db.query(func.count(MatchReview.id), func.max(MatchReview.id), func.max(MatchReview.resolved_at))
+                .filter(MatchReview.status == status).one())
+
+    def render():
+        rows = (db.query(MatchReview).filter(MatchReview.status == status)
+                .order_by(MatchReview.id.desc()).limit(limit).all())
+        return {"reviews": [{"id": r.id, "inbound_id": r.inbound_id, "top_score": r.top_score, "status": r.status,
+                             "candidates": json.loads(r.candidates), "resolved_request_id": r.resolved_request_id,
+                             "resolved_by": r.resolved_by, "created_at": r.created_at,
+                             "resolved_at": r.resolved_at} for r in rows]}
+
+    return cached_json(request, route="match_reviews", tables=("match_reviews",), validator=validator,
+                       render=render)
+
+@router.post("/admin/match-reviews/{review_id}/resolve", dependencies=[Depends(require_admin)])
+def resolve_match_review(
+    review_id: int,
+    request_id: int | None = Query(default=None, description="request to match; omit to reject all candidates"),
+    resolved_by: str | None = Query(default=None, max_length=100),
+    db: Session = Depends(get_db),
+):
+    """Match the reply to `request_id` and forward it, or reject the candidates."""
+    from app.models import MatchReview, IncidentRequest
+    from app.scoring import resolve_review
+    review = db.get(MatchReview, review_id)
+    if not review:
+        raise HTTPException(status_code=404, detail="Review not found")
+    if review.status != "pending":
+        raise HTTPException(status_code=409, detail=f"Review already {review.status}")
+    if request_id is not None and not db.get(IncidentRequest, request_id):
+        raise HTTPException(status_code=404, detail="IncidentRequest not found")
+    return resolve_review(db, review, request_id, resolved_by=resolved_by)
+
+
+@router.get("/admin/parser-templates", dependencies=[Depends(require_admin)])
+def parser_templates(request: Request, db: Session = Depends(get_read_db)):
+    """Learned per-sender-domain extraction labels."""
+    from sqlalchemy import func
+    from app.models import ParserTemplate as T
+
+    def validator():
+        return db.query(func.count(T.domain), func.max(T.updated_at), func.sum(T.support), func.sum(T.samples)).one()
+
+    def render():
+        rows = db.query(T).order_by(T.domain).all()
+        return {"templates": [{"domain": t.domain, "address": t.address_label, "datetime": t.datetime_label,
+                               "county": t.county_label, "support": t.support, "samples": t.samples,
+                               "updated_at": t.updated_at} for t in rows]}
+
+    return cached_json(request, route="parser_templates", tables=("parser_templates",), validator=validator,
+                       render=render)
+
+@router.post("/admin/parser-templates/learn", dependencies=[Depends(require_admin)])
+def learn_parser_templates(days: int = Query(default=365, ge=1, le=3650), db: Session = Depends(get_db)):
+    """Re-derive templates from matched replies and reload this worker's cache."""
+    from app.parser_templates import learn
+    learned = learn(db, days=days)
+    return {"learned": {d: t["labels"] for d, t in learned.items()}}
+
+
+@router.get("/admin/db/pool", dependencies=[Depends(require_admin)])
+def db_pool():
+    """Connection pool state (checked-out, overflow, wait times) for sizing."""
+    return pool_stats()
+
+
+@router.get("/admin/db/replica", dependencies=[Depends(require_admin)])
+def db_replica():
+    """Read-replica routing: measured lag, where read-only endpoints go now, sessions opened per database."""
+    return replica_stats()
+
+
+@router.get("/admin/breakers", dependencies=[Depends(require_admin)])
+def breakers():
+    """Circuit breaker state per external dependency (closed / half_open / open)."""
+    from app.resilience import snapshot
+    return snapshot()
+
+
+@router.get("/admin/llm", dependencies=[Depends(require_admin)])
+def llm_governor():
+    """LLM admission state: calls in flight / waiting, token budget left this minute."""
+    from app.llm_governor import GOVERNOR
+    return GOVERNOR.stats()
+
+
+@router.get("/admin/http-cache", dependencies=[Depends(require_admin)])
+def http_cache():
+    """Conditional-GET response cache: entries held in this worker."""
+    from app.http_cache import CACHE
+    return CACHE.stats()
+
+
+@router.get("/admin/workers", dependencies=[Depends(require_admin)])
+def workers():
+    """Per-worker RSS / PSS / shared memory (all workers when started via app.prefork)."""
+    from app.prefork import memory_report
+    return memory_report()
+
+
+@router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def profiles():
+    """Recently captured request profiles (newest first)."""
+    return {"profiles": list_profiles()}
+
+@router.get("/admin/profiles/{request_id}", dependencies=[Depends(require_admin)])
+def profile(request_id: str, format: str = Query(default="json", pattern="^(json|collapsed)$")):
+    """Top-N functions (json) or collapsed stacks for flamegraph.pl / speedscope (collapsed)."""
+    p = get_profile(request_id)
+    if not p:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return PlainTextResponse(p["collapsed"])
+    return {k: v for k, v in p.items() if k != "collapsed"}
@@ -0,0 +1,41 @@
+# ================================
+# FILE: app/routes_attachments.py
+# ================================
+import logging
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, Response
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.models import StoredAttachment
+from app.attachment_store import verify, ATTACHMENT_DIR, ATTACHMENT_ACCEL_REDIRECT
+
+log = logging.getLogger("uvicorn.error").getChild("routes_attachments")
+router = APIRouter(tags=["attachments"])
+
+@router.get("/attachments/{att_id}")
+def download_attachment(att_id: str, exp: int = Query(...), sig: str = Query(...),
+                        db: Session = Depends(get_db)):
+    """Signed, time-limited download of a link-forwarded attachment (supports Range)."""
+    problem = verify(att_id, exp, sig)
+    if problem == "bad_signature":
+        raise HTTPException(status_code=403, detail="Invalid link")
+    if problem == "expired":
+        raise HTTPException(status_code=410, detail="Link expired")
+
+    att = db.get(StoredAttachment, att_id)
+    if not att or not Path(att.path).is_file():
+        raise HTTPException(status_code=404, detail="Attachment not found")
+
+    if ATTACHMENT_ACCEL_REDIRECT:
+        # let nginx stream the file (sendfile, Range) from an internal location
+        rel = Path(att.path).relative_to(ATTACHMENT_DIR).as_posix()
+        return Response(headers={
+            "X-Accel-Redirect": ATTACHMENT_ACCEL_REDIRECT.rstrip("/") + "/" + rel,
+            "Content-Type": att.content_type,
+            "Content-Disposition": 'attachment; filename="%s"' % att.filename.replace('"', ''),
+        })
+    return FileResponse(att.path, media_type=att.content_type, filename=att.filename,
+                        headers={"Cache-Control": "private, max-age=3600"})
@@ -2,16 +2,16 @@
 # FILE: app/routes_auth.py
 # =============================
 import logging
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from jose import JWTError, jwt
 
 from app.database import get_db
 from app.models import User, IncidentRequest
 from app.schemas import RegisterRequest, IncidentRequestCreate
 from app.config import get_county_email, SECRET_KEY, ALGORITHM
 from app.email_io import send_request_email
+from app.matching import rematch_for_request
 from auth import get_password_hash, verify_password, create_access_token
 
 log = logging.getLogger("uvicorn.error").getChild("routes_auth")
@@ -39,6 +39,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     return {"access_token": token, "token_type": "bearer"}
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -54,6 +55,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
 @router.post("/incident_request")
 def create_incident_request(
     req: IncidentRequestCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -63,9 +65,9 @@ def create_incident_request(
              getattr(req, "incident_datetime", None),
              getattr(req, "county", None))
 
-    county_email = get_county_email(req.county)
+    county_email = get_county_email(req.county, req.state)
     if not county_email:
-        raise HTTPException(status_code=400, detail=f"No email found for county '{req.county}'")
+        raise HTTPException(status_code=400, detail=f"No email found for county '{req.county}, {req.state}'")
 
     new_request = IncidentRequest(
         created_by=current_user.username,
@@ -73,9 +75,12 @@ def create_incident_request(
         incident_address=req.incident_address,
         incident_datetime=req.incident_datetime,
         county=req.county,
+        state=req.state,
         county_email=county_email,
     )
     db.add(new_request); db.commit(); db.refresh(new_request)
+    # replies that arrived before this request existed
+    background_tasks.add_task(rematch_for_request, new_request.id)
 
     subject = f"Fire Incident Report Request: {req.incident_datetime}"
 
@@ -4,31 +4,159 @@
 import os
 import re
 import uuid
+import hmac
+import hashlib
 import logging
 from datetime import datetime, timezone
+from email.parser import HeaderParser
 from pathlib import Path
 from typing import List
 
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, Request, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app import models
-from app.email_parser import parse_inbound_email
-from app.utils import normalize, normalize_datetime
+from app.config import infer_state
+from app.metrics import StageTimer, MATCH_RESULTS
+from app.raw_store import build_raw, preview
+from app.search import index_inbound
 from app.email_io import send_attachments_to_user, send_alert_no_attachments
+from app.attachment_store import split_for_email, store_as_links, store
+from app.matching import find_request, recipient_for, REMATCH_WINDOW_DAYS
+from app.request_status import mark_replied, mark_forwarded, apply_events
 
 log = logging.getLogger("uvicorn.error").getChild("routes_inbound")
 router = APIRouter(tags=["inbound"])
 
-TMP_DIR = Path(os.getenv("INBOUND_TMP", "/tmp/irh_inbound"))
-TMP_DIR.mkdir(parents=True, exist_ok=True)
+TMP_DIR = Path(os.getenv("INBOUND_TMP", "/tmp/irh_inbound"))  # created on first use / warmup
+# /sendgrid/events needs one of these; with neither set, every event is rejected.
+SENDGRID_EVENT_PUBLIC_KEY = os.getenv("SENDGRID_EVENT_PUBLIC_KEY")  # signed webhook: verification key (base64 DER)
+SENDGRID_EVENT_TOKEN      = os.getenv("SENDGRID_EVENT_TOKEN")       # basic-auth password (https://any:<token>@host/...)
 ATT_FILE_KEY = re.compile(r"^attachment\d+$")
+CHUNK_SIZE = 1024 * 1024
+
+async def _save_upload(up, dest: Path) -> str:
+    """Stream an upload to disk in chunks; return its sha256 hex digest."""
+    h = hashlib.sha256()
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with dest.open("wb") as fh:
+        while True:
+            chunk = await up.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+            fh.write(chunk)
+    return h.hexdigest()
+
+def _message_id(raw_headers: str) -> str | None:
+    """Pull Message-ID out of SendGrid's raw `headers` form field."""
+    if not raw_headers:
+        return None
+    try:
+        mid = HeaderParser().parsestr(raw_headers).get("Message-ID")
+    except Exception:
+        return None
+    mid = (mid or "").strip()
+    return mid or None
+
+def idempotency_key(raw_headers: str, sender: str, subject: str, text: str, html: str,
+                    attachment_digests: List[str]) -> str:
+    """Message-ID when present; otherwise a hash of the payload (order-insensitive for attachments)."""
+    mid = _message_id(raw_headers)
+    if mid:
+        return f"mid:{mid}"
+    h = hashlib.sha256()
+    for part in (sender, subject, text, html, *sorted(attachment_digests)):
+        h.update((part or "").encode("utf-8", "surrogatepass"))
+        h.update(b"\0")
+    return f"sha256:{h.hexdigest()}"
+
+def _find_by_key(db: Session, key: str) -> models.InboundEmail | None:
+    return (
+        db.query(models.InboundEmail)
+        .join(models.InboundIdempotency, models.InboundIdempotency.inbound_id == models.InboundEmail.id)
+        .filter(models.InboundIdempotency.key == key)
+        .first()
+    )
+
+def _cleanup(files: List[dict]) -> None:
+    for f in files:
+        try:
+            Path(f["path"]).unlink(missing_ok=True)
+        except Exception:
+            pass
+
+def _keep_for_rematch(db: Session, inbound_id: int, files: List[dict]) -> int:
+    """Store the uploads so app.matching can still forward them (re-match, or a failed forward's retry)."""
+    kept = 0
+    for f in files:
+        if Path(f["path"]).exists():  # oversized files may already be stored as links
+            store(db, inbound_id, f, ttl_secs=REMATCH_WINDOW_DAYS * 86400)
+            kept += 1
+    return kept
+
+def _stored_result(row: models.InboundEmail, files: List[dict]) -> JSONResponse:
+    """Replay the outcome of an already-processed delivery."""
+    return JSONResponse({
+        "status": "duplicate",
+        "sender": row.sender,
+        "parsed": {"address": row.parsed_address or "", "datetime": row.parsed_datetime or "",
+                   "county": row.parsed_county or ""},
+        "match": row.matched_request_id,
+        "attachments": [f.get("filename") for f in files],
+        "inbound_id": row.id,
+    })
+
+def forward_reply(db: Session, row: models.InboundEmail, recipient: str, files: List[dict]) -> str | None:
+    """
+    Send a matched reply's files (or a no-attachments alert) to the requester and
+    record forward tracking. Files over the SendGrid cap go out as signed links.
+    """
+    subject = f"Incident report reply — {row.parsed_address}"
+    if files:
+        inline, oversized = split_for_email(files)
+        links = store_as_links(db, row.id, oversized) if oversized else None
+        sgid = send_attachments_to_user(
+            to_email=recipient,
+            subject=subject,
+            body="Attached is the response we received.",
+            files=inline,
+            links=links,
+        )
+        log.info("[forward] dispatched to %s (with_files=True)", recipient)
+    else:
+        sgid = send_alert_no_attachments(
+            to_email=recipient,
+            subject=subject,
+            incident_address=row.parsed_address,
+            incident_datetime=row.parsed_datetime,
+            county=row.parsed_county,
+        )
+        log.info("[forward] alerted %s (no_files)", recipient)
+
+    try:
+        row.forwarded_to = recipient
+        row.forward_sg_message_id = sgid
+        row.forward_status = "accepted"
+        row.forwarded_at = datetime.now(timezone.utc)
+        db.add(row)
+        if row.matched_request_id:
+            mark_forwarded(db, row.matched_request_id, sgid)
+        db.commit()
+    except Exception as e:
+        log.warning("[inbound] failed to update forward tracking: %s", e)
+    return sgid
 
 @router.post("/inbound")
 async def inbound(request: Request, db: Session = Depends(get_db)):
+    timer = StageTimer()
     form = await request.form()
+    timer.mark("form")
 
     keys = list(form.keys())
     log.info("[inbound] received form keys: %s", keys)
@@ -37,6 +165,7 @@ async def inbound(request: Request, db: Session = Depends(get_db)):
     sender  = form.get("from", "")
     text    = form.get("text", "")
     html    = form.get("html", "")
+    raw_headers = form.get("headers", "")
 
     # attachments
     try:
@@ -54,107 +183,169 @@ async def inbound(request: Request, db: Session = Depends(get_db)):
                 filename = getattr(up, "filename", f"file-{uuid.uuid4().hex}")
                 ctype    = getattr(up, "content_type", None)
                 dest = TMP_DIR / f"{uuid.uuid4().hex}-{filename}"
-                data = await up.read()
-                dest.write_bytes(data)
-                files.append({"path": str(dest), "filename": filename, "type": ctype or "application/octet-stream"})
+                digest = await _save_upload(up, dest)
+                files.append({"path": str(dest), "filename": filename, "type": ctype or "application/octet-stream",
+                              "sha256": digest})
             except Exception as e:
                 log.warning("[inbound] failed to save attachment %s: %s", k, e)
 
     log.info("[inbound] attachment_count=%d", len(files))
+    timer.mark("attachments")
+
+    # idempotency: SendGrid retries deliveries; replay the stored result instead of re-running the pipeline
+    idem_key = idempotency_key(raw_headers, sender, subject, text, html, [f["sha256"] for f in files])
+    existing = _find_by_key(db, idem_key)
+    timer.mark("dedupe")
+    if existing:
+        log.info("[inbound] duplicate delivery key=%s inbound_id=%s", idem_key, existing.id)
+        _cleanup(files)
+        return _stored_result(existing, files)
+
+    from app.email_parser import parse_inbound, PARSER_VERSION  # loaded lazily; warmed at startup
+    # in a worker thread: an LLM fallback blocks (and may queue in the governor) without stalling the loop
+    address, dt_str, county, parse_source = await run_in_threadpool(parse_inbound, text, html, sender)
+    state = infer_state(address, sender) if county else None  # None: the county's requests in any state
+    log.info("[inbound] parsed addr=%r dt=%r county=%r state=%s (%s)", address, dt_str, county, state, parse_source)
+    timer.mark("parse")
 
-    address, dt_str, county = parse_inbound_email(text, html)
-    log.info("[inbound] parsed addr=%r dt=%r county=%r", address, dt_str, county)
+    # match before persisting, so a reply with a match is never visible as unmatched
+    req, ranked = None, None
+    if address and dt_str and county:
+        req = find_request(db, address, dt_str, county, state)
+        if req:
+            MATCH_RESULTS.inc(result="hit")
+        else:
+            # no exact key: score the county's requests (numpy; loaded lazily, warmed at startup)
+            from app.scoring import rank
+            ranked = rank(db, address, dt_str, county, sender, state=state)
+            if ranked.decision == "accept":
+                req = db.get(models.IncidentRequest, ranked.candidates[0]["request_id"])
+            MATCH_RESULTS.inc(result={"accept": "scored", "review": "review"}.get(ranked.decision, "miss"))
+    else:
+        MATCH_RESULTS.inc(result="skipped")
+        log.info("[match] not attempted; missing parsed fields")
+    match_id = req.id if req else None
+    timer.mark("match")
 
     # persist (initial row)
     inbound_row = models.InboundEmail(
         sender=sender,
         subject=subject,
-        body=(text or html or "")[:10000],
+        body=preview(text, html),
         parsed_address=address or None,
         parsed_datetime=dt_str or None,
         parsed_county=county or None,
+        parsed_state=state,
+        parser_version=PARSER_VERSION,
+        needs_llm=parse_source == "llm_deferred",  # re-parsed later by `app.reparse --allow-llm`
         has_attachments=bool(files),
         attachment_count=len(files),
+        matched_request_id=match_id,
     )
+    inbound_row.raw = build_raw(text, html, raw_headers)
     try:
-        db.add(inbound_row); db.commit(); db.refresh(inbound_row)
+        db.add(inbound_row); db.flush()
+        db.add(models.InboundIdempotency(key=idem_key, inbound_id=inbound_row.id))
+        if match_id:
+            mark_replied(db, [(match_id, inbound_row.id)])
+        index_inbound(db, inbound_row, text, html)
+        db.commit(); db.refresh(inbound_row)
         inbound_id = inbound_row.id
+    except IntegrityError:
+        # a concurrent retry of the same delivery won the insert
+        db.rollback()
+        existing = _find_by_key(db, idem_key)
+        _cleanup(files)
+        if existing:
+            log.info("[inbound] duplicate delivery (race) key=%s inbound_id=%s", idem_key, existing.id)
+            return _stored_result(existing, files)
+        return JSONResponse({"status": "error", "detail": "persist failed"}, status_code=500)
     except Exception as e:
         log.warning("[inbound] persist failed: %s", e)
         inbound_id = None
+    timer.mark("persist")
+
+    review_id = None
+    if ranked and ranked.decision == "review" and inbound_id:
+        from app.scoring import enqueue_review
+        try:
+            review_id = enqueue_review(db, inbound_id, ranked).id
+            log.info("[match] ambiguous; queued review_id=%s (best=%s)", review_id, ranked.candidates[0])
+        except Exception as e:
+            log.warning("[match] failed to queue review: %s", e)
 
-    # match + forward
-    match_id = None
+    # forward, or keep the files so a later re-match (app.matching) can still send them
     try:
-        if address and dt_str and county:
-            n_addr = normalize(address)
-            n_dt   = normalize_datetime(dt_str)
-            n_cnty = normalize(county)
-
-            q = db.query(models.IncidentRequest).filter(models.IncidentRequest.county == county)
-            recipient = None
-            for row in q.all():
-                if (
-                    normalize(row.incident_address) == n_addr and
-                    normalize_datetime(row.incident_datetime) == n_dt and
-                    normalize(row.county) == n_cnty
-                ):
-                    match_id = row.id
-                    recipient = row.requester_email
-                    if not recipient and row.created_by:
-                        u = db.query(models.User).filter(models.User.username == row.created_by).first()
-                        recipient = u.email if u else None
-                    break
-
-            if match_id and recipient:
-                if files:
-                    sgid = send_attachments_to_user(
-                        to_email=recipient,
-                        subject=f"Incident report reply — {address}",
-                        body="Attached is the response we received.",
-                        files=files,
-                    )
-                    status_txt = "accepted"
-                    log.info("[forward] dispatched to %s (with_files=True)", recipient)
-                else:
-                    sgid = send_alert_no_attachments(
-                        to_email=recipient,
-                        subject=f"Incident report reply — {address}",
-                        incident_address=address,
-                        incident_datetime=dt_str,
-                        county=county,
-                    )
-                    status_txt = "accepted"
-                    log.info("[forward] alerted %s (no_files)", recipient)
-
-                if inbound_id:
-                    try:
-                        inbound_row.forwarded_to = recipient
-                        inbound_row.forward_sg_message_id = sgid
-                        inbound_row.forward_status = status_txt
-                        inbound_row.forwarded_at = datetime.now(timezone.utc)
-                        db.add(inbound_row); db.commit()
-                    except Exception as e:
-                        log.warning("[inbound] failed to update forward tracking: %s", e)
+        if req:
+            recipient = recipient_for(db, req)
+            if recipient and inbound_id:
+                forward_reply(db, inbound_row, recipient, files)
+                timer.mark("forward")
             else:
-                log.info("[match] no matching request or no recipient email")
+                log.info("[match] no recipient email")
+        elif files and inbound_id:
+            kept = _keep_for_rematch(db, inbound_id, files)
+            log.info("[match] no matching request; kept %d attachment(s) for re-match", kept)
         else:
-            log.info("[match] not attempted; missing parsed fields")
+            log.info("[match] no matching request")
     except Exception as e:
-        log.warning("[match] lookup failed: %s", e)
+        log.warning("[forward] failed: %s", e)
+        if req and files and inbound_id:
+            db.rollback()
+            try:  # the rematch retry of unforwarded replies sends these
+                log.info("[forward] kept %d attachment(s) for retry", _keep_for_rematch(db, inbound_id, files))
+            except Exception as e2:
+                log.warning("[forward] could not keep attachments for retry: %s", e2)
 
     # cleanup
-    for f in files:
-        try:
-            Path(f["path"]).unlink(missing_ok=True)
-        except Exception:
-            pass
+    _cleanup(files)
 
     return JSONResponse({
         "status": "received",
         "sender": sender,
         "parsed": {"address": address, "datetime": dt_str, "county": county},
         "match": match_id,
+        "review_id": review_id,
         "attachments": [f.get("filename") for f in files],
         "inbound_id": inbound_id,
     })
+
+
+def _signature_ok(request: Request, body: bytes) -> bool:
+    from sendgrid.helpers.eventwebhook import EventWebhook, EventWebhookHeader
+    signature = request.headers.get(EventWebhookHeader.SIGNATURE)
+    timestamp = request.headers.get(EventWebhookHeader.TIMESTAMP)
+    if not (signature and timestamp):
+        return False
+    try:
+        return EventWebhook(SENDGRID_EVENT_PUBLIC_KEY).verify_signature(body.decode("utf-8"), signature, timestamp)
+    except Exception as e:  # malformed key / signature
+        log.warning("[events] signature check failed: %s", e)
+        return False
+
+
+@router.post("/sendgrid/events")
+async def sendgrid_events(request: Request, creds: HTTPBasicCredentials | None = Depends(HTTPBasic(auto_error=False)),
+                          db: Session = Depends(get_db)):
+    """
+    SendGrid Event Webhook: delivery / bounce / drop of forwards and county requests.
+    Accepted when SendGrid's signature verifies against SENDGRID_EVENT_PUBLIC_KEY, or
+    when the basic-auth password is SENDGRID_EVENT_TOKEN (kept out of the query
+    string, which ends up in access logs).
+    """
+    if not (SENDGRID_EVENT_PUBLIC_KEY or SENDGRID_EVENT_TOKEN):
+        raise HTTPException(status_code=403, detail="Event webhook is not configured")
+    body = await request.body()
+    signed = bool(SENDGRID_EVENT_PUBLIC_KEY) and _signature_ok(request, body)
+    token_ok = bool(SENDGRID_EVENT_TOKEN) and creds is not None \
+        and hmac.compare_digest(creds.password.encode(), SENDGRID_EVENT_TOKEN.encode())
+    if not (signed or token_ok):
+        raise HTTPException(status_code=403, detail="Invalid signature or token")
+    try:
+        events = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Expected a JSON array of events")
+    if not isinstance(events, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of events")
+    return {"received": len(events), "applied": apply_events(db, [e for e in events if isinstance(e, dict)])}
+
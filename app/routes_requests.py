@@ -3,16 +3,24 @@
 # ================================
 import os
 import logging
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.security.utils import get_authorization_scheme_param
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from jose import JWTError, jwt
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.models import User, IncidentRequest
 from app.schemas import IncidentRequestCreate
 from app.config import get_county_email
 from app.email_io import send_request_email
+from app.matching import rematch_for_request
+from app.resilience import CircuitOpen, DeadlineExceeded
+from app.request_status import mark_sent, mark_send_failed, public
+from app.pubsub import BROKER, stream
+from app.http_cache import cached_json
 
 log = logging.getLogger("uvicorn.error").getChild("routes_requests")
 router = APIRouter(tags=["requests"]) 
@@ -23,6 +31,11 @@ ALGORITHM  = os.getenv("ALGORITHM", "HS256")
 
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    return _user_for_token(token, db)
+
+
+def _user_for_token(token: str, db: Session) -> User:
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -37,15 +50,23 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     return user
 
 
+def _send_failed(db: Session, request_id: int) -> None:
+    try:
+        mark_send_failed(db, request_id); db.commit()
+    except Exception as e:
+        log.warning("[request] failed to record send failure: %s", e)
+
+
 @router.post("/incident_request")
 def create_incident_request(
     req: IncidentRequestCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    county_email = get_county_email(req.county)
+    county_email = get_county_email(req.county, req.state)
     if not county_email:
-        raise HTTPException(status_code=400, detail=f"No email found for county '{req.county}'")
+        raise HTTPException(status_code=400, detail=f"No email found for county '{req.county}, {req.state}'")
 
     new_req = IncidentRequest(
         created_by=current_user.username,
@@ -53,13 +74,17 @@ def create_incident_request(
         incident_address=req.incident_address,
         incident_datetime=req.incident_datetime,
         county=req.county,
+        state=req.state,
         county_email=county_email,
     )
     db.add(new_req); db.commit(); db.refresh(new_req)
+    # replies that arrived before this request existed; the error responses below
+    # are returned, not raised, so this still runs when the county send fails
+    background_tasks.add_task(rematch_for_request, new_req.id)
 
     subject = f"Fire Incident Report Request: {req.incident_datetime}"
     try:
-        send_request_email(
+        sg_msg_id = send_request_email(
             to_email=county_email,
             subject=subject,
             incident_address=req.incident_address,
@@ -67,8 +92,75 @@ def create_incident_request(
             county=req.county,
         )
         log.info("[request] sent to %s for %s / %s / %s", county_email, req.incident_address, req.incident_datetime, req.county)
+    except (CircuitOpen, DeadlineExceeded) as e:
+        log.warning("[request] send skipped: %s", e)
+        _send_failed(db, new_req.id)
+        retry = getattr(e, "retry_after", 5)
+        return JSONResponse({"detail": f"Email provider unavailable: {e}"}, status_code=503,
+                            headers={"Retry-After": str(max(1, round(retry)))})
     except Exception as e:
         log.warning("[request] send failed: %s", e)
-        raise HTTPException(status_code=500, detail=f"Failed to send email: {e}")
+        _send_failed(db, new_req.id)
+        return JSONResponse({"detail": f"Failed to send email: {e}"}, status_code=500)
+    mark_sent(db, new_req.id, sg_msg_id); db.commit()
+
+    return {"msg": "Incident request created and email sent", "request_id": new_req.id}
+
+@router.get("/incident_requests/mine")
+def my_requests(
+    request: Request,
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: int | None = Query(default=None, ge=1),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    The caller's requests, newest first, with their progress. Keyset-paginated
+    over (created_by, id): pass next_cursor back as `cursor` for the next page.
+    Answers If-None-Match with 304 while none of the caller's requests changed.
+    """
+    R = IncidentRequest
+    mine = R.created_by == current_user.username
+
+    def validator():
+        return db.query(func.count(R.id), func.max(R.id), func.sum(R.row_version)).filter(mine).one()
+
+    def render():
+        q = db.query(R).filter(mine)
+        if cursor:
+            q = q.filter(R.id < cursor)
+        rows = q.order_by(R.id.desc()).limit(limit + 1).all()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return {"requests": [public(r) for r in rows], "next_cursor": rows[-1].id if more else None}
+
+    return cached_json(request, route="my_requests", tables=("incident_requests",), validator=validator,
+                       render=render, vary=current_user.username)
+
+
+def _stream_user(token: str | None) -> str:
+    """Authenticate with a short-lived session: a stream must not hold a DB connection."""
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    db = SessionLocal()
+    try:
+        return _user_for_token(token, db).username
+    finally:
+        db.close()
+
+
+@router.get("/incident_requests/events")
+async def request_events(request: Request, access_token: str | None = Query(default=None)):
+    """
+    Server-sent events: the caller's request status changes as they happen
+    (`status` events carry the same fields as /incident_requests/mine). The
+    bearer token may come as ?access_token= because EventSource cannot set headers.
+    """
+    scheme, header_token = get_authorization_scheme_param(request.headers.get("Authorization"))
+    username = await run_in_threadpool(_stream_user, header_token if scheme.lower() == "bearer" else access_token)
+    sub = BROKER.subscribe(username)
+    if sub is None:
+        raise HTTPException(status_code=503, detail="Too many open streams", headers={"Retry-After": "30"})
+    return StreamingResponse(stream(sub, request.is_disconnected), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
 
-    return {"msg": "Incident request created and email sent", "request_id": new_req.id}
\ No newline at end of file
@@ -1,7 +1,7 @@
 # ================================
 # FILE: app/schemas.py
 # ================================
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 
 class RegisterRequest(BaseModel):
     username: str
@@ -12,3 +12,42 @@ class IncidentRequestCreate(BaseModel):
     incident_address: str
     incident_datetime: str
     county: str
+    state: str | None = None  # two-letter code or name; inferred when omitted
+
+    @model_validator(mode="after")
+    def _known_county(self):
+        """
+        Canonical (state, county). California counties are checked against the
+        bundled list ('los angeles county' -> 'Los Angeles'); other states against
+        the county directory. Without `state`: the one the address names, else
+        California for a California county, else the only state listing the county.
+        An inferred state that does not have the county falls back the same way.
+        """
+        from app.county_index import canonical_county, canonical_state
+        from app.config import COUNTY_DEFAULT_STATE, get_county_directory, infer_state
+        directory = get_county_directory()
+
+        def lookup(state: str) -> str | None:
+            return canonical_county(self.county) if state == "CA" else directory.canonical(state, self.county)
+
+        if self.state:
+            state = canonical_state(self.state)
+            if not state:
+                raise ValueError(f"'{self.state}' is not a US state")
+            candidates = [state]
+        else:
+            listed = directory.states_for(self.county)
+            fallback = "CA" if canonical_county(self.county) else listed[0] if len(listed) == 1 else None
+            candidates = [s for s in dict.fromkeys((infer_state(self.incident_address), fallback)) if s]
+            candidates = candidates or [COUNTY_DEFAULT_STATE]
+        for state in candidates:
+            county = lookup(state)
+            if county:
+                break
+        else:
+            state = candidates[0]
+            if state == "CA":
+                raise ValueError(f"'{self.county}' is not a California county")
+            raise ValueError(f"'{self.county}' is not a county in the {state} directory")
+        self.state, self.county = state, county
+        return self
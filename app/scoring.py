@@ -0,0 +1,332 @@
+# ================================
+# FILE: app/scoring.py
+# ================================
+"""
+Scored top-k matching of inbound replies to incident requests.
+
+The exact-key lookup (app.matching.find_request) runs first. When it misses,
+the reply is scored against a bounded candidate set for its county (in its
+state, when that is known), the SCORE_MAX_CANDIDATES newest requests, in a
+single vectorized NumPy pass:
+
+- address:  Jaccard similarity of hashed character-trigram sets (128-bit
+            bitsets, compared with popcount) over normalized addresses
+            ("Street" -> "st", punctuation dropped). When both house numbers
+            are known and they differ, the score is multiplied by
+            SCORE_HOUSE_MISMATCH.
+- datetime: exp(-|minutes apart| / SCORE_DT_SCALE_MIN). SCORE_DT_UNKNOWN
+            when either side does not parse.
+- sender:   1 when the reply's sender domain equals the domain of the
+            request's county_email.
+
+score = SCORE_W_ADDRESS * address + SCORE_W_DATETIME * datetime + SCORE_W_SENDER * sender
+
+The best candidate is accepted when it scores at least SCORE_ACCEPT and leads
+the runner-up by SCORE_MARGIN. A reply whose best candidate scores at least
+SCORE_REVIEW but misses either condition goes to the match_reviews queue
+(/admin/match-reviews).
+
+Features are kept per county in an in-process cache. Each call first fetches
+only the rows with id above the last one seen, so the per-message SQL cost is
+one indexed query. The top-k rows are re-read before anything is returned; if
+one was deleted or edited, that county's cache is rebuilt.
+"""
+import os
+import re
+import copy
+import json
+import zlib
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parseaddr
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models
+
+log = logging.getLogger("uvicorn.error").getChild("scoring")
+
+SCORE_MAX_CANDIDATES = int(os.getenv("SCORE_MAX_CANDIDATES", "100000"))  # per county
+SCORE_TOP_K          = int(os.getenv("SCORE_TOP_K", "5"))
+SCORE_ACCEPT         = float(os.getenv("SCORE_ACCEPT", "0.85"))
+SCORE_MARGIN         = float(os.getenv("SCORE_MARGIN", "0.05"))
+SCORE_REVIEW         = float(os.getenv("SCORE_REVIEW", "0.55"))
+SCORE_W_ADDRESS      = float(os.getenv("SCORE_W_ADDRESS", "0.6"))
+SCORE_W_DATETIME     = float(os.getenv("SCORE_W_DATETIME", "0.3"))
+SCORE_W_SENDER       = float(os.getenv("SCORE_W_SENDER", "0.1"))
+SCORE_DT_SCALE_MIN   = float(os.getenv("SCORE_DT_SCALE_MIN", "180"))
+SCORE_DT_UNKNOWN     = float(os.getenv("SCORE_DT_UNKNOWN", "0.3"))
+SCORE_HOUSE_MISMATCH = float(os.getenv("SCORE_HOUSE_MISMATCH", "0.5"))
+SCORE_CACHE_COUNTIES = int(os.getenv("SCORE_CACHE_COUNTIES", "64"))
+
+BITS = 128
+_WORDS = BITS // 64
+_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)  # minutes since then fit float32 to the minute
+
+_ABBREV = {
+    "street": "st", "avenue": "ave", "av": "ave", "boulevard": "blvd", "road": "rd", "drive": "dr",
+    "lane": "ln", "court": "ct", "place": "pl", "highway": "hwy", "parkway": "pkwy", "circle": "cir",
+    "terrace": "ter", "suite": "ste", "apartment": "apt", "north": "n", "south": "s", "east": "e",
+    "west": "w", "northeast": "ne", "northwest": "nw", "southeast": "se", "southwest": "sw",
+}
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_HOUSE_RE = re.compile(r"^\s*(\d+)")
+_DT_FORMATS = ("%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S",
+               "%m/%d/%Y %H:%M", "%m/%d/%Y %I:%M %p", "%m/%d/%Y %I:%M%p", "%m/%d/%y %H:%M",
+               "%Y-%m-%d", "%m/%d/%Y")
+
+
+class Ranked(NamedTuple):
+    decision: str     # accept | review | none
+    candidates: list  # [{"request_id", "score", "address", "datetime", "sender"}], best first
+
+
+# ---------- features ----------
+
+def normalize_address(s: str) -> str:
+    return " ".join(_ABBREV.get(w, w) for w in _WORD_RE.findall((s or "").lower()))
+
+
+def trigram_bits(s: str) -> tuple[int, ...]:
+    """128-bit set of hashed character trigrams, as _WORDS uint64 words."""
+    padded = f"  {normalize_address(s)} "
+    words = [0] * _WORDS
+    for i in range(len(padded) - 2):
+        b = zlib.crc32(padded[i:i + 3].encode()) % BITS
+        words[b >> 6] |= 1 << (b & 63)
+    return tuple(words)
+
+
+def house_number(s: str) -> int:
+    m = _HOUSE_RE.match(s or "")
+    return int(m.group(1)) if m and len(m.group(1)) < 10 else -1
+
+
+def epoch_minutes(s: str) -> float:
+    s = " ".join((s or "").split())
+    for fmt in _DT_FORMATS:
+        try:
+            dt = datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+        return (dt.replace(tzinfo=timezone.utc) - _EPOCH).total_seconds() / 60.0
+    return float("nan")
+
+
+def domain_hash(email: str) -> int:
+    d = parseaddr(email or "")[1].rpartition("@")[2].strip().lower()
+    return zlib.crc32(d.encode()) + 1 if d else 0  # 0 = unknown
+
+
+def county_key(county: str, state: str | None = None) -> str:
+    """Cache key: 'FL|orange'; '|orange' when the state is unknown (every state's Orange)."""
+    return f"{state or ''}|{(county or '').strip().lower()}"
+
+
+class Candidates:
+    """
+    Column arrays of match features for one county's requests, in id order.
+    tri is word-major (_WORDS, n) so each word is one contiguous column.
+    """
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.tri = np.empty((_WORDS, 0), dtype=np.uint64)
+        self.card = np.empty(0, dtype=np.int16)  # trigram bits set
+        self.house = np.empty(0, dtype=np.int64)
+        self.when = np.empty(0, dtype=np.float32)
+        self.domain = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def last_id(self) -> int:
+        return int(self.ids[-1]) if len(self.ids) else 0
+
+    def extend(self, rows: list[tuple], cap: int = SCORE_MAX_CANDIDATES) -> None:
+        """Append (id, address, datetime, county_email) rows (ascending id); keep the newest `cap`."""
+        if not rows:
+            return
+        self.ids = np.concatenate([self.ids, np.fromiter((r[0] for r in rows), np.int64, len(rows))])
+        tri = np.array([trigram_bits(r[1]) for r in rows], dtype=np.uint64).T
+        self.tri = np.ascontiguousarray(np.concatenate([self.tri, tri], axis=1))
+        self.card = np.concatenate([self.card, np.bitwise_count(tri).sum(axis=0, dtype=np.int16)])
+        self.house = np.concatenate([self.house, np.fromiter((house_number(r[1]) for r in rows), np.int64, len(rows))])
+        self.when = np.concatenate([self.when, np.fromiter((epoch_minutes(r[2]) for r in rows), np.float32, len(rows))])
+        self.domain = np.concatenate([self.domain, np.fromiter((domain_hash(r[3]) for r in rows), np.int64, len(rows))])
+        if len(self.ids) > cap:
+            for name in ("ids", "card", "house", "when", "domain"):
+                setattr(self, name, getattr(self, name)[-cap:])
+            self.tri = np.ascontiguousarray(self.tri[:, -cap:])
+
+
+def score(c: Candidates, address: str, dt_str: str, sender: str) -> np.ndarray:
+    """Score every candidate against one reply; float32 array aligned with c.ids."""
+    f32 = np.float32
+    bits = trigram_bits(address)
+    inter = np.zeros(len(c), dtype=np.int16)
+    for w, qw in enumerate(bits):
+        inter += np.bitwise_count(c.tri[w] & np.uint64(qw))
+    union = c.card + sum(int(w).bit_count() for w in bits) - inter
+    addr = inter.astype(f32) / np.maximum(union, 1).astype(f32)
+    qh = house_number(address)
+    if qh >= 0:
+        addr[(c.house >= 0) & (c.house != qh)] *= f32(SCORE_HOUSE_MISMATCH)
+
+    when = np.exp(np.abs(c.when - f32(epoch_minutes(dt_str))) * f32(-1.0 / SCORE_DT_SCALE_MIN))
+    when[np.isnan(when)] = f32(SCORE_DT_UNKNOWN)
+
+    out = addr * f32(SCORE_W_ADDRESS) + when * f32(SCORE_W_DATETIME)
+    qd = domain_hash(sender)
+    if qd:
+        out[c.domain == qd] += f32(SCORE_W_SENDER)
+    return out
+
+
+def top_k(c: Candidates, scores: np.ndarray, k: int = SCORE_TOP_K) -> np.ndarray:
+    """Indices of the k best scores, best first (ties: oldest request first)."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    return idx[np.lexsort((c.ids[idx], -scores[idx]))]
+
+
+def decide(ranked_scores: list[float]) -> str:
+    if not ranked_scores or ranked_scores[0] < SCORE_REVIEW:
+        return "none"
+    runner_up = ranked_scores[1] if len(ranked_scores) > 1 else 0.0
+    if ranked_scores[0] >= SCORE_ACCEPT and ranked_scores[0] - runner_up >= SCORE_MARGIN:
+        return "accept"
+    return "review"
+
+
+# ---------- per-county cache ----------
+
+_LOCK = threading.Lock()
+_CACHE: "OrderedDict[str, Candidates]" = OrderedDict()
+
+
+def clear_cache() -> None:
+    with _LOCK:
+        _CACHE.clear()
+
+
+def _fetch(db: Session, key: str, after_id: int, limit: int) -> list[tuple]:
+    R = models.IncidentRequest
+    state, _, county = key.partition("|")
+    q = db.query(R.id, R.incident_address, R.incident_datetime, R.county_email).filter(
+        func.lower(func.trim(R.county)) == county, R.id > after_id)
+    if state:
+        q = q.filter(R.state == state)
+    rows = q.order_by(R.id.desc()).limit(limit).all()
+    return [tuple(r) for r in reversed(rows)]
+
+
+def candidates(db: Session, county: str, state: str | None = None) -> Candidates:
+    """This county's candidate features, brought up to date with one query."""
+    key = county_key(county, state)
+    with _LOCK:
+        c = _CACHE.get(key)
+        if c is not None:
+            _CACHE.move_to_end(key)
+    if c is None:
+        c = Candidates()
+    new = _fetch(db, key, c.last_id, SCORE_MAX_CANDIDATES)
+    if new:
+        # extend a copy: other threads may be scoring against the cached arrays
+        c = Candidates() if len(new) >= SCORE_MAX_CANDIDATES else copy.copy(c)
+        c.extend(new)
+    with _LOCK:
+        cur = _CACHE.get(key)
+        if cur is None or cur.last_id <= c.last_id:
+            _CACHE[key] = c
+        while len(_CACHE) > SCORE_CACHE_COUNTIES:
+            _CACHE.popitem(last=False)
+    return c
+
+
+def _drop(county: str, state: str | None = None) -> None:
+    with _LOCK:
+        _CACHE.pop(county_key(county, state), None)
+
+
+# ---------- ranking ----------
+
+def rank(db: Session, address: str, dt_str: str, county: str, sender: str = "",
+         k: int = SCORE_TOP_K, state: str | None = None) -> Ranked:
+    """Top-k candidate requests in `county` (of `state`, when known) for one parsed reply, with a decision."""
+    for attempt in (0, 1):
+        c = candidates(db, county, state)
+        if not len(c):
+            return Ranked("none", [])
+        t0 = time.perf_counter()
+        s = score(c, address, dt_str, sender)
+        idx = top_k(c, s, k)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        ids = [int(i) for i in c.ids[idx]]
+        rows = {r.id: r for r in db.query(models.IncidentRequest).filter(models.IncidentRequest.id.in_(ids))}
+        stale = [i for j, i in zip(idx, ids)
+                 if i not in rows or trigram_bits(rows[i].incident_address) != tuple(int(w) for w in c.tri[:, j])
+                 or county_key(rows[i].county) != county_key(county)
+                 or (state and rows[i].state != state)]
+        if stale and attempt == 0:
+            log.info("[score] county=%r state=%s: %d stale candidate(s); rebuilding", county, state, len(stale))
+            _drop(county, state)
+            continue
+        break
+
+    out = [{"request_id": i, "score": round(float(s[j]), 4),
+            "address": rows[i].incident_address, "datetime": rows[i].incident_datetime,
+            "sender": bool(domain_hash(sender) and c.domain[j] == domain_hash(sender))}
+           for j, i in zip(idx, ids) if i in rows]
+    decision = decide([m["score"] for m in out])
+    log.info("[score] county=%r state=%s n=%d best=%s decision=%s (%.2f ms)",
+             county, state, len(c), out[0]["score"] if out else None, decision, elapsed_ms)
+    return Ranked(decision, out)
+
+
+# ---------- review queue ----------
+
+def enqueue_review(db: Session, inbound_id: int, ranked: Ranked) -> models.MatchReview:
+    """Record an ambiguous reply for a human decision (commits)."""
+    review = models.MatchReview(inbound_id=inbound_id, candidates=json.dumps(ranked.candidates),
+                                top_score=ranked.candidates[0]["score"] if ranked.candidates else None)
+    db.add(review); db.commit(); db.refresh(review)
+    return review
+
+
+def resolve_review(db: Session, review: models.MatchReview, request_id: int | None,
+                   resolved_by: str | None = None) -> dict:
+    """
+    Accept `request_id` for the review's reply (claimed only if the reply is still
+    unmatched, then forwarded) or reject every candidate when it is None.
+    """
+    from app.matching import _forward
+    from app.request_status import mark_replied
+
+    out = {"review_id": review.id, "inbound_id": review.inbound_id, "request_id": request_id, "forwarded_to": None}
+    if request_id is None:
+        review.status = "rejected"
+    else:
+        E = models.InboundEmail
+        claimed = (db.query(E).filter(E.id == review.inbound_id, E.matched_request_id.is_(None))
+                   .update({E.matched_request_id: request_id}, synchronize_session=False))
+        review.status = "accepted" if claimed else "already_matched"
+        review.resolved_request_id = request_id if claimed else None
+        if claimed:
+            mark_replied(db, [(request_id, review.inbound_id)])
+    review.resolved_by = resolved_by
+    review.resolved_at = datetime.now(timezone.utc)
+    db.commit()
+    out["status"] = review.status
+    if review.status == "accepted":
+        out["forwarded_to"] = _forward(db, review.inbound_id, request_id)
+    return out
@@ -0,0 +1,198 @@
+# ================================
+# FILE: app/search.py
+# ================================
+"""
+Full-text search over inbound emails.
+
+One row per message in `inbound_search`, written in the same transaction as
+the inbound_emails insert:
+
+- Postgres: regular table (inbound_id, tsv tsvector) with a GIN index on tsv
+  (alembic 20261018_add_inbound_search). Header fields (subject, sender,
+  parsed address/county/date) are weighted A, body B; ranked with ts_rank_cd.
+- SQLite: FTS5 virtual table inbound_search(head, body) with rowid =
+  inbound_id, created on first use; ranked with bm25.
+
+Documents and queries go through the same tokenizer (lower-cased \\w+ runs),
+so "2025-00123" or "334 Wilsh" match the same way on both backends. Every
+query term is a prefix match and all terms must match.
+
+Results are ordered by (rank desc, id desc) and paginated by keyset: the
+opaque cursor carries the last (rank, id), so deep pages cost the same as the
+first one.
+
+    python -m app.search --reindex   # backfill / rebuild from inbound_raw
+"""
+import os
+import re
+import json
+import base64
+import logging
+import argparse
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+log = logging.getLogger("uvicorn.error").getChild("search")
+
+SEARCH_BODY_CHARS = int(os.getenv("SEARCH_BODY_CHARS", "100000"))  # cap per message
+MAX_TERMS = 8
+
+TOKEN_RE = re.compile(r"\w+", re.U)
+TAG_RE = re.compile(r"<[^>]+>")
+
+_SQLITE_DDL = "CREATE VIRTUAL TABLE IF NOT EXISTS inbound_search USING fts5(head, body, tokenize='unicode61')"
+_sqlite_ready = False
+
+
+def _tokens(s: str) -> str:
+    return " ".join(TOKEN_RE.findall((s or "").lower()))
+
+
+def _is_sqlite(db) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def _ensure_sqlite(db) -> None:
+    global _sqlite_ready
+    if not _sqlite_ready:
+        db.execute(text(_SQLITE_DDL))
+        _sqlite_ready = True
+
+
+def document(row, text_body: str, html: str) -> tuple[str, str]:
+    """(head, body) token strings for one message."""
+    head = " ".join(filter(None, (row.subject, row.sender, row.parsed_address,
+                                  row.parsed_county, row.parsed_datetime)))
+    body = text_body or TAG_RE.sub(" ", html or "")
+    return _tokens(head), _tokens(body[:SEARCH_BODY_CHARS])
+
+
+def index_inbound(db: Session, row, text_body: str, html: str) -> None:
+    """Add one message to the index; caller commits (same transaction as the insert)."""
+    head, body = document(row, text_body, html)
+    index_document(db, row.id, head, body)
+
+
+def index_document(db: Session, inbound_id: int, head: str, body: str) -> None:
+    """Insert or replace the index row for one message from prebuilt token strings."""
+    if _is_sqlite(db):
+        _ensure_sqlite(db)
+        db.execute(text("INSERT OR REPLACE INTO inbound_search (rowid, head, body) VALUES (:id, :head, :body)"),
+                   {"id": inbound_id, "head": head, "body": body})
+    else:
+        db.execute(text(
+            "INSERT INTO inbound_search (inbound_id, tsv) VALUES (:id, "
+            "setweight(to_tsvector('simple', :head), 'A') || setweight(to_tsvector('simple', :body), 'B')) "
+            "ON CONFLICT (inbound_id) DO UPDATE SET tsv = EXCLUDED.tsv"
+        ), {"id": inbound_id, "head": head, "body": body})
+
+
+def delete_where(conn, ids_sql: str, params: dict) -> None:
+    """Drop index rows for `ids_sql` (a SELECT of inbound ids); used by archival."""
+    if conn.dialect.name == "sqlite":
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'inbound_search'")).first()
+        if exists:
+            conn.execute(text(f"DELETE FROM inbound_search WHERE rowid IN ({ids_sql})"), params)
+    else:
+        conn.execute(text(f"DELETE FROM inbound_search WHERE inbound_id IN ({ids_sql})"), params)
+
+
+# ---------- query ----------
+
+def encode_cursor(rank: float, inbound_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, inbound_id]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[float, int]:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    rank, inbound_id = json.loads(raw)
+    return float(rank), int(inbound_id)
+
+
+def _match_expr(terms: list[str], sqlite: bool) -> str:
+    if sqlite:
+        return " AND ".join(f'"{t}"*' for t in terms)
+    return " & ".join(f"{t}:*" for t in terms)
+
+
+def search(db: Session, q: str, limit: int = 20, cursor: str | None = None) -> dict:
+    """Ranked matches for `q`: {"results": [...], "next_cursor": str | None}."""
+    terms = TOKEN_RE.findall((q or "").lower())[:MAX_TERMS]
+    if not terms:
+        return {"results": [], "next_cursor": None}
+    sqlite = _is_sqlite(db)
+    params = {"q": _match_expr(terms, sqlite), "n": limit + 1}
+
+    if sqlite:
+        _ensure_sqlite(db)
+        ranked = ("SELECT rowid AS inbound_id, -bm25(inbound_search, 10.0, 1.0) AS rank "
+                  "FROM inbound_search WHERE inbound_search MATCH :q")
+    else:
+        ranked = ("SELECT inbound_id, ts_rank_cd(tsv, to_tsquery('simple', :q))::float8 AS rank "
+                  "FROM inbound_search WHERE tsv @@ to_tsquery('simple', :q)")
+
+    after = ""
+    if cursor:
+        params["r"], params["after_id"] = decode_cursor(cursor)
+        after = "WHERE s.rank < :r OR (s.rank = :r AND s.inbound_id < :after_id)"
+
+    sql = text(
+        "SELECT e.id, e.created_at, e.sender, e.subject, e.body, e.parsed_address, e.parsed_datetime, "
+        "e.parsed_county, e.matched_request_id, s.rank "
+        f"FROM ({ranked}) s JOIN inbound_emails e ON e.id = s.inbound_id {after} "
+        "ORDER BY s.rank DESC, s.inbound_id DESC LIMIT :n"
+    )
+    rows = [dict(r) for r in db.execute(sql, params).mappings()]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["rank"], rows[-1]["id"])
+    return {"results": rows, "next_cursor": next_cursor}
+
+
+# ---------- backfill ----------
+
+def reindex(db: Session, batch: int = 500) -> int:
+    """(Re)build the index for every inbound row, reading full bodies from inbound_raw."""
+    from app import models
+    from app.raw_store import decompress
+
+    n, last_id = 0, 0
+    while True:
+        rows = (db.query(models.InboundEmail).filter(models.InboundEmail.id > last_id)
+                .order_by(models.InboundEmail.id).limit(batch).all())
+        if not rows:
+            break
+        for row in rows:
+            raw = row.raw
+            body = decompress(raw.text_z, raw.codec) if raw else (row.body or "")
+            html = decompress(raw.html_z, raw.codec) if raw else ""
+            index_inbound(db, row, body, html)
+            n += 1
+        last_id = rows[-1].id
+        db.commit()
+        db.expunge_all()
+    log.info("[search] reindexed %d message(s)", n)
+    return n
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Inbound email full-text index")
+    ap.add_argument("--reindex", action="store_true", help="backfill / rebuild the index")
+    ap.add_argument("q", nargs="?", help="run a query and print the first page")
+    args = ap.parse_args()
+
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        if args.reindex:
+            print(json.dumps({"reindexed": reindex(db)}))
+        if args.q:
+            print(json.dumps(search(db, args.q), default=str, indent=1))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# ================================
+# FILE: app/warmup.py
+# ================================
+"""
+Cold-start support.
+
+Heavy dependencies (sendgrid, openai, passlib/bcrypt, jose, httpx, numpy) are imported
+on first use by the modules that need them. With STARTUP_MODE=lazy (default)
+the app starts serving immediately and this module warms the critical state in
+a background thread once the server is up: county directory, parser regexes,
+inbound temp dir, one DB connection and the provider SDKs. STARTUP_MODE=eager
+runs the same steps before the server accepts traffic.
+"""
+import os
+import time
+import logging
+import threading
+
+log = logging.getLogger("uvicorn.error").getChild("warmup")
+
+STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy").lower()  # lazy | eager | off
+
+_STATUS = {"mode": STARTUP_MODE, "done": False, "steps": {}}
+_LOCK = threading.Lock()
+
+
+def _county_map():
+    from app.config import get_county_email_map
+    get_county_email_map()
+
+def _county_index():
+    from app.county_index import get_index
+    get_index()
+
+def _parser():
+    import app.email_parser  # noqa: F401  (compiles RE_META / RE_ADDR / RE_DT / RE_CNTY)
+
+def _parser_templates():
+    from app.database import SessionLocal
+    from app.parser_templates import load
+    db = SessionLocal()
+    try:
+        load(db)
+    finally:
+        db.close()
+
+def _scoring():
+    import app.scoring  # noqa: F401  (numpy)
+
+def _tmp_dir():
+    from app.routes_inbound import TMP_DIR
+    TMP_DIR.mkdir(parents=True, exist_ok=True)
+
+def _db():
+    from app.database import engine
+    with engine.connect() as conn:
+        conn.exec_driver_sql("select 1")
+
+def _sendgrid():
+    import sendgrid  # noqa: F401
+    import sendgrid.helpers.mail  # noqa: F401
+
+def _auth():
+    from auth import pwd_context
+    pwd_context().handler("bcrypt").get_backend()
+    import jose.jwt  # noqa: F401
+
+def _openai():
+    from app.email_parser import OPENAI_API_KEY, USE_LLM, MODE
+    if OPENAI_API_KEY and (USE_LLM or MODE == "llm_only"):
+        from app.llm_governor import get_client
+        get_client(OPENAI_API_KEY)  # shared client: imports openai, builds its HTTP pool
+
+def _httpx():
+    import httpx  # noqa: F401
+
+
+STEPS = [
+    ("county_map", _county_map),
+    ("county_index", _county_index),
+    ("parser", _parser),
+    ("parser_templates", _parser_templates),
+    ("scoring", _scoring),
+    ("tmp_dir", _tmp_dir),
+    ("db", _db),
+    ("sendgrid", _sendgrid),
+    ("auth", _auth),
+    ("openai", _openai),
+    ("httpx", _httpx),
+]
+
+
+def warm() -> dict:
+    t_all = time.perf_counter()
+    for name, fn in STEPS:
+        t0 = time.perf_counter()
+        try:
+            fn()
+            res = {"ok": True, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+        except Exception as e:
+            res = {"ok": False, "error": str(e)}
+            log.warning("[warmup] %s failed: %s", name, e)
+        with _LOCK:
+            _STATUS["steps"][name] = res
+    with _LOCK:
+        _STATUS["done"] = True
+        _STATUS["total_ms"] = round((time.perf_counter() - t_all) * 1000, 1)
+    log.info("[warmup] done in %.1fms", _STATUS["total_ms"])
+    return status()
+
+
+def start() -> None:
+    """Called from the app lifespan."""
+    if STARTUP_MODE == "off":
+        return
+    if STARTUP_MODE == "eager":
+        warm()
+        return
+    threading.Thread(target=warm, name="irh-warmup", daemon=True).start()
+
+
+def status() -> dict:
+    with _LOCK:
+        return {**_STATUS, "steps": dict(_STATUS["steps"])}
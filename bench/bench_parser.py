@@ -0,0 +1,177 @@
+# ================================
+# FILE: bench/bench_parser.py
+# ================================
+"""
+Micro-benchmarks for the inbound parser and normalizers, with a regression gate.
+
+Corpus: bench/corpus/<case>.txt (+ optional <case>.html) holds anonymized county
+replies. Each case is grown to fixed size buckets (1 KB .. 2 MB) by appending a
+deterministic quoted history, the way long reply chains grow in practice.
+
+For every (function, case, bucket) we record ns/op (best of several timed
+rounds) and peak bytes allocated per call (tracemalloc), then compare against
+bench/baseline.json. Exit status is 1 when anything is slower (or allocates
+more) than baseline by more than --threshold (default BENCH_THRESHOLD or 0.25).
+
+    python -m bench.bench_parser                    # compare with baseline
+    python -m bench.bench_parser --update-baseline  # re-record (same machine as CI!)
+    python -m bench.bench_parser --filter parse --bucket 256KB
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+BUCKETS = {"1KB": 1 << 10, "16KB": 16 << 10, "256KB": 256 << 10, "2MB": 2 << 20}
+THRESHOLD = float(os.getenv("BENCH_THRESHOLD", "0.25"))
+MIN_TIME = float(os.getenv("BENCH_MIN_TIME", "0.05"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "5"))
+
+_FILLER = (
+    "> On Mon, Jun 2, 2025 at 9:00 AM Records Unit <records@county.example.gov> wrote:\n"
+    "> > Thank you for your request. We are reviewing our files and will respond\n"
+    "> > within ten (10) days as required under the Public Records Act.\n"
+    "> > CONFIDENTIALITY NOTICE: This e-mail may contain confidential information.\n"
+    "> >\n"
+)
+
+
+def _grow(s: str, size: int) -> str:
+    if len(s) >= size:
+        return s
+    reps = (size - len(s)) // len(_FILLER) + 1
+    return (s + "\n" + _FILLER * reps)[:size]
+
+
+def load_corpus() -> dict[tuple[str, str], tuple[str, str]]:
+    """{(case, bucket): (text, html)}"""
+    out = {}
+    for txt in sorted(CORPUS_DIR.glob("*.txt")):
+        html_p = txt.with_suffix(".html")
+        text = txt.read_text(encoding="utf-8")
+        html = html_p.read_text(encoding="utf-8") if html_p.exists() else ""
+        for bucket, size in BUCKETS.items():
+            out[(txt.stem, bucket)] = (_grow(text, size), html)
+    return out
+
+
+def _time_ns(fn) -> float:
+    """Best-of-ROUNDS ns per call; each round loops until MIN_TIME has passed."""
+    n = 1
+    while True:
+        t0 = time.perf_counter_ns()
+        for _ in range(n):
+            fn()
+        dt = time.perf_counter_ns() - t0
+        if dt >= MIN_TIME * 1e9 or n >= 1 << 20:
+            break
+        n *= 2
+    best = dt / n
+    for _ in range(ROUNDS - 1):
+        t0 = time.perf_counter_ns()
+        for _ in range(n):
+            fn()
+        best = min(best, (time.perf_counter_ns() - t0) / n)
+    return best
+
+
+def _peak_bytes(fn) -> int:
+    fn()  # warm caches (regex compile, etc.)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+def _cases():
+    import app.email_parser as ep
+    from app.utils import normalize, normalize_datetime
+
+    # benchmark the deterministic path only
+    ep.USE_LLM = False
+    ep.MODE = "regex_first"
+
+    for (case, bucket), (text, html) in load_corpus().items():
+        addr, dt, _ = ep.parse_inbound_email(text, html)
+        yield "parse_inbound_email", case, bucket, (lambda t=text, h=html: ep.parse_inbound_email(t, h))
+        yield "_strip_quotes", case, bucket, (lambda t=text: ep._strip_quotes(t))
+        if bucket == "1KB":
+            yield "normalize", case, bucket, (lambda a=addr or text[:40]: normalize(a))
+            yield "normalize_datetime", case, bucket, (lambda d=dt or text[:16]: normalize_datetime(d))
+
+
+def run(filters: list[str], buckets: list[str]) -> dict[str, dict]:
+    results = {}
+    for fn_name, case, bucket, fn in _cases():
+        key = f"{fn_name}/{case}/{bucket}"
+        if filters and not any(f in key for f in filters):
+            continue
+        if buckets and bucket not in buckets:
+            continue
+        results[key] = {"ns_per_op": round(_time_ns(fn), 1), "peak_bytes": _peak_bytes(fn)}
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    failures = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric in ("ns_per_op", "peak_bytes"):
+            b, c = base[metric], cur[metric]
+            # ignore noise on tiny absolute values
+            floor = 200 if metric == "ns_per_op" else 4096
+            if c > max(b * (1 + threshold), b + floor):
+                failures.append(f"{key} {metric}: {b:,.0f} -> {c:,.0f} (+{(c / b - 1) * 100 if b else 0:.0f}%)")
+    return failures
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Parser / normalizer micro-benchmarks with a regression gate")
+    ap.add_argument("--filter", action="append", default=[], help="substring of function/case/bucket")
+    ap.add_argument("--bucket", action="append", default=[], choices=list(BUCKETS))
+    ap.add_argument("--threshold", type=float, default=THRESHOLD)
+    ap.add_argument("--baseline", default=str(BASELINE))
+    ap.add_argument("--update-baseline", action="store_true")
+    args = ap.parse_args()
+
+    logging.disable(logging.INFO)
+    results = run(args.filter, args.bucket)
+    baseline = json.loads(Path(args.baseline).read_text()) if Path(args.baseline).exists() else {}
+
+    for key, r in results.items():
+        b = baseline.get(key)
+        delta = f"{(r['ns_per_op'] / b['ns_per_op'] - 1) * 100:+6.1f}%" if b and b["ns_per_op"] else "   new"
+        print(f"{key:55s} {r['ns_per_op']:>14,.1f} ns/op {delta}  {r['peak_bytes']:>11,d} B/op")
+
+    if args.update_baseline:
+        merged = {**baseline, **results}
+        Path(args.baseline).write_text(json.dumps(dict(sorted(merged.items())), indent=1) + "\n")
+        print(f"baseline updated: {args.baseline} ({len(results)} entries)")
+        return
+
+    failures = compare(results, baseline, args.threshold)
+    if failures:
+        print(f"\nREGRESSIONS (> {args.threshold:.0%} over baseline):")
+        for f in failures:
+            print("  " + f)
+        sys.exit(1)
+    print(f"\nok: no regressions over {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
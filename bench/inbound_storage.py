@@ -0,0 +1,85 @@
+# ================================
+# FILE: bench/inbound_storage.py
+# ================================
+"""
+Compare the old inline-body layout of inbound_emails with the narrow
+table + compressed inbound_raw layout: on-disk size and admin scan time.
+
+    python -m bench.inbound_storage --rows 20000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from app.raw_store import compress, preview, CODEC  # noqa: E402
+
+SCAN_SQL = ("SELECT id, sender, subject, parsed_address, parsed_datetime, parsed_county, created_at "
+            "FROM inbound_emails ORDER BY id DESC")
+
+
+def _message(rng: random.Random) -> tuple[str, str, str]:
+    addr = f"{rng.randint(1, 9999)} {rng.choice(['Main St', 'Oak Ave', 'Wilshire Blvd', 'Pine Rd'])}"
+    reply = (f"Hello,\n\nPlease find the report attached.\n\nAddress: {addr}\n"
+             f"Date/Time: 2025-0{rng.randint(1, 9)}-1{rng.randint(0, 9)} 10:00\nCounty: Los Angeles\n\n"
+             "Regards,\nRecords Unit\n")
+    quoted = "".join(f"> {ln}\n" for ln in ("Please provide the incident report for the following details. " * 6).split(". "))
+    text = reply + "\n" + quoted * rng.randint(5, 40)
+    html = "<html><body>" + text.replace("\n", "<br>\n") + "</body></html>"
+    headers = "".join(f"Received: from mx{i}.example.gov by mx.sendgrid.net; Tue, 1 Jul 2025 10:00:0{i} +0000\n"
+                      for i in range(6)) + f"Message-ID: <{rng.getrandbits(64):x}@example.gov>\n"
+    return text, html, headers
+
+
+def _build(path: Path, rows: int, split: bool) -> None:
+    rng = random.Random(42)
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE inbound_emails (id INTEGER PRIMARY KEY, sender TEXT, subject TEXT, body TEXT, "
+                "parsed_address TEXT, parsed_datetime TEXT, parsed_county TEXT, created_at TEXT)")
+    if split:
+        con.execute("CREATE TABLE inbound_raw (inbound_id INTEGER PRIMARY KEY, codec TEXT, text_z BLOB, "
+                    "html_z BLOB, headers_z BLOB)")
+    for i in range(1, rows + 1):
+        text, html, headers = _message(rng)
+        body = preview(text, html) if split else (text or html)[:10000]
+        con.execute("INSERT INTO inbound_emails VALUES (?,?,?,?,?,?,?,?)",
+                    (i, "records@example.gov", "Re: request", body, "1 Main St", "2025-06-20 10:00",
+                     "Los Angeles", "2025-07-01T10:00:00"))
+        if split:
+            con.execute("INSERT INTO inbound_raw VALUES (?,?,?,?,?)",
+                        (i, CODEC, compress(text), compress(html), compress(headers)))
+    con.commit()
+    con.close()
+
+
+def _scan(path: Path, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        con = sqlite3.connect(path)
+        t0 = time.perf_counter()
+        con.execute(SCAN_SQL).fetchall()
+        best = min(best, time.perf_counter() - t0)
+        con.close()
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        old, new = Path(d) / "inline.db", Path(d) / "split.db"
+        _build(old, args.rows, split=False)
+        _build(new, args.rows, split=True)
+        for label, p in (("inline body (10k truncated)", old), (f"preview + inbound_raw ({CODEC}, full)", new)):
+            print(f"{label:40s} size={os.path.getsize(p) / 1e6:8.1f} MB  scan={_scan(p) * 1e3:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+# ================================
+# FILE: bench/loadtest.py
+# ================================
+"""
+Synthetic load test for /inbound, /token and /incident_request.
+
+Runs the FastAPI app in-process (httpx ASGI transport) against a throwaway
+SQLite database, with local stand-ins for SendGrid (fake client with a
+configurable latency) and OpenAI (fake chat client). Payloads mimic SendGrid
+Inbound Parse multipart posts: labeled replies, long quoted threads, HTML-only
+bodies and 0-5 PDF attachments.
+
+    python -m bench.loadtest --requests 300 --concurrency 16
+    python -m bench.loadtest --scenario inbound_pdfs --json out.json
+
+Reports throughput, p50/p95/p99 latency, error count and peak RSS per scenario.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+COUNTIES = ["Los Angeles", "San Francisco", "San Diego", "Sacramento", "Fresno", "Alameda"]
+STREETS = ["Main St", "Oak Ave", "Wilshire Blvd", "Pine Rd", "Mission St", "El Camino Real"]
+PASSWORD = "loadtest-pass"
+
+
+# ---------- payload builders ----------
+
+def _incident(rng: random.Random) -> tuple[str, str, str]:
+    return (f"{rng.randint(1, 9999)} {rng.choice(STREETS)}",
+            f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00",
+            rng.choice(COUNTIES))
+
+
+def _quoted_thread(rng: random.Random, depth: int) -> str:
+    original = ("Please provide the incident report for the following details:\n\n"
+                "Address: 1 Old St\nDate/Time: 2024-01-01 00:00\nCounty: Fresno\n")
+    out = []
+    for lvl in range(1, depth + 1):
+        out.append(f"On Mon, Jan {lvl} 2025, records{lvl}@county.example.gov wrote:")
+        out.extend(("> " * lvl) + ln for ln in original.splitlines())
+    return "\n".join(out)
+
+
+def _pdf(rng: random.Random) -> bytes:
+    size = rng.choice((20_000, 150_000, 600_000))
+    return b"%PDF-1.4\n" + os.urandom(size) + b"\n%%EOF\n"
+
+
+def inbound_payload(kind: str, rng: random.Random) -> tuple[dict, dict]:
+    addr, dt, county = _incident(rng)
+    labeled = f"Address: {addr}\nDate/Time: {dt}\nCounty: {county}\n"
+    headers = (f"Received: from mx.county.example.gov\nMessage-ID: <{uuid.uuid4().hex}@county.example.gov>\n"
+               f"Subject: Re: Fire Incident Report Request: {dt}\n")
+    data = {"from": "Records <records@county.example.gov>", "to": "intake@repo.incidentreportshub.com",
+            "subject": f"Re: Fire Incident Report Request: {dt}", "headers": headers,
+            "envelope": json.dumps({"to": ["intake@repo.incidentreportshub.com"], "from": "records@county.example.gov"})}
+    files = {}
+    if kind == "inbound_labeled":
+        data["text"] = "Hello,\n\nSee the report.\n\n" + labeled
+    elif kind == "inbound_quoted":
+        data["text"] = "Report attached.\n\n" + labeled + "\n" + _quoted_thread(rng, rng.randint(3, 12)) * 20
+    elif kind == "inbound_html_only":
+        data["html"] = "<html><body><p>Report below.</p>" + "".join(
+            f"<p>{ln}</p>" for ln in labeled.splitlines()) + "</body></html>"
+    elif kind == "inbound_freeform":
+        data["text"] = f"The report for {addr} on {dt} in {county} County is attached."
+    elif kind == "inbound_pdfs":
+        data["text"] = "Attached.\n\n" + labeled
+        n = rng.randint(0, 5)
+        data["attachments"] = str(n)
+        data["attachment-info"] = json.dumps({f"attachment{i}": {"filename": f"report{i}.pdf"} for i in range(1, n + 1)})
+        files = {f"attachment{i}": (f"report{i}.pdf", _pdf(rng), "application/pdf") for i in range(1, n + 1)}
+    else:
+        raise ValueError(kind)
+    return data, files
+
+
+# ---------- local stand-ins ----------
+
+def install_stand_ins(sendgrid_latency_ms: float, openai_latency_ms: float) -> None:
+    import openai
+    import app.email_io as email_io
+    import app.email_parser as email_parser
+
+    class _Resp:
+        status_code = 202
+
+        def __init__(self):
+            self.headers = {"X-Message-Id": uuid.uuid4().hex}
+
+    class _FakeSendGrid:
+        def __init__(self):
+            self.client = type("Client", (), {"timeout": None})()  # email_io._send sets client.timeout
+
+        def send(self, msg):
+            time.sleep(sendgrid_latency_ms / 1000)
+            return _Resp()
+
+    class _FakeCompletions:
+        def create(self, **kwargs):
+            time.sleep(openai_latency_ms / 1000)
+            content = json.dumps({"address": "1 Main St", "datetime": "2025-01-01 00:00", "county": "Fresno"})
+            msg = type("Msg", (), {"content": content})
+            return type("Resp", (), {"choices": [type("Choice", (), {"message": msg})]})
+
+    class _FakeOpenAI:
+        def __init__(self, *args, **kwargs):
+            self.chat = type("Chat", (), {"completions": _FakeCompletions()})
+
+    email_io._sg = lambda: _FakeSendGrid()
+    openai.OpenAI = _FakeOpenAI
+    email_parser.OPENAI_API_KEY = email_parser.OPENAI_API_KEY or "stand-in"
+    email_parser.USE_LLM = True
+
+
+# ---------- runner ----------
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _pct(sorted_vals: list[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+async def _run_scenario(client, name: str, n: int, concurrency: int, seed: int, token: str) -> dict:
+    rng = random.Random(seed)
+    jobs = asyncio.Queue()
+    for i in range(n):
+        jobs.put_nowait(i)
+    latencies: list[float] = []
+    errors = 0
+    peak = _rss_bytes()
+    stop = asyncio.Event()
+
+    async def _watch_rss():
+        nonlocal peak
+        while not stop.is_set():
+            peak = max(peak, _rss_bytes())
+            await asyncio.sleep(0.05)
+
+    async def _one():
+        if name == "token":
+            return await client.post("/token", data={"username": "loadtest", "password": PASSWORD})
+        if name == "incident_request":
+            addr, dt, county = _incident(rng)
+            return await client.post("/incident_request", headers={"Authorization": f"Bearer {token}"},
+                                     json={"incident_address": addr, "incident_datetime": dt, "county": county})
+        data, files = inbound_payload(name, rng)
+        return await client.post("/inbound", data=data, files=files or None)
+
+    async def _worker():
+        nonlocal errors
+        while True:
+            try:
+                jobs.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            t0 = time.perf_counter()
+            try:
+                r = await _one()
+                if r.status_code >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - t0)
+
+    watcher = asyncio.create_task(_watch_rss())
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    stop.set()
+    await watcher
+
+    lat = sorted(latencies)
+    return {
+        "scenario": name,
+        "requests": n,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(n / wall, 1) if wall else 0.0,
+        "p50_ms": round(_pct(lat, 0.50) * 1000, 2),
+        "p95_ms": round(_pct(lat, 0.95) * 1000, 2),
+        "p99_ms": round(_pct(lat, 0.99) * 1000, 2),
+        "peak_rss_mb": round(peak / 1e6, 1),
+    }
+
+
+SCENARIOS = ["inbound_labeled", "inbound_quoted", "inbound_html_only", "inbound_freeform", "inbound_pdfs",
+             "token", "incident_request"]
+
+
+async def _main(args) -> list[dict]:
+    import httpx
+    from main import app
+    from app.database import Base, engine
+
+    install_stand_ins(args.sendgrid_latency_ms, args.openai_latency_ms)
+    Base.metadata.create_all(bind=engine)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=120) as client:
+        await client.post("/register", json={"username": "loadtest", "password": PASSWORD,
+                                             "email": "loadtest@example.com"})
+        r = await client.post("/token", data={"username": "loadtest", "password": PASSWORD})
+        token = r.json().get("access_token", "")
+        results = []
+        for i, name in enumerate(args.scenario or SCENARIOS):
+            res = await _run_scenario(client, name, args.requests, args.concurrency, args.seed + i, token)
+            results.append(res)
+            print(f"{res['scenario']:18s} n={res['requests']:<5d} c={res['concurrency']:<3d} "
+                  f"err={res['errors']:<4d} {res['throughput_rps']:8.1f} req/s  "
+                  f"p50={res['p50_ms']:8.2f}ms p95={res['p95_ms']:8.2f}ms p99={res['p99_ms']:8.2f}ms  "
+                  f"rss={res['peak_rss_mb']:7.1f}MB", flush=True)
+        return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Synthetic load test for the inbound webhook and request APIs")
+    ap.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--scenario", action="append", choices=SCENARIOS, help="repeatable; default: all")
+    ap.add_argument("--sendgrid-latency-ms", type=float, default=40.0)
+    ap.add_argument("--openai-latency-ms", type=float, default=400.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    # isolated database + quiet logs; must be set before the app is imported
+    tmp = tempfile.mkdtemp(prefix="irh-load-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/load.db"
+    os.environ["INBOUND_TMP"] = f"{tmp}/inbound"
+    os.environ.setdefault("COUNTY_CSV_PATH", str(ROOT / "ca_all_counties_fire_records_contacts_template.csv"))
+    import logging
+    logging.disable(logging.INFO)
+
+    results = asyncio.run(_main(args))
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,33 @@
 # FILE: main.py
 # ================================
 import sys, logging, os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from fastapi.responses import RedirectResponse, JSONResponse
-from pathlib import Path
-from dotenv import load_dotenv
+from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse
 
-root_env = Path(__file__).resolve().parent / ".env"
-load_dotenv(dotenv_path=root_env, override=True)
+import app.config  # noqa: F401  loads .env (once) before other app modules read os.environ
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s")
 for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
     logging.getLogger(name).setLevel(logging.INFO)
 
-app = FastAPI(title="IncidentReportHub Backend Phase 1 - Postgres")
+@asynccontextmanager
+async def lifespan(_app):
+    # STARTUP_MODE=lazy: warm county map / regexes / DB / SDKs in the background
+    from app.warmup import start
+    from app.matching import start_scheduler
+    from app.health import start_prober
+    start()
+    start_scheduler()  # periodic re-match when REMATCH_INTERVAL_SECS is set
+    start_prober()     # /livez, /readyz and /healthz answer from its cached result
+    yield
+
+app = FastAPI(title="IncidentReportHub Backend Phase 1 - Postgres", lifespan=lifespan)
 
 from starlette.middleware.cors import CORSMiddleware
+from app.metrics import MetricsMiddleware
+from app.profiling import ProfilingMiddleware
+from app.resilience import DeadlineMiddleware, CircuitOpen, DeadlineExceeded
 
 ALLOWED_ORIGINS = [
     "http://localhost:5173",                 # Vite dev
@@ -31,29 +43,54 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(ProfilingMiddleware)
+
+@app.exception_handler(CircuitOpen)
+@app.exception_handler(DeadlineExceeded)
+async def provider_unavailable(_request, exc):
+    # fail fast instead of tying up a worker; clients retry after the breaker's cool-down
+    retry = max(1, round(getattr(exc, "retry_after", 5)))
+    return JSONResponse({"detail": f"Upstream unavailable: {exc}"}, status_code=503,
+                        headers={"Retry-After": str(retry)})
+app.add_middleware(MetricsMiddleware)
 
 from app.routes_inbound import router as inbound_router
 from app.routes_requests import router as requests_router
 from app.routes_auth import router as auth_router
 from app.routes_admin import router as admin_router
+from app.routes_attachments import router as attachments_router
 
 app.include_router(admin_router)
 app.include_router(inbound_router)
 app.include_router(requests_router)
 app.include_router(auth_router)
+app.include_router(attachments_router)
 
 @app.get("/healthz", tags=["ops"])
 def healthz():
-    from app.database import engine
-    status = {"ok": True, "db": False, "error": None}
-    try:
-        with engine.connect() as conn:
-            conn.exec_driver_sql("select 1")
-        status["db"] = True
-    except Exception as e:
-        status["error"] = str(e)
+    from app.health import readiness
+    db = readiness()["checks"]["db"]
+    status = {"ok": True, "db": db["ok"], "error": db.get("error")}
     return JSONResponse(status, headers={"Cache-Control": "no-store"})
 
+@app.get("/livez", tags=["ops"])
+def livez():
+    from app.health import liveness
+    status = liveness()
+    return JSONResponse(status, status_code=200 if status["ok"] else 503, headers={"Cache-Control": "no-store"})
+
+@app.get("/readyz", tags=["ops"])
+def readyz():
+    from app.health import readiness
+    status = readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503, headers={"Cache-Control": "no-store"})
+
+@app.get("/metrics", tags=["ops"], include_in_schema=False)
+def metrics():
+    from app.metrics import render
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/ping", tags=["ops"])
 def ping():
     return {"pong": True}
@@ -0,0 +1,97 @@
+# test_archive.py
+import gzip
+import json
+from datetime import date
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app import models
+from app import archive
+from app.archive import archive_and_delete, cutoff_for
+from app.raw_store import build_raw
+
+def test_cutoff_for():
+    assert cutoff_for(6, today=date(2026, 10, 18)) == date(2026, 4, 1)
+    assert cutoff_for(12, today=date(2026, 1, 31)) == date(2025, 1, 1)
+
+def test_sqlite_archive_and_delete(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'a.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    for i, ts in enumerate(("2020-01-05 10:00:00", "2020-01-20 10:00:00", "2020-03-01 00:00:00")):
+        row = models.InboundEmail(sender="a@x.gov", subject=f"s{i}", body="b")
+        row.raw = build_raw(f"full text {i}", "", "Message-ID: <m>")
+        db.add(row); db.flush()
+        db.add(models.InboundIdempotency(key=f"k{i}", inbound_id=row.id))
+        db.execute(text("UPDATE inbound_emails SET created_at = :ts WHERE id = :id"), {"ts": ts, "id": row.id})
+    db.add(models.InboundEmail(sender="new@x.gov", subject="recent", body="b"))
+    db.commit(); db.close()
+
+    done = archive_and_delete(engine, tmp_path / "out", retain_months=6)
+    assert done == ["inbound_emails_p202001", "inbound_emails_p202003"]
+
+    with gzip.open(tmp_path / "out" / "inbound_emails_p202001.ndjson.gz", "rt") as fh:
+        rows = [json.loads(ln) for ln in fh]
+    assert [r["subject"] for r in rows] == ["s0", "s1"]
+    assert rows[0]["text"] == "full text 0"
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT subject FROM inbound_emails")).scalars().all() == ["recent"]
+        assert conn.execute(text("SELECT COUNT(*) FROM inbound_raw")).scalar() == 0
+        assert conn.execute(text("SELECT COUNT(*) FROM inbound_idempotency")).scalar() == 0
+
+class _PgConn:
+    """Records the SQL ensure_partitions issues; the DEFAULT partition has rows in `stray` months."""
+    dialect = type("Dialect", (), {"name": "postgresql"})
+
+    def __init__(self, stray):
+        self.stray, self.sql = stray, []
+
+    def execute(self, stmt, params=None):
+        sql = str(stmt)
+        self.sql.append(sql)
+        scalar = params is not None and params["lo"] in self.stray if sql.startswith("SELECT EXISTS") else None
+        return type("R", (), {"scalar": lambda _: scalar, "rowcount": 3})()
+
+class _PgEngine:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def begin(self):
+        conn = self.conn
+        return type("Tx", (), {"__enter__": lambda _: conn, "__exit__": lambda *a: False})()
+
+def test_ensure_partitions_moves_default_rows_before_attaching(monkeypatch):
+    monkeypatch.setattr(archive, "list_partitions", lambda engine: ["inbound_emails_p202610", "inbound_emails_pdefault"])
+    conn = _PgConn(stray={date(2026, 11, 1)})
+    created = archive.ensure_partitions(_PgEngine(conn), ahead=2, today=date(2026, 10, 18))
+    assert created == ["inbound_emails_p202611", "inbound_emails_p202612"]
+
+    nov = [q for q in conn.sql if "p202611" in q]
+    assert nov[0].startswith("CREATE TABLE inbound_emails_p202611 (LIKE inbound_emails")
+    assert nov[1].startswith("WITH moved AS (DELETE FROM inbound_emails_pdefault") and "INSERT INTO inbound_emails_p202611" in nov[1]
+    assert nov[2] == ("ALTER TABLE inbound_emails ATTACH PARTITION inbound_emails_p202611 "
+                      "FOR VALUES FROM ('2026-11-01') TO ('2026-12-01')")
+    # no stray rows for December: created directly as a partition
+    (dec,) = [q for q in conn.sql if "p202612" in q]
+    assert dec.startswith("CREATE TABLE IF NOT EXISTS inbound_emails_p202612 PARTITION OF inbound_emails")
+
+def test_archive_sweeps_old_rows_out_of_the_default_partition(monkeypatch, tmp_path):
+    this_month = archive.partition_name(date.today().replace(day=1))
+    monkeypatch.setattr(archive, "list_partitions", lambda engine: [this_month, "inbound_emails_pdefault"])
+    exported = []
+    monkeypatch.setattr(archive, "_export", lambda engine, where, params, dest, table=archive.PARENT:
+                        exported.append((table, where, dest.name)) or 2)
+    conn = _PgConn(stray=set())
+    done = archive.archive_partitions(_PgEngine(conn), tmp_path, retain_months=6)
+
+    cutoff = cutoff_for(6)
+    assert done == ["inbound_emails_pdefault"]  # the current month is kept
+    assert exported == [("inbound_emails_pdefault", "e.created_at < :cutoff",
+                         f"inbound_emails_pdefault_before{cutoff:%Y%m}.ndjson.gz")]
+    assert all("FROM inbound_emails_pdefault e WHERE e.created_at < :cutoff" in q for q in conn.sql)
+    assert any(q.startswith("DELETE FROM inbound_raw") for q in conn.sql)
+    assert conn.sql[-1] == "DELETE FROM inbound_emails_pdefault e WHERE e.created_at < :cutoff"
+    assert not any("DETACH" in q for q in conn.sql)
@@ -0,0 +1,81 @@
+# test_attachments.py
+import os
+import pytest
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+from urllib.parse import urlsplit
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from app.database import SessionLocal, Base, engine
+from app.models import IncidentRequest, InboundEmail, InboundRaw, InboundIdempotency, StoredAttachment
+import app.attachment_store as store_mod
+import app.routes_inbound as inbound_mod
+
+client = TestClient(app)
+
+MSG = "Address: 9 Pine Rd\nDate/Time: 2025-07-01 08:00\nCounty: Fresno"
+
+@pytest.fixture(autouse=True)
+def _fresh_db(monkeypatch, tmp_path):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for m in (InboundIdempotency, InboundRaw, InboundEmail, IncidentRequest, StoredAttachment):
+            db.query(m).delete()
+        db.commit()
+        db.add(IncidentRequest(created_by="u", requester_email="u@example.com", incident_address="9 Pine Rd",
+                               incident_datetime="2025-07-01 08:00", county="Fresno", county_email="c@example.com"))
+        db.commit()
+    finally:
+        db.close()
+    monkeypatch.setattr(store_mod, "ATTACHMENT_DIR", tmp_path / "store")
+    monkeypatch.setattr(store_mod, "ATTACHMENT_INLINE_MAX_BYTES", 100_000)
+    sent = []
+    monkeypatch.setattr(inbound_mod, "send_attachments_to_user", lambda **kw: sent.append(kw) or "sg-1")
+    yield sent
+
+def _post(files):
+    data = {"from": "records@county.example.gov", "subject": "Re: report", "text": MSG,
+            "attachments": str(len(files))}
+    return client.post("/inbound", data=data, files={f"attachment{i}": f for i, f in enumerate(files, 1)})
+
+def test_split_keeps_small_files_inline():
+    files = [{"path": "a", "size": 60_000}, {"path": "b", "size": 30_000}, {"path": "c", "size": 50_000}]
+    inline, linked = store_mod.split_for_email(files, limit=100_000)
+    assert [f["path"] for f in inline] == ["b", "c"]
+    assert [f["path"] for f in linked] == ["a"]
+
+def test_oversized_attachment_forwarded_as_signed_link(_fresh_db):
+    big = os.urandom(250_000)
+    r = _post([("scan.pdf", big, "application/pdf"), ("note.txt", b"small", "text/plain")])
+    assert r.status_code == 200 and r.json()["match"]
+
+    sent = _fresh_db[0]
+    assert [f["filename"] for f in sent["files"]] == ["note.txt"]
+    (link,) = sent["links"]
+    assert link["filename"] == "scan.pdf" and link["size"] == len(big)
+
+    url = urlsplit(link["url"])
+    path = f"{url.path}?{url.query}"
+    full = client.get(path)
+    assert full.status_code == 200 and full.content == big
+    assert full.headers["content-type"] == "application/pdf"
+
+    part = client.get(path, headers={"Range": "bytes=100-199"})
+    assert part.status_code == 206 and part.content == big[100:200]
+
+    tampered = path.replace("sig=", "sig=x")
+    assert client.get(tampered).status_code == 403
+
+def test_expired_link_rejected():
+    import time
+    exp = int(time.time()) - 10
+    r = client.get(f"/attachments/nope?exp={exp}&sig={store_mod._sign('nope', exp)}")
+    assert r.status_code == 410
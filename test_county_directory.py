@@ -0,0 +1,129 @@
+# test_county_directory.py
+import os
+import itertools
+import pytest
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from app.database import SessionLocal, Base, engine
+from app.models import User, IncidentRequest, InboundEmail, InboundRaw, InboundIdempotency, MatchReview
+from app import config, scoring
+from app.county_index import state_from_address, state_from_domain
+import app.routes_inbound as inbound_mod
+import app.routes_requests as requests_mod
+
+client = TestClient(app)
+_ids = itertools.count(1)
+
+DIRECTORY = """County,State,Records Email
+Los Angeles,CA,records@lacounty.gov
+Orange,CA,records@ocfa.org
+Orange,FL,records@ocfl.net
+Orange,NY,records@orangecountygov.com
+Miami-Dade County,Florida,records@miamidade.gov
+Jefferson Parish,LA,records@jeffparish.net
+"""
+
+@pytest.fixture(autouse=True)
+def _directory(monkeypatch, tmp_path):
+    path = tmp_path / "counties.csv"
+    path.write_text(DIRECTORY)
+    monkeypatch.setattr(config, "COUNTY_CSV_PATH", str(path))
+    config.refresh_county_cache()
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for m in (InboundIdempotency, InboundRaw, InboundEmail, IncidentRequest, MatchReview):
+            db.query(m).delete()
+        db.query(User).filter(User.username == "county-dir").delete()
+        db.commit()
+    finally:
+        db.close()
+    scoring.clear_cache()
+    monkeypatch.setattr(requests_mod, "send_request_email", lambda **kw: f"sg-req-{next(_ids)}")
+    monkeypatch.setattr(inbound_mod, "send_attachments_to_user", lambda **kw: "sg-fwd")
+    monkeypatch.setattr(inbound_mod, "send_alert_no_attachments", lambda **kw: "sg-fwd")
+    yield
+    monkeypatch.undo()
+    config.refresh_county_cache()
+
+def _auth():
+    client.post("/register", json={"username": "county-dir", "password": "pw-123456", "email": "d@example.com"})
+    tok = client.post("/token", data={"username": "county-dir", "password": "pw-123456"}).json()["access_token"]
+    return {"Authorization": f"Bearer {tok}"}
+
+def _create(headers, **body):
+    return client.post("/incident_request", headers=headers,
+                       json={"incident_address": "1 Main St", "incident_datetime": "2025-08-09 14:30", **body})
+
+def test_directory_is_keyed_by_state_and_county():
+    d = config.get_county_directory()
+    assert d.stats() == {"entries": 6, "states": 4, "domains": 6}
+    assert config.get_county_email("Orange County", "FL") == "records@ocfl.net"
+    assert config.get_county_email("orange") == "records@ocfa.org"  # default state
+    assert config.get_county_email("Orange", "TX") is None
+    assert d.states_for("orange") == ("CA", "FL", "NY")
+    assert d.canonical("LA", "jefferson") == "Jefferson Parish"
+    assert config.get_county_email_map()[("FL", "Miami-Dade County")] == "records@miamidade.gov"
+    # interned: one object per distinct state code
+    (fl1, _), (fl2, _) = [k for k in d.entries if k[0] == "FL"]
+    assert fl1 is fl2
+
+def test_state_inference_from_address_and_sender():
+    assert state_from_address("12 Oak St, Orlando, FL 32801") == "FL"
+    assert state_from_address("12 Oak St, Albany, New York") == "NY"
+    assert state_from_address("12 Pine Ct") is None
+    assert state_from_address("500 Capitol Mall NE") is None          # directional, not Nebraska
+    assert state_from_address("500 Capitol Mall NE, Sacramento") is None
+    assert state_from_address("1 Main St NE, Washington, DC 20002") == "DC"
+    assert state_from_domain("records.co.orange.ny.us") == "NY"
+    assert config.infer_state("12 Oak St", "Records <records@ocfl.net>") == "FL"
+    assert config.infer_state("12 Oak St", "someone@example.com") is None
+
+def test_request_state_is_explicit_inferred_or_validated():
+    h = _auth()
+    cases = [({"county": "Orange", "state": "fl"}, ("Orange", "FL")),
+             ({"county": "orange county", "incident_address": "1 Main St, Goshen, NY 10924"}, ("Orange", "NY")),
+             ({"county": "Orange"}, ("Orange", "CA")),
+             ({"county": "miami-dade"}, ("Miami-Dade County", "FL")),
+             ({"county": "Los Angeles", "incident_address": "500 Capitol Mall NE"}, ("Los Angeles", "CA")),
+             # an inferred state without the county falls back instead of rejecting
+             ({"county": "Los Angeles", "incident_address": "1 Main St, Albany, NY 12207"}, ("Los Angeles", "CA")),
+             ({"county": "Jefferson Parish", "incident_address": "1 Main St, Albany, NY 12207"},
+              ("Jefferson Parish", "LA"))]
+    db = SessionLocal()
+    try:
+        for body, expected in cases:
+            r = _create(h, **body)
+            assert r.status_code == 200, r.text
+            req = db.get(IncidentRequest, r.json()["request_id"])
+            assert (req.county, req.state) == expected
+            assert req.county_email == config.get_county_email(*expected)
+    finally:
+        db.close()
+    assert _create(h, county="Orange", state="TX").status_code == 422
+    assert _create(h, county="Orange", state="Atlantis").status_code == 422
+
+def test_reply_matches_the_request_in_its_own_state():
+    h = _auth()
+    ids = {s: _create(h, county="Orange", state=s).json()["request_id"] for s in ("CA", "FL", "NY")}
+    text = "Address: 1 Main St\nDate/Time: 2025-08-09 14:30\nCounty: Orange"
+    r = client.post("/inbound", data={"from": "Records <records@ocfl.net>", "subject": "Re: report", "text": text,
+                                      "headers": "Message-ID: <county-dir-1@test>\n"}).json()
+    assert r["match"] == ids["FL"]
+    r = client.post("/inbound", data={"from": "clerk@co.orange.ny.us", "subject": "Re: report", "text": text,
+                                      "headers": "Message-ID: <county-dir-2@test>\n"}).json()
+    assert r["match"] == ids["NY"]
+    db = SessionLocal()
+    try:
+        assert db.get(InboundEmail, r["inbound_id"]).parsed_state == "NY"
+    finally:
+        db.close()
@@ -0,0 +1,79 @@
+# test_county_index.py
+import os
+import pytest
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from app.database import SessionLocal, Base, engine
+from app.models import User, IncidentRequest
+from app.county_index import canonical_county, get_index, CA_COUNTIES
+from app.email_parser import parse_inbound
+import app.routes_requests as requests_mod
+
+client = TestClient(app)
+
+def test_zip_and_city_lookup():
+    idx = get_index()
+    assert idx.county_for_zip("94105") == "San Francisco"
+    assert idx.county_for_zip("91710") == "San Bernardino"  # 917xx straddles LA / San Bernardino
+    assert idx.county_for_zip("91766") == "Los Angeles"
+    assert idx.county_for_zip("10001") is None
+    assert idx.county_for_city("la cañada flintridge") == "Los Angeles"
+    assert set(CA_COUNTIES) == {CA_COUNTIES[c] for c in idx.zip_county}
+
+@pytest.mark.parametrize("address,county", [
+    ("334 Wilshire Blvd, Los Angeles, CA 90010", "Los Angeles"),
+    ("12 Main St, Chino, CA", "San Bernardino"),
+    ("77 Mission St San Francisco CA", "San Francisco"),
+    ("1 Elm St, St. Helena", "Napa"),
+    ("90210 Main St", None),  # leading 5 digits are a house number
+    ("5 Oak Ave, Springfield", None),
+    ("44 Main St, Glendale, AZ 85301", None),  # a California city name in another state
+    ("44 Main St, Glendale, CA 91203", "Los Angeles"),
+])
+def test_infer_from_address(address, county):
+    assert get_index().infer(address) == county
+
+def test_canonical_county():
+    assert canonical_county("County of los angeles") == "Los Angeles"
+    assert canonical_county(" SAN DIEGO COUNTY, CA ") == "San Diego"
+    assert canonical_county("Gotham") is None
+
+def test_parser_infers_missing_county():
+    res = parse_inbound("Address: 900 Truxtun Ave, Bakersfield, CA 93301\nDate/Time: 2025-08-09 14:30\n\nThanks,\nRecords")
+    assert (res.address, res.datetime, res.county) == ("900 Truxtun Ave, Bakersfield, CA 93301",
+                                                       "2025-08-09 14:30", "Kern")
+    assert parse_inbound("Address: 5 Oak Ave, Springfield\nDate/Time: 2025-08-09 14:30").county == ""
+    assert parse_inbound("Address: 44 Main St, Glendale, AZ 85301\nDate/Time: 2025-08-09 14:30").county == ""
+
+def test_request_county_is_validated_and_canonicalized(monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.query(User).filter(User.username == "county-idx").delete(); db.commit()
+    finally:
+        db.close()
+    monkeypatch.setattr(requests_mod, "send_request_email", lambda **kw: "sg-req")
+    client.post("/register", json={"username": "county-idx", "password": "pw-123456", "email": "c@example.com"})
+    token = client.post("/token", data={"username": "county-idx", "password": "pw-123456"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    body = {"incident_address": "1 Main St", "incident_datetime": "2025-08-09 14:30"}
+
+    r = client.post("/incident_request", headers=headers, json={**body, "county": "Gotham"})
+    assert r.status_code == 422
+
+    r = client.post("/incident_request", headers=headers, json={**body, "county": "los angeles county"})
+    assert r.status_code == 200, r.text
+    db = SessionLocal()
+    try:
+        assert db.get(IncidentRequest, r.json()["request_id"]).county == "Los Angeles"
+    finally:
+        db.close()
@@ -0,0 +1,53 @@
+# test_db_pool.py
+import os
+import sqlite3
+import pytest
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from app import database, profiling
+
+client = TestClient(app)
+
+def test_server_pool_settings_come_from_the_environment():
+    kw = database._engine_kwargs(is_sqlite=False)
+    assert kw["poolclass"] is database._TimedQueuePool
+    assert (kw["pool_size"], kw["max_overflow"], kw["pool_timeout"], kw["pool_recycle"], kw["pool_pre_ping"]) == (
+        database.DB_POOL_SIZE, database.DB_MAX_OVERFLOW, database.DB_POOL_TIMEOUT, database.DB_POOL_RECYCLE,
+        database.DB_POOL_PRE_PING)
+    assert "poolclass" not in database._engine_kwargs(is_sqlite=True)
+
+def test_only_a_full_pool_counts_as_a_timeout(monkeypatch):
+    monkeypatch.setattr(database, "POOL_STATS", database._PoolStats())  # keep /readyz's view clean
+    before = database.POOL_STATS.snapshot()
+    pool = database._TimedQueuePool(lambda: sqlite3.connect(":memory:"), pool_size=1, max_overflow=0, timeout=0.05)
+    held = pool.connect()
+    with pytest.raises(PoolTimeoutError):
+        pool.connect()
+    held.close()
+
+    def refused():
+        raise ConnectionRefusedError("db down")
+    broken = database._TimedQueuePool(refused, pool_size=1, max_overflow=0, timeout=0.05)
+    with pytest.raises(ConnectionRefusedError):
+        broken.connect()
+
+    after = database.POOL_STATS.snapshot()
+    assert after["timeouts"] - before["timeouts"] == 1
+    assert after["wait_count"] - before["wait_count"] == 3
+    assert after["wait_ms_max"] >= 40
+
+def test_pool_endpoint_is_admin_only(monkeypatch):
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "test-admin")
+    assert client.get("/admin/db/pool").status_code == 403
+    body = client.get("/admin/db/pool", headers={"X-Admin-Token": "test-admin"}).json()
+    assert {"pool", "checkouts", "timeouts", "wait_ms_p95"} <= set(body)
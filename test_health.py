@@ -0,0 +1,83 @@
+# test_health.py
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from app.database import SessionLocal, Base, engine, POOL_STATS
+from app.models import InboundEmail, InboundRaw, InboundIdempotency
+from app import health
+
+client = TestClient(app)
+
+def _reset():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for m in (InboundIdempotency, InboundRaw, InboundEmail):
+            db.query(m).delete()
+        db.commit()
+    finally:
+        db.close()
+    health.probe()
+
+def test_readyz_answers_from_cache_without_touching_the_app_pool(monkeypatch):
+    _reset()
+    calls = []
+    real = health._check_db_and_outbox
+    monkeypatch.setattr(health, "_check_db_and_outbox", lambda: calls.append(1) or real())
+    checkouts = POOL_STATS.checkouts
+    for _ in range(5):
+        r = client.get("/readyz")
+        assert r.status_code == 200 and r.json()["ready"] is True
+    assert calls == []                          # cached
+    assert POOL_STATS.checkouts == checkouts    # no app-pool connection either
+    assert client.get("/healthz").json() == {"ok": True, "db": True, "error": None}
+
+    monkeypatch.setattr(health, "HEALTH_STALE_SECS", -1)  # stale: one inline probe per call
+    body = client.get("/readyz").json()
+    assert calls == [1] and set(body["checks"]) == {"db", "pool", "disk", "outbox"}
+
+def test_low_disk_makes_instance_unready(monkeypatch):
+    _reset()
+    monkeypatch.setattr(health, "HEALTH_MIN_FREE_MB", float("inf"))
+    health.probe()
+    r = client.get("/readyz")
+    assert r.status_code == 503
+    assert r.json()["status"] == "fail" and r.json()["checks"]["disk"]["ok"] is False
+    assert "irh_ready 0" in client.get("/metrics").text
+
+def test_outbox_backlog_warns_but_stays_ready(monkeypatch):
+    _reset()
+    old = datetime.now(timezone.utc) - timedelta(minutes=5)
+    db = SessionLocal()
+    try:
+        db.add_all([InboundEmail(sender="c@example.gov", subject="Re", matched_request_id=1, created_at=old),
+                    InboundEmail(sender="c@example.gov", subject="Re", matched_request_id=2, created_at=old,
+                                 forwarded_at=old, forwarded_to="u@example.com"),
+                    InboundEmail(sender="c@example.gov", subject="Re", created_at=old)])
+        db.commit()
+    finally:
+        db.close()
+    monkeypatch.setattr(health, "HEALTH_OUTBOX_MAX", 0)
+    health.probe()
+    r = client.get("/readyz")
+    assert r.status_code == 200
+    assert r.json()["status"] == "warn" and r.json()["checks"]["outbox"]["pending"] == 1
+
+def test_livez_is_in_process_and_fails_when_prober_died(monkeypatch):
+    assert client.get("/livez").json()["ok"] is True
+    dead = threading.Thread(target=lambda: None)
+    dead.start(); dead.join()
+    monkeypatch.setattr(health, "_THREAD", dead)
+    r = client.get("/livez")
+    assert r.status_code == 503 and r.json()["prober"] == "dead"
@@ -0,0 +1,132 @@
+# test_http_cache.py
+import os
+import itertools
+import pytest
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from app.database import SessionLocal, Base, engine
+from app.models import User, IncidentRequest, InboundEmail, MatchReview
+from app import http_cache, profiling
+from app.request_status import mark_replied
+import app.routes_requests as requests_mod
+
+client = TestClient(app)
+_ids = itertools.count(1)
+
+@pytest.fixture(autouse=True)
+def _fresh_db(monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for m in (InboundEmail, IncidentRequest, MatchReview):
+            db.query(m).delete()
+        db.query(User).filter(User.username.in_(("etag-a", "etag-b"))).delete()
+        db.commit()
+    finally:
+        db.close()
+    http_cache.CACHE.clear()
+    monkeypatch.setattr(requests_mod, "send_request_email", lambda **kw: f"sg-req-{next(_ids)}")
+    monkeypatch.setattr(requests_mod, "get_county_email", lambda c, state=None: "records@county.example.gov")
+
+def _auth(user):
+    client.post("/register", json={"username": user, "password": "pw-123456", "email": f"{user}@example.com"})
+    tok = client.post("/token", data={"username": user, "password": "pw-123456"}).json()["access_token"]
+    return {"Authorization": f"Bearer {tok}"}
+
+def _create(headers, address):
+    return client.post("/incident_request", headers=headers, json={
+        "incident_address": address, "incident_datetime": "2025-08-09 14:30", "county": "San Francisco",
+    }).json()["request_id"]
+
+def test_mine_answers_304_until_a_status_write_changes_the_etag():
+    a = _auth("etag-a")
+    rid = _create(a, "1 Mission St")
+    first = client.get("/incident_requests/mine", headers=a)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "private, no-cache"
+
+    again = client.get("/incident_requests/mine", headers={**a, "If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["ETag"] == etag and again.content == b""
+
+    db = SessionLocal()
+    try:
+        mark_replied(db, [(rid, 1)])
+        db.commit()
+    finally:
+        db.close()
+    changed = client.get("/incident_requests/mine", headers={**a, "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert changed.json()["requests"][0]["status"] == "replied"
+
+def test_etag_differs_per_user_and_page():
+    a, b = _auth("etag-a"), _auth("etag-b")
+    _create(a, "1 Mission St")
+    _create(b, "2 Mission St")
+    ea = client.get("/incident_requests/mine", headers=a).headers["ETag"]
+    assert client.get("/incident_requests/mine", headers={**b, "If-None-Match": ea}).status_code == 200
+    assert client.get("/incident_requests/mine", params={"limit": 1},
+                      headers={**a, "If-None-Match": ea}).status_code == 200
+
+def test_writes_from_another_process_are_seen_through_the_validator(monkeypatch):
+    monkeypatch.setattr(http_cache, "HTTP_CACHE_TTL_SECS", 0)
+    a = _auth("etag-a")
+    rid = _create(a, "1 Mission St")
+    etag = client.get("/incident_requests/mine", headers=a).headers["ETag"]
+    # a raw write that bypasses the Session hooks (another worker / a CLI job)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE incident_requests SET status = 'forwarded', row_version = row_version + 1 "
+                             f"WHERE id = {rid}")
+    r = client.get("/incident_requests/mine", headers={**a, "If-None-Match": etag})
+    assert r.status_code == 200 and r.json()["requests"][0]["status"] == "forwarded"
+
+def test_repeat_poll_is_served_from_the_cached_body(monkeypatch):
+    a = _auth("etag-a")
+    _create(a, "1 Mission St")
+    body = client.get("/incident_requests/mine", headers=a).content
+    monkeypatch.setattr(requests_mod, "public", lambda r: pytest.fail("rows re-serialized"))
+    assert client.get("/incident_requests/mine", headers=a).content == body
+
+def test_match_reviews_etag_changes_when_a_review_is_added(monkeypatch):
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "test-admin")
+    h = {"X-Admin-Token": "test-admin"}
+    r = client.get("/admin/match-reviews", headers=h)
+    assert r.status_code == 200 and r.json() == {"reviews": []}
+    etag = r.headers["ETag"]
+    assert client.get("/admin/match-reviews", headers={**h, "If-None-Match": etag}).status_code == 304
+
+    db = SessionLocal()
+    try:
+        db.add(MatchReview(inbound_id=1, candidates="[]", top_score=0.5))
+        db.commit()
+    finally:
+        db.close()
+    r = client.get("/admin/match-reviews", headers={**h, "If-None-Match": etag})
+    assert r.status_code == 200 and len(r.json()["reviews"]) == 1
+
+def test_stored_forward_status_is_conditional(monkeypatch):
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "test-admin")
+    db = SessionLocal()
+    try:
+        row = InboundEmail(sender="c@county.gov", subject="Re", body="b", forward_status="delivered",
+                           forward_sg_message_id="fwd-1")
+        db.add(row)
+        db.commit()
+        iid = row.id
+    finally:
+        db.close()
+    assert client.get("/admin/forward-status", params={"inbound_id": iid}).status_code == 403
+    r = client.get("/admin/forward-status", params={"inbound_id": iid, "live": "false"},
+                   headers={"X-Admin-Token": "test-admin"})
+    assert r.json()["forward_status"] == "delivered" and r.json()["activity"] is None
+    again = client.get("/admin/forward-status", params={"inbound_id": iid, "live": "false"},
+                       headers={"If-None-Match": r.headers["ETag"], "X-Admin-Token": "test-admin"})
+    assert again.status_code == 304
@@ -0,0 +1,79 @@
+# test_idempotency.py
+import os
+import pytest
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from app.database import SessionLocal, Base, engine
+from app.models import IncidentRequest, InboundEmail, InboundRaw, InboundIdempotency
+import app.routes_inbound as inbound_mod
+
+client = TestClient(app)
+
+MSG = "Address: 334 Wilshire Blvd\nDate/Time: 2025-06-20 10:00\nCounty: Los Angeles"
+
+@pytest.fixture(autouse=True)
+def _fresh_db(monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.query(InboundIdempotency).delete(); db.query(InboundRaw).delete()
+        db.query(InboundEmail).delete(); db.query(IncidentRequest).delete()
+        db.commit()
+        db.add(IncidentRequest(created_by="u", requester_email="u@example.com",
+                               incident_address="334 Wilshire Blvd", incident_datetime="2025-06-20 10:00",
+                               county="Los Angeles", county_email="c@example.com"))
+        db.commit()
+    finally:
+        db.close()
+    sent = []
+    monkeypatch.setattr(inbound_mod, "send_alert_no_attachments", lambda **kw: sent.append(kw) or "sg-1")
+    monkeypatch.setattr(inbound_mod, "send_attachments_to_user", lambda **kw: sent.append(kw) or "sg-2")
+    yield sent
+
+def _count():
+    db = SessionLocal()
+    try:
+        return db.query(InboundEmail).count()
+    finally:
+        db.close()
+
+def test_message_id_retry_is_replayed(_fresh_db):
+    payload = {"from": "fd@example.com", "subject": "Re: request", "text": MSG,
+               "headers": "Message-ID: <abc@example.com>\nSubject: Re: request\n"}
+    first = client.post("/inbound", data=payload).json()
+    second = client.post("/inbound", data=payload).json()
+
+    assert first["status"] == "received" and first["match"]
+    assert second["status"] == "duplicate"
+    assert second["inbound_id"] == first["inbound_id"]
+    assert second["match"] == first["match"]
+    assert _count() == 1
+    assert len(_fresh_db) == 1  # forwarded once
+
+def test_payload_hash_used_without_message_id(_fresh_db):
+    payload = {"from": "fd@example.com", "subject": "Re: request", "text": MSG}
+    files = {"attachment1": ("r.pdf", b"%PDF-1.4 report", "application/pdf")}
+    first = client.post("/inbound", data={**payload, "attachments": "1"}, files=files).json()
+    again = client.post("/inbound", data={**payload, "attachments": "1"}, files=files).json()
+    other = client.post("/inbound", data={**payload, "attachments": "1"},
+                        files={"attachment1": ("r.pdf", b"%PDF-1.4 other", "application/pdf")}).json()
+
+    assert again["status"] == "duplicate" and again["inbound_id"] == first["inbound_id"]
+    assert other["status"] == "received" and other["inbound_id"] != first["inbound_id"]
+    assert _count() == 2
+
+def test_idempotency_key_prefers_message_id():
+    k1 = inbound_mod.idempotency_key("Message-ID: <x@y>", "a", "b", "c", "", [])
+    k2 = inbound_mod.idempotency_key("Message-ID: <x@y>", "a", "b", "changed", "", [])
+    assert k1 == k2 == "mid:<x@y>"
+    assert inbound_mod.idempotency_key("", "a", "b", "c", "", ["1", "2"]) == \
+        inbound_mod.idempotency_key("", "a", "b", "c", "", ["2", "1"])
@@ -0,0 +1,39 @@
+# test_import_budget.py
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+# generous enough for slow CI boxes; fastapi + sqlalchemy alone are ~0.4s
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+DEFERRED = ("sendgrid", "openai", "passlib", "bcrypt", "jose", "httpx", "numpy", "app.email_parser", "app.scoring")
+
+def _import_main() -> tuple[float, list[str]]:
+    code = ("import json, sys, main; "
+            f"print(json.dumps([m for m in {list(DEFERRED)!r} if m in sys.modules]))")
+    env = {**os.environ, "STARTUP_MODE": "lazy"}
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                         capture_output=True, text=True, timeout=120, check=True)
+    cumulative_us = None
+    for ln in out.stderr.splitlines():
+        m = re.match(r"import time:\s+\d+ \|\s+(\d+) \| main$", ln)
+        if m:
+            cumulative_us = int(m.group(1))
+    assert cumulative_us is not None, out.stderr[-2000:]
+    return cumulative_us / 1000, json.loads(out.stdout.strip().splitlines()[-1])
+
+def test_import_main_within_budget_and_defers_heavy_deps():
+    ms, loaded = _import_main()
+    assert loaded == [], f"heavy modules imported eagerly: {loaded}"
+    assert ms < IMPORT_BUDGET_MS, f"import main took {ms:.0f}ms (budget {IMPORT_BUDGET_MS:.0f}ms)"
+
+def test_warmup_loads_critical_state():
+    from app import warmup
+    res = warmup.warm()
+    assert res["done"]
+    for step in ("county_map", "parser", "tmp_dir", "db", "sendgrid", "auth"):
+        assert res["steps"][step]["ok"], (step, res["steps"][step])
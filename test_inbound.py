@@ -1,5 +1,4 @@
 # test_inbound.py
-import json
 import pytest
 from fastapi.testclient import TestClient
 import os
@@ -12,16 +11,11 @@ load_dotenv(dotenv_path=".env.test", override=True)
 if "render.com" in (os.getenv("DATABASE_URL") or ""):
     raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
 
-# Import your app and models from the canvas code
-from main import (
-    app,
-    SessionLocal,
-    Base,
-    engine,
-    User,
-    IncidentRequest,
-    InboundEmail,
-)
+# Import your app and models
+from main import app
+from app.database import SessionLocal, Base, engine
+from app.models import User, IncidentRequest, InboundEmail, InboundRaw, InboundIdempotency, MatchReview
+import app.routes_inbound as inbound_mod
 
 client = TestClient(app)
 
@@ -31,8 +25,8 @@ def _clean_db():
     """Safely clear tables between tests without dropping schema."""
     db = SessionLocal()
     try:
-        db.query(InboundEmail).delete()
-        db.query(IncidentRequest).delete()
+        for m in (InboundIdempotency, InboundRaw, MatchReview, InboundEmail, IncidentRequest):
+            db.query(m).delete()
         db.query(User).delete()
         db.commit()
     finally:
@@ -43,7 +37,8 @@ def _insert_incident(address: str, dt: str, county: str, county_email: str = "te
     db = SessionLocal()
     try:
         ir = IncidentRequest(
-            user_token="testtoken",
+            created_by="inbound-tester",
+            requester_email="requester@example.com",
             incident_address=address,
             incident_datetime=dt,
             county=county,
@@ -71,16 +66,16 @@ def _ensure_schema():
 def _fresh_db_each_test(monkeypatch):
     """
     Clean rows before each test and disable outbound integrations:
-    - Disable SendGrid by unsetting SENDGRID_API_KEY inside app module.
-    - Disable OpenAI by forcing openai_client to None unless a test sets it.
+    - Forwards to the requester go to stand-ins instead of SendGrid.
+    - The LLM fallback stays off unless a test turns it on.
     """
     _clean_db()
-    # Disable SendGrid in tests to avoid real emails
-    import main as appmod
-    appmod.SENDGRID_API_KEY = None
-    # Disable LLM fallback by default (tests that need it will override)
-    appmod.openai_client = None
-    yield
+    sent = []
+    monkeypatch.setattr(inbound_mod, "send_attachments_to_user", lambda **kw: sent.append(kw) or "sg-fwd")
+    monkeypatch.setattr(inbound_mod, "send_alert_no_attachments", lambda **kw: sent.append(kw) or "sg-alert")
+    import app.email_parser as ep
+    monkeypatch.setattr(ep, "USE_LLM", False)
+    yield sent
     _clean_db()
 
 # ---------- Tests ----------
@@ -104,7 +99,7 @@ def test_inbound_happy_path():
     assert data["parsed"]["address"] == "334 Wilshire Blvd"
     assert data["parsed"]["datetime"] == "2025-06-20 10:00"
     assert data["parsed"]["county"] == "Los Angeles"
-    assert data["match"]["incident_request_id"] == inc.id
+    assert data["match"] == inc.id
 
 def test_inbound_whitespace_and_punctuation_variants():
     """
@@ -128,7 +123,7 @@ def test_inbound_whitespace_and_punctuation_variants():
     assert data["parsed"]["county"].lower() == "los angeles"
 
     # Matching should still succeed due to normalization
-    assert data["match"]["incident_request_id"] == inc.id
+    assert data["match"] == inc.id
 
 def test_inbound_missing_address():
     """
@@ -143,7 +138,7 @@ def test_inbound_missing_address():
     resp = client.post("/inbound", data=payload)
     data = resp.json()
     assert resp.status_code == 200
-    assert data["parsed"]["address"] is None
+    assert data["parsed"]["address"] == ""
     assert data["match"] is None
 
 def test_inbound_missing_datetime():
@@ -159,7 +154,7 @@ def test_inbound_missing_datetime():
     resp = client.post("/inbound", data=payload)
     data = resp.json()
     assert resp.status_code == 200
-    assert data["parsed"]["datetime"] is None
+    assert data["parsed"]["datetime"] == ""
     assert data["match"] is None
 
 def test_inbound_missing_county():
@@ -175,7 +170,7 @@ def test_inbound_missing_county():
     resp = client.post("/inbound", data=payload)
     data = resp.json()
     assert resp.status_code == 200
-    assert data["parsed"]["county"] is None
+    assert data["parsed"]["county"] == ""
     assert data["match"] is None
 
 def test_inbound_no_match():
@@ -196,55 +191,29 @@ def test_inbound_no_match():
 
 def test_inbound_invalid_payload_missing_text():
     """
-    Missing 'text' field (email body) should return 400.
+    Missing 'text' field (email body): SendGrid can post HTML-only or empty
+    replies, so it is stored with blank parsed fields rather than rejected.
     """
     payload = {"from": "firedept@example.com", "subject": "Invalid"}
     resp = client.post("/inbound", data=payload)
-    assert resp.status_code == 400
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["parsed"] == {"address": "", "datetime": "", "county": ""}
+    assert data["match"] is None and data["inbound_id"] is not None
 
 def test_inbound_llm_fallback(monkeypatch):
     """
     Body has no labeled lines; rule-based parsing fails.
-    LLM fallback is monkeypatched to return JSON, enabling a match.
+    The LLM extraction is monkeypatched to return the fields, enabling a match.
     """
     # Prepare a matching incident
     inc = _insert_incident("334 Wilshire Blvd", "2025-06-20 10:00", "Los Angeles")
 
-    # Monkeypatch openai_client to a fake one that returns a JSON we expect.
-    class _FakeChoice:
-        def __init__(self, content):
-            self.message = type("obj", (), {"content": content})
-
-    class _FakeResp:
-        def __init__(self, content):
-            self.choices = [_FakeChoice(content)]
-
-    class _FakeChat:
-        def __init__(self, outer):
-            self.outer = outer
-        def completions_create(self, **kwargs):
-            # not used, but keep for compatibility if called
-            return _FakeResp(self.outer.content)
-        def completions(self):
-            return self
-        def create(self, **kwargs):
-            return _FakeResp(self.outer.content)
-
-    class _FakeOpenAI:
-        def __init__(self, content):
-            self.content = content
-            # mimic the .chat.completions.create(...) path
-            self.chat = type("obj", (), {"completions": _FakeChat(self)})
-
-    # JSON the LLM would return
-    llm_json = json.dumps({
-        "address": "334 Wilshire Blvd",
-        "datetime": "2025-06-20 10:00",
-        "county": "Los Angeles"
-    })
-
-    import main as appmod
-    appmod.openai_client = _FakeOpenAI(llm_json)
+    # Stand in for the OpenAI call with the fields the LLM would return.
+    import app.email_parser as ep
+    monkeypatch.setattr(ep, "USE_LLM", True)
+    monkeypatch.setattr(ep, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(ep, "_llm_extract", lambda text: ("334 Wilshire Blvd", "2025-06-20 10:00", "Los Angeles"))
 
     # Body without labels; only LLM can parse it.
     payload = {
@@ -259,4 +228,4 @@ def test_inbound_llm_fallback(monkeypatch):
     assert data["parsed"]["address"] == "334 Wilshire Blvd"
     assert data["parsed"]["datetime"] == "2025-06-20 10:00"
     assert data["parsed"]["county"] == "Los Angeles"
-    assert data["match"]["incident_request_id"] == inc.id
+    assert data["match"] == inc.id
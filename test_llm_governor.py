@@ -0,0 +1,150 @@
+# test_llm_governor.py
+import os
+import json
+import threading
+import pytest
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from app.database import SessionLocal, Base, engine
+from app.models import InboundEmail, InboundRaw, InboundIdempotency
+from app.llm_governor import Governor, LLMSaturated
+from app import email_parser, reparse
+
+client = TestClient(app)
+
+FREE_FORM = "Hi, the report for the fire on the old mill road last Tuesday is attached. Thanks"
+
+
+def _hold(gov, started, release):
+    with gov.slot("x"):
+        started.set()
+        release.wait(5)
+
+
+def test_queue_full_and_wait_timeout_are_refused():
+    gov = Governor(max_in_flight=1, queue_max=1, wait_secs=0.05, tokens_per_min=10**6)
+    started, release = threading.Event(), threading.Event()
+    t = threading.Thread(target=_hold, args=(gov, started, release))
+    t.start(); started.wait(5)
+    try:
+        with pytest.raises(LLMSaturated) as e:
+            with gov.slot("y"):
+                pass
+        assert e.value.reason == "wait_timeout"
+
+        gov.waiting = 1  # the queue is taken
+        with pytest.raises(LLMSaturated) as e:
+            with gov.slot("y"):
+                pass
+        assert e.value.reason == "queue_full"
+        gov.waiting = 0
+    finally:
+        release.set(); t.join()
+    with gov.slot("y"):
+        assert gov.in_flight == 1
+    assert gov.in_flight == 0
+
+
+def test_token_budget_is_reserved_and_settled_with_usage():
+    gov = Governor(max_in_flight=4, queue_max=0, wait_secs=0, tokens_per_min=1000)
+    with gov.slot("a" * 400) as ticket:  # 100 prompt + LLM_MAX_OUTPUT_TOKENS reserved
+        assert gov.stats()["tokens_available"] <= 1000 - ticket.reserved
+        ticket.used = 50
+    assert gov.stats()["tokens_available"] >= 950
+    gov.tokens = 0
+    with pytest.raises(LLMSaturated) as e:
+        with gov.slot("a" * 400):
+            pass
+    assert e.value.reason == "budget"
+
+
+def test_admitted_call_uses_shared_client_and_reports_usage(monkeypatch):
+    gov = Governor(max_in_flight=1, queue_max=0, wait_secs=0, tokens_per_min=10000)
+    content = json.dumps({"address": "1 Mill Rd", "datetime": "2025-01-07 10:00", "county": "Kern"})
+    calls = []
+
+    def create(**kw):
+        calls.append(kw)
+        return SimpleNamespace(usage=SimpleNamespace(total_tokens=120),
+                               choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(email_parser, "GOVERNOR", gov)
+    monkeypatch.setattr(email_parser, "get_client", lambda key: fake)
+    assert email_parser._llm_extract(FREE_FORM) == ("1 Mill Rd", "2025-01-07 10:00", "Kern")
+    assert calls[0]["timeout"] > 0 and calls[0]["max_tokens"] == email_parser.LLM_MAX_OUTPUT_TOKENS
+    assert 10000 - 120 - 1 <= gov.stats()["tokens_available"] <= 10000
+
+
+def test_saturated_governor_degrades_to_regex_and_marks_row_for_reparse(monkeypatch, tmp_path):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for m in (InboundIdempotency, InboundRaw, InboundEmail):
+            db.query(m).delete()
+        db.commit()
+    finally:
+        db.close()
+    monkeypatch.setattr(email_parser, "USE_LLM", True)
+    monkeypatch.setattr(email_parser, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(email_parser, "GOVERNOR", Governor(tokens_per_min=0))
+    monkeypatch.setattr(email_parser, "get_client", lambda key: pytest.fail("LLM called while saturated"))
+
+    r = client.post("/inbound", data={"from": "c@example.gov", "subject": "Re", "text": FREE_FORM,
+                                      "headers": "Message-ID: <llm-deferred@test>\n"}).json()
+    assert r["parsed"] == {"address": "", "datetime": "", "county": ""}
+    labeled = client.post("/inbound", data={"from": "c@example.gov", "subject": "Re",
+                                            "text": "Address: 5 Oak Ave\nDate/Time: 2025-03-03 03:00\nCounty: Kern",
+                                            "headers": "Message-ID: <llm-not-needed@test>\n"}).json()
+
+    db = SessionLocal()
+    try:
+        rows = {e.id: e for e in db.query(InboundEmail).all()}
+        assert rows[r["inbound_id"]].needs_llm is True
+        assert rows[labeled["inbound_id"]].needs_llm is False
+
+        # the backlog run picks the row up even though its parser_version is current
+        db.query(InboundRaw).filter(InboundRaw.inbound_id == r["inbound_id"]).delete()
+        db.query(InboundEmail).filter(InboundEmail.id == r["inbound_id"]).update(
+            {"body": "Address: 1 Mill Rd\nDate/Time: 2025-01-07 10:00\nCounty: Kern"})
+        db.commit()
+        assert reparse.run(db, workers=1, checkpoint=tmp_path / "cp.json")["scanned"] == 0
+        out = reparse.run(db, workers=1, checkpoint=tmp_path / "cp.json", allow_llm=True)
+        assert (out["scanned"], out["updated"]) == (1, 1)
+        db.expire_all()
+        row = db.get(InboundEmail, r["inbound_id"])
+        assert (row.parsed_address, row.needs_llm) == ("1 Mill Rd", False)
+    finally:
+        db.close()
+
+    from app import profiling
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "test-admin")
+    assert client.get("/admin/llm").status_code == 403
+    stats = client.get("/admin/llm", headers={"X-Admin-Token": "test-admin"}).json()
+    assert set(stats) >= {"in_flight", "waiting", "tokens_available"}
+
+def test_inbound_parses_off_the_event_loop(monkeypatch):
+    import asyncio
+    threads = []
+
+    def parse(text, html="", sender=""):
+        try:
+            asyncio.get_running_loop()
+            threads.append("loop")
+        except RuntimeError:
+            threads.append("worker")  # a blocking LLM call here leaves the loop free
+        return email_parser.ParseResult("", "", "", "none")
+    monkeypatch.setattr(email_parser, "parse_inbound", parse)
+    r = client.post("/inbound", data={"from": "a@example.gov", "subject": "Re", "text": FREE_FORM,
+                                      "headers": "Message-ID: <off-loop-1@test>\n"})
+    assert r.status_code == 200 and threads == ["worker"]
@@ -0,0 +1,41 @@
+# test_metrics.py
+import os
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from app.database import Base, engine
+from app import metrics
+
+client = TestClient(app)
+
+def test_histogram_render_is_cumulative():
+    h = metrics.Histogram("t_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 5.0):
+        h.observe(v, stage="x")
+    lines = h.render()
+    assert 't_seconds_bucket{stage="x",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{stage="x",le="1"} 2' in lines
+    assert 't_seconds_bucket{stage="x",le="+Inf"} 3' in lines
+    assert 't_seconds_count{stage="x"} 3' in lines
+
+def test_inbound_populates_stage_and_outcome_metrics():
+    Base.metadata.create_all(bind=engine)
+    before = metrics.PARSER_OUTCOMES.value(outcome="regex_raw")
+    client.post("/inbound", data={"from": "a@example.com", "subject": "m",
+                                  "text": "Address: 9 Elm St\nDate/Time: 2025-01-01 09:00\nCounty: Nowhere",
+                                  "headers": "Message-ID: <metrics-test@x>\n"})
+    assert metrics.PARSER_OUTCOMES.value(outcome="regex_raw") == before + 1
+    assert metrics.INBOUND_STAGE.count(stage="parse") >= 1
+
+    body = client.get("/metrics").text
+    assert 'irh_http_request_duration_seconds_count{method="POST",route="/inbound",status="200"}' in body
+    assert "irh_match_total" in body
+    assert "irh_db_pool_checkouts" in body
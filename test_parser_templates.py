@@ -0,0 +1,81 @@
+# test_parser_templates.py
+import os
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from app.database import SessionLocal, Base, engine
+from app.models import IncidentRequest, InboundEmail, InboundRaw, InboundIdempotency, ParserTemplate
+from app.raw_store import build_raw
+from app import parser_templates
+from app.email_parser import parse_inbound
+
+KERN = "Records <records@kerncounty.example.gov>"
+
+def _kern_reply(addr, dt, county="Kern"):
+    return (f"Good afternoon,\n\nIncident Location - {addr}\nDate of Loss: {dt}\n"
+            f"Jurisdiction {county}\n\nThe report is attached.\n> Address: 1 Old St")
+
+def test_derive_skips_generic_and_inconsistent_labels():
+    samples = [(KERN, _kern_reply(f"{i} Main St", f"2025-01-0{i} 10:00"), "",
+                {"address": f"{i} Main St", "datetime": f"2025-01-0{i} 10:00", "county": "Kern"}) for i in range(1, 5)]
+    samples.append(("a@plain.example.gov", "Address: 9 Elm\nDate/Time: x\nCounty: Inyo", "",
+                    {"address": "9 Elm", "datetime": "x", "county": "Inyo"}))
+    out = parser_templates.derive(samples, min_support=3)
+    assert set(out) == {"kerncounty.example.gov"}
+    assert out["kerncounty.example.gov"]["labels"] == {"address": "Incident Location -", "datetime": "Date of Loss:",
+                                                      "county": "Jurisdiction"}
+
+def test_learned_template_parses_before_generic_cascade():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for m in (InboundIdempotency, InboundRaw, InboundEmail, IncidentRequest, ParserTemplate):
+            db.query(m).delete()
+        db.commit()
+        for i in range(1, 4):
+            addr, dt = f"{i}0 Chester Ave", f"2025-02-0{i} 08:15"
+            req = IncidentRequest(created_by="u", requester_email="u@x", incident_address=addr,
+                                  incident_datetime=dt, county="Kern", county_email="c@x")
+            db.add(req); db.flush()
+            row = InboundEmail(sender=KERN, subject="Re", body="", matched_request_id=req.id)
+            row.raw = build_raw(_kern_reply(addr, dt), "", "")
+            db.add(row)
+        db.commit()
+
+        learned = parser_templates.learn(db)
+        assert "kerncounty.example.gov" in learned
+    finally:
+        db.close()
+
+    res = parse_inbound(_kern_reply("77 Truxtun Ave", "2025-03-09 11:45"), "", KERN)
+    assert res == ("77 Truxtun Ave", "2025-03-09 11:45", "Kern", "template")
+    # other senders still go through the generic path
+    assert parse_inbound(_kern_reply("77 Truxtun Ave", "x"), "", "x@other.example.gov").source == "none"
+
+def test_stale_cache_answers_at_once_and_reloads_in_the_background(monkeypatch):
+    import threading
+    tpl = parser_templates.compile_template("slow.example.gov", {})
+    monkeypatch.setitem(parser_templates._CACHE, "by_domain", {"slow.example.gov": tpl})
+    monkeypatch.setitem(parser_templates._CACHE, "loaded_at", 0.0)  # long expired
+    release, threads = threading.Event(), []
+
+    def slow_load(db):
+        threads.append(threading.current_thread().name)
+        release.wait(5)
+    monkeypatch.setattr(parser_templates, "load", slow_load)
+
+    assert parser_templates.lookup("slow.example.gov") is tpl  # not blocked by the reload
+    assert parser_templates.lookup("slow.example.gov") is tpl  # nor does it start a second one
+    release.set()
+    for t in threading.enumerate():
+        if t.name == "parser-templates-reload":
+            t.join(5)
+    assert threads == ["parser-templates-reload"]
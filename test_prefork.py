@@ -0,0 +1,46 @@
+# test_prefork.py
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def test_prefork_workers_share_listener_and_report_memory(tmp_path):
+    port = _free_port()
+    env = {**os.environ, "ADMIN_TOKEN": "prefork-admin", "DATABASE_URL": f"sqlite:///{tmp_path}/prefork.db",
+           "STARTUP_MODE": "off", "PREFORK_MEM_REPORT_SECS": "0"}
+    proc = subprocess.Popen([sys.executable, "-m", "app.prefork", "--workers", "2", "--host", "127.0.0.1",
+                             "--port", str(port), "--log-level", "warning"], cwd=ROOT, env=env)
+    try:
+        base = f"http://127.0.0.1:{port}"
+        deadline = time.time() + 30
+        while True:
+            try:
+                if httpx.get(f"{base}/ping", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            assert time.time() < deadline, "prefork server did not come up"
+            time.sleep(0.2)
+
+        r = httpx.get(f"{base}/admin/workers", headers={"X-Admin-Token": "prefork-admin"}, timeout=5)
+        report = r.json()
+        assert report["mode"] == "prefork"
+        assert report["master"]["pid"] == proc.pid
+        assert len(report["workers"]) == 2
+        assert all(w["rss_kb"] > 0 for w in report["workers"])
+        assert httpx.get(f"{base}/admin/workers", timeout=5).status_code == 403
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=15) == 0
@@ -0,0 +1,78 @@
+# test_profiling.py
+import os
+import sys
+import time
+import threading
+import contextvars
+import pytest
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from app import profiling
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "test-admin"}
+
+@pytest.fixture(autouse=True)
+def _admin(monkeypatch):
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "test-admin")
+    monkeypatch.setattr(profiling, "_PROFILES", type(profiling._PROFILES)())
+
+def test_profile_needs_the_admin_token_and_listing_is_gated():
+    assert "x-profile-id" not in client.get("/healthz", headers={"X-Profile": "1"}).headers
+    r = client.get("/healthz", headers={**ADMIN, "X-Profile": "1"})
+    pid = r.headers["x-profile-id"]
+    assert client.get("/admin/profiles").status_code == 403
+    assert client.get(f"/admin/profiles/{pid}").status_code == 403
+    assert [p["request_id"] for p in client.get("/admin/profiles", headers=ADMIN).json()["profiles"]] == [pid]
+    assert client.get(f"/admin/profiles/{pid}", headers=ADMIN).json()["path"] == "/healthz"
+
+def test_request_id_is_only_reused_when_safe_and_free(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path / "profiles"))
+    h = {**ADMIN, "X-Profile": "1"}
+    assert client.get("/healthz", headers={**h, "X-Request-ID": "req-1"}).headers["x-profile-id"] == "req-1"
+    again = client.get("/healthz", headers={**h, "X-Request-ID": "req-1"}).headers["x-profile-id"]
+    assert again != "req-1"  # never overwrites a stored profile
+    evil = client.get("/healthz", headers={**h, "X-Request-ID": "../../escape"}).headers["x-profile-id"]
+    assert "/" not in evil and "." not in evil
+    assert not (tmp_path / "escape.json").exists()
+    assert sorted(p.name for p in (tmp_path / "profiles").iterdir()) == sorted(
+        f"{i}.{ext}" for i in ("req-1", again, evil) for ext in ("collapsed", "json"))
+
+def _spin_marked(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+def _spin_other(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+def test_sampler_keeps_only_the_profiled_requests_threads():
+    marker, stop = object(), threading.Event()
+    ctx = contextvars.copy_context()
+    ctx.run(profiling._CURRENT.set, marker)
+
+    def worker(context):  # shaped like a threadpool worker: runs the work inside context.run
+        context.run(_spin_marked, stop)
+
+    threads = [threading.Thread(target=worker, args=(ctx,)), threading.Thread(target=_spin_other, args=(stop,))]
+    sampler = profiling._Sampler(0.002, threading.get_ident(), sys._getframe(), marker)
+    for t in threads:
+        t.start()
+    sampler.start()
+    time.sleep(0.1)
+    sampler.stop()
+    stop.set()
+    for t in threads:
+        t.join()
+    assert sampler.samples > 0
+    stacks = "".join(sampler.stacks)
+    assert "_spin_marked" in stacks and "_spin_other" not in stacks
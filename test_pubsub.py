@@ -0,0 +1,107 @@
+# test_pubsub.py
+import os
+import json
+import asyncio
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from app.database import SessionLocal, Base, engine
+from app.models import IncidentRequest
+from app import pubsub
+from app.pubsub import BROKER, stream
+from app.request_status import mark_sent, mark_replied
+
+client = TestClient(app)
+
+def _request(user):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        req = IncidentRequest(created_by=user, incident_address="1 Stream St", incident_datetime="2025-01-01 10:00",
+                              county="Kern", county_email="k@example.gov")
+        db.add(req); db.commit()
+        return req.id
+    finally:
+        db.close()
+
+def _write(fn, commit=True):
+    db = SessionLocal()
+    try:
+        fn(db)
+        db.commit() if commit else db.rollback()
+    finally:
+        db.close()
+
+async def _frames(gen, n):
+    return [await asyncio.wait_for(gen.__anext__(), 5) for _ in range(n)]
+
+def test_committed_status_changes_reach_only_the_owners_stream():
+    rid, other = _request("stream-a"), _request("stream-b")
+
+    async def scenario():
+        sub = BROKER.subscribe("stream-a")
+        gen = stream(sub, lambda: asyncio.sleep(0, False))
+        assert "connected" in (await _frames(gen, 1))[0]
+        loop = asyncio.get_running_loop()
+        # writes happen in worker threads, like sync endpoints
+        await loop.run_in_executor(None, _write, lambda db: mark_sent(db, rid, "sg-x"), False)  # rolled back
+        await loop.run_in_executor(None, _write, lambda db: mark_sent(db, other, "sg-y"))         # someone else's
+        await loop.run_in_executor(None, _write, lambda db: mark_sent(db, rid, "sg-z"))
+        await loop.run_in_executor(None, _write, lambda db: mark_replied(db, [(rid, 99)]))
+        frames = await _frames(gen, 2)
+        await gen.aclose()
+        return frames
+
+    frames = asyncio.run(scenario())
+    events = [dict(ln.split(": ", 1) for ln in f.strip().splitlines()) for f in frames]
+    assert [e["event"] for e in events] == ["status", "status"]
+    assert [json.loads(e["data"])["status"] for e in events] == ["sent", "replied"]
+    assert json.loads(events[1]["data"])["id"] == rid and json.loads(events[1]["data"])["reply_count"] == 1
+    assert BROKER.connections() == 0
+
+def test_slow_client_gets_resync_and_idle_disconnect_unsubscribes(monkeypatch):
+    monkeypatch.setattr(pubsub, "SSE_HEARTBEAT_SECS", 0.05)
+
+    async def scenario():
+        sub = pubsub.Subscriber("slow", asyncio.get_running_loop(), buffer=2)
+        with BROKER._lock:
+            BROKER._subs.setdefault("slow", set()).add(sub)
+            BROKER._n += 1
+        gone = asyncio.Event()
+
+        async def is_disconnected():
+            return gone.is_set()
+
+        gen = stream(sub, is_disconnected)
+        await _frames(gen, 1)
+        for n in range(5):
+            BROKER.publish("slow", {"n": n})
+        await asyncio.sleep(0.01)
+        frames = await _frames(gen, 3)
+        ping = (await _frames(gen, 1))[0]
+        gone.set()
+        rest = [f async for f in gen]
+        return frames, ping, rest
+
+    frames, ping, rest = asyncio.run(scenario())
+    assert frames[0].startswith("event: resync")
+    assert [json.loads(f.split("data: ")[1])["n"] for f in frames[1:]] == [3, 4]
+    assert ping == ": ping\n\n" and rest == []
+    assert BROKER.connections() == 0
+
+def test_stream_endpoint_requires_auth_and_caps_connections(monkeypatch):
+    assert client.get("/incident_requests/events").status_code == 401
+    assert client.get("/incident_requests/events?access_token=bogus").status_code == 401
+    client.post("/register", json={"username": "stream-c", "password": "pw-123456", "email": "c@example.com"})
+    tok = client.post("/token", data={"username": "stream-c", "password": "pw-123456"}).json()["access_token"]
+    monkeypatch.setattr(pubsub, "SSE_MAX_CONNECTIONS", 0)
+    r = client.get(f"/incident_requests/events?access_token={tok}")
+    assert r.status_code == 503 and r.headers["Retry-After"] == "30"
@@ -0,0 +1,54 @@
+# test_raw_store.py
+import os
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from app.database import Base, engine
+from app.raw_store import compress, decompress, CODEC, PREVIEW_CHARS
+
+client = TestClient(app)
+
+def test_compress_roundtrip():
+    s = "Address: 1 Main St\n" + "> quoted line\n" * 500
+    blob = compress(s)
+    assert len(blob) < len(s) // 5
+    assert decompress(blob, CODEC) == s
+    assert compress("") is None and decompress(None, CODEC) == ""
+
+def test_inbound_keeps_full_body_out_of_line(monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    from app.database import SessionLocal
+    from app.models import InboundEmail, InboundRaw, InboundIdempotency
+    db = SessionLocal()
+    try:
+        db.query(InboundIdempotency).delete(); db.query(InboundRaw).delete(); db.query(InboundEmail).delete()
+        db.commit()
+    finally:
+        db.close()
+    text = "No labels here.\n" + "x" * 25000 + "\nEND"
+    resp = client.post("/inbound", data={"from": "a@example.com", "subject": "long", "text": text,
+                                         "html": "<p>hi</p>", "headers": "Message-ID: <long-body@test>\n"})
+    inbound_id = resp.json()["inbound_id"]
+
+    from app import profiling
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "test-admin")
+    assert client.get(f"/admin/inbound/{inbound_id}/raw").status_code == 403
+    raw = client.get(f"/admin/inbound/{inbound_id}/raw", headers={"X-Admin-Token": "test-admin"}).json()
+    assert raw["text"] == text  # no truncation
+    assert raw["html"] == "<p>hi</p>"
+    assert "Message-ID" in raw["headers"]
+    assert raw["stored_bytes"] < raw["raw_bytes"]
+
+    db = SessionLocal()
+    try:
+        assert len(db.get(InboundEmail, inbound_id).body) == PREVIEW_CHARS
+    finally:
+        db.close()
@@ -0,0 +1,102 @@
+# test_read_replica.py
+import os
+import pytest
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from sqlalchemy.orm import sessionmaker
+from app import database, http_cache, profiling
+from app.database import SessionLocal, Base, engine
+from app.models import MatchReview
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "test-admin"}
+
+def _seed(session_factory, top_score):
+    db = session_factory()
+    try:
+        db.query(MatchReview).delete()
+        db.add(MatchReview(inbound_id=1, candidates="[]", top_score=top_score))
+        db.commit()
+    finally:
+        db.close()
+
+@pytest.fixture(autouse=True)
+def replica(monkeypatch, tmp_path):
+    """A second local database standing in for the replica (no replication: rows differ on purpose)."""
+    eng = database._replica_engine(f"sqlite:///{tmp_path}/replica.db")
+    Base.metadata.create_all(bind=eng)
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(database, "replica_engine", eng)
+    monkeypatch.setattr(database, "ReplicaSessionLocal", sessionmaker(bind=eng))
+    monkeypatch.setattr(database, "DB_REPLICA_CHECK_SECS", 0)
+    monkeypatch.setattr(database, "_REPLICA", {"lag": None, "error": None, "checked_at": None})
+    monkeypatch.setattr(database, "_READS", {"replica": 0, "primary": 0})
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "test-admin")
+    _seed(SessionLocal, 0.1)
+    _seed(database.ReplicaSessionLocal, 0.9)
+    http_cache.CACHE.clear()
+    yield eng
+    eng.dispose()
+
+def _top_score():
+    http_cache.CACHE.clear()
+    return client.get("/admin/match-reviews", headers=ADMIN).json()["reviews"][0]["top_score"]
+
+def test_read_only_endpoints_use_the_replica_and_writes_stay_on_the_primary():
+    assert _top_score() == 0.9
+    stats = client.get("/admin/db/replica", headers=ADMIN).json()
+    assert stats["using"] == "replica" and stats["lag_s"] == 0.0 and stats["reads"]["replica"] == 1
+    db = SessionLocal()
+    try:
+        assert db.query(MatchReview).one().top_score == 0.1
+    finally:
+        db.close()
+    assert 'irh_db_read_sessions{target="replica"} 1' in client.get("/metrics").text
+
+def test_lagging_replica_falls_back_to_the_primary(monkeypatch):
+    monkeypatch.setattr(database, "_measure_replica_lag", lambda: database.DB_REPLICA_MAX_LAG_SECS + 30)
+    assert _top_score() == 0.1
+    monkeypatch.setattr(database, "_measure_replica_lag", lambda: 0.2)
+    assert _top_score() == 0.9
+
+def test_unreachable_replica_falls_back_to_the_primary(monkeypatch):
+    def down():
+        raise ConnectionError("replica down")
+    monkeypatch.setattr(database, "_measure_replica_lag", down)
+    assert _top_score() == 0.1
+    stats = database.replica_stats()
+    assert stats["using"] == "primary" and stats["lag_s"] is None and "replica down" in stats["error"]
+
+def test_lag_is_not_remeasured_within_the_check_interval(monkeypatch):
+    calls = []
+    monkeypatch.setattr(database, "DB_REPLICA_CHECK_SECS", 60)
+    monkeypatch.setattr(database, "_measure_replica_lag", lambda: calls.append(1) or 0.0)
+    for _ in range(3):
+        assert database.use_replica()
+    assert len(calls) == 1
+
+def test_postgres_lag_reading_needs_a_streaming_receiver():
+    assert database._pg_lag(True, 1.5, True) == 1.5
+    assert database._pg_lag(True, 0, True) == 0.0       # replay caught up: an idle primary is not lag
+    assert database._pg_lag(False, None, False) == 0.0   # not a standby
+    with pytest.raises(RuntimeError, match="streaming"):
+        database._pg_lag(True, 0.0, False)             # receiver gone: replay stalls, never "0 lag"
+    with pytest.raises(RuntimeError):
+        database._pg_lag(True, None, True)
+
+def test_forked_workers_drop_the_inherited_replica_pool(monkeypatch, replica):
+    from app import prefork
+    disposed = []
+    monkeypatch.setattr(replica, "dispose", lambda close=True: disposed.append(close))
+    monkeypatch.setattr(prefork.gc, "enable", lambda: None)
+    prefork._after_fork_in_worker()
+    assert disposed == [False]  # the parent's sockets stay open
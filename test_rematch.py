@@ -0,0 +1,177 @@
+# test_rematch.py
+import os
+import pytest
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from app.database import SessionLocal, Base, engine
+from app.models import User, IncidentRequest, InboundEmail, InboundRaw, InboundIdempotency, StoredAttachment
+from app.matching import rematch
+import app.attachment_store as store_mod
+import app.routes_inbound as inbound_mod
+import app.routes_requests as requests_mod
+
+client = TestClient(app)
+
+MSG = "Address: 77 Mission St\nDate/Time: 2025-08-09 14:30\nCounty: san francisco"
+
+@pytest.fixture(autouse=True)
+def _fresh_db(monkeypatch, tmp_path):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for m in (InboundIdempotency, InboundRaw, InboundEmail, IncidentRequest, StoredAttachment):
+            db.query(m).delete()
+        db.query(User).filter(User.username == "rematcher").delete()
+        db.commit()
+    finally:
+        db.close()
+    monkeypatch.setattr(store_mod, "ATTACHMENT_DIR", tmp_path / "store")
+    monkeypatch.setattr(requests_mod, "send_request_email", lambda **kw: "sg-req")
+    monkeypatch.setattr(requests_mod, "get_county_email", lambda c, state=None: "records@sf.example.gov")
+    sent = []
+    monkeypatch.setattr(inbound_mod, "send_attachments_to_user", lambda **kw: sent.append(kw) or "sg-fwd")
+    monkeypatch.setattr(inbound_mod, "send_alert_no_attachments", lambda **kw: sent.append(kw) or "sg-alert")
+    yield sent
+
+def _token():
+    client.post("/register", json={"username": "rematcher", "password": "pw-123456", "email": "req@example.com"})
+    return client.post("/token", data={"username": "rematcher", "password": "pw-123456"}).json()["access_token"]
+
+def test_reply_before_request_is_matched_and_forwarded_on_create(_fresh_db):
+    reply = client.post("/inbound", data={"from": "sf@example.gov", "subject": "Re: report", "text": MSG,
+                                          "attachments": "1"},
+                        files={"attachment1": ("report.pdf", b"%PDF-1.4 early", "application/pdf")}).json()
+    assert reply["match"] is None and not _fresh_db
+
+    r = client.post("/incident_request", headers={"Authorization": f"Bearer {_token()}"},
+                    json={"incident_address": "77 Mission St", "incident_datetime": "2025-08-09 14:30",
+                          "county": "San Francisco"})
+    request_id = r.json()["request_id"]
+
+    (fwd,) = _fresh_db
+    assert fwd["to_email"] == "req@example.com"
+    assert [f["filename"] for f in fwd["files"]] == ["report.pdf"]
+    with open(fwd["files"][0]["path"], "rb") as fh:
+        assert fh.read() == b"%PDF-1.4 early"
+
+    db = SessionLocal()
+    try:
+        row = db.get(InboundEmail, reply["inbound_id"])
+        assert row.matched_request_id == request_id
+        assert row.forwarded_to == "req@example.com" and row.forward_sg_message_id == "sg-fwd"
+        # already matched: a second run claims nothing and forwards nothing
+        assert rematch(db) == []
+    finally:
+        db.close()
+    assert len(_fresh_db) == 1
+
+def test_live_match_normalizes_county_case(_fresh_db):
+    db = SessionLocal()
+    try:
+        db.add(IncidentRequest(created_by="x", requester_email="x@example.com", incident_address="77 Mission St",
+                               incident_datetime="2025-08-09 14:30", county="San Francisco", county_email="c@x"))
+        db.commit()
+    finally:
+        db.close()
+    reply = client.post("/inbound", data={"from": "sf@example.gov", "subject": "Re: report", "text": MSG}).json()
+    assert reply["match"] is not None
+    assert _fresh_db[0]["to_email"] == "x@example.com"
+
+def test_failed_forward_is_retried_by_the_next_run(_fresh_db, monkeypatch):
+    import app.matching as matching_mod
+    def down(**kw):
+        raise ConnectionError("sendgrid down")
+    monkeypatch.setattr(inbound_mod, "send_alert_no_attachments", down)
+    reply = client.post("/inbound", data={"from": "sf@example.gov", "subject": "Re: report", "text": MSG}).json()
+    client.post("/incident_request", headers={"Authorization": f"Bearer {_token()}"},
+                json={"incident_address": "77 Mission St", "incident_datetime": "2025-08-09 14:30",
+                      "county": "San Francisco"})
+    db = SessionLocal()
+    try:
+        row = db.get(InboundEmail, reply["inbound_id"])
+        assert row.matched_request_id is not None and row.forwarded_at is None  # claimed, not forwarded
+
+        monkeypatch.setattr(inbound_mod, "send_alert_no_attachments", lambda **kw: _fresh_db.append(kw) or "sg-alert")
+        assert rematch(db) == [] and not _fresh_db  # still within the grace period: maybe in flight
+        monkeypatch.setattr(matching_mod, "REMATCH_FORWARD_GRACE_SECS", -1)
+        assert rematch(db) == []                    # nothing new to claim, but the stuck reply goes out
+        assert [f["to_email"] for f in _fresh_db] == ["req@example.com"]
+        db.expire_all()
+        assert db.get(InboundEmail, reply["inbound_id"]).forwarded_at is not None
+        rematch(db)
+        assert len(_fresh_db) == 1                  # and only once
+    finally:
+        db.close()
+
+def test_retry_after_a_failed_forward_sends_the_real_files(_fresh_db, monkeypatch):
+    import app.matching as matching_mod
+    db = SessionLocal()
+    try:
+        db.add(IncidentRequest(created_by="x", requester_email="x@example.com", incident_address="77 Mission St",
+                               incident_datetime="2025-08-09 14:30", county="San Francisco", county_email="c@x"))
+        db.commit()
+    finally:
+        db.close()
+    def down(**kw):
+        raise ConnectionError("sendgrid down")
+    monkeypatch.setattr(inbound_mod, "send_attachments_to_user", down)
+    reply = client.post("/inbound", data={"from": "sf@example.gov", "subject": "Re: report", "text": MSG,
+                                          "attachments": "1"},
+                        files={"attachment1": ("report.pdf", b"%PDF-1.4 retry", "application/pdf")}).json()
+    assert reply["match"] is not None and not _fresh_db
+
+    monkeypatch.setattr(inbound_mod, "send_attachments_to_user", lambda **kw: _fresh_db.append(kw) or "sg-fwd")
+    monkeypatch.setattr(matching_mod, "REMATCH_FORWARD_GRACE_SECS", -1)
+    db = SessionLocal()
+    try:
+        rematch(db)
+    finally:
+        db.close()
+    (fwd,) = _fresh_db  # the files, never the "no attachments" alert
+    assert fwd["to_email"] == "x@example.com" and [f["filename"] for f in fwd["files"]] == ["report.pdf"]
+    with open(fwd["files"][0]["path"], "rb") as fh:
+        assert fh.read() == b"%PDF-1.4 retry"
+
+def test_retry_never_claims_a_reply_has_no_attachments_when_they_are_gone(_fresh_db, monkeypatch):
+    import app.matching as matching_mod
+    db = SessionLocal()
+    try:
+        req = IncidentRequest(created_by="x", requester_email="x@example.com", incident_address="77 Mission St",
+                              incident_datetime="2025-08-09 14:30", county="San Francisco", county_email="c@x")
+        db.add(req); db.flush()
+        row = InboundEmail(sender="sf@example.gov", subject="Re", body="", matched_request_id=req.id,
+                           has_attachments=True, attachment_count=1)
+        db.add(row); db.commit()
+        monkeypatch.setattr(matching_mod, "REMATCH_FORWARD_GRACE_SECS", -1)
+        rematch(db)
+        assert not _fresh_db
+        db.expire_all()
+        assert db.get(InboundEmail, row.id).forward_status == "attachments_missing"
+    finally:
+        db.close()
+
+def test_waiting_reply_is_matched_even_when_the_county_send_fails(_fresh_db, monkeypatch):
+    reply = client.post("/inbound", data={"from": "sf@example.gov", "subject": "Re: report", "text": MSG}).json()
+    assert reply["match"] is None
+    def boom(**kw):
+        raise RuntimeError("sendgrid 500")
+    monkeypatch.setattr(requests_mod, "send_request_email", boom)
+    r = client.post("/incident_request", headers={"Authorization": f"Bearer {_token()}"},
+                    json={"incident_address": "77 Mission St", "incident_datetime": "2025-08-09 14:30",
+                          "county": "San Francisco"})
+    assert r.status_code == 500 and "Failed to send email" in r.json()["detail"]
+    db = SessionLocal()
+    try:
+        assert db.get(InboundEmail, reply["inbound_id"]).matched_request_id is not None
+    finally:
+        db.close()
+    assert [f["to_email"] for f in _fresh_db] == ["req@example.com"]
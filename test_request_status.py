@@ -0,0 +1,132 @@
+# test_request_status.py
+import os
+import itertools
+import pytest
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from app.database import SessionLocal, Base, engine
+from app.models import User, IncidentRequest, InboundEmail, InboundRaw, InboundIdempotency, MatchReview
+import app.routes_inbound as inbound_mod
+import app.routes_requests as requests_mod
+
+client = TestClient(app)
+_ids = itertools.count(1)
+
+@pytest.fixture(autouse=True)
+def _fresh_db(monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for m in (InboundIdempotency, InboundRaw, InboundEmail, IncidentRequest, MatchReview):
+            db.query(m).delete()
+        db.query(User).filter(User.username.in_(("status-a", "status-b"))).delete()
+        db.commit()
+    finally:
+        db.close()
+    monkeypatch.setattr(requests_mod, "send_request_email", lambda **kw: f"sg-req-{next(_ids)}")
+    monkeypatch.setattr(requests_mod, "get_county_email", lambda c, state=None: "records@county.example.gov")
+    monkeypatch.setattr(inbound_mod, "send_attachments_to_user", lambda **kw: "sg-fwd-1")
+    monkeypatch.setattr(inbound_mod, "send_alert_no_attachments", lambda **kw: "sg-fwd-1")
+    monkeypatch.setattr(inbound_mod, "SENDGRID_EVENT_TOKEN", "s3cret")
+    monkeypatch.setattr(inbound_mod, "SENDGRID_EVENT_PUBLIC_KEY", None)
+
+EVENTS_AUTH = ("sendgrid", "s3cret")  # basic auth, as configured in the webhook URL
+
+def _auth(user):
+    client.post("/register", json={"username": user, "password": "pw-123456", "email": f"{user}@example.com"})
+    tok = client.post("/token", data={"username": user, "password": "pw-123456"}).json()["access_token"]
+    return {"Authorization": f"Bearer {tok}"}
+
+def _create(headers, address, dt="2025-08-09 14:30", county="San Francisco"):
+    r = client.post("/incident_request", headers=headers,
+                    json={"incident_address": address, "incident_datetime": dt, "county": county})
+    return r.json()["request_id"]
+
+def _mine(headers, **params):
+    return client.get("/incident_requests/mine", headers=headers, params=params).json()
+
+def test_mine_lists_only_own_requests_newest_first_with_keyset_pages():
+    a, b = _auth("status-a"), _auth("status-b")
+    ids = [_create(a, f"{n} Mission St") for n in (1, 2, 3)]
+    _create(b, "9 Elsewhere Ave")
+
+    page = _mine(a, limit=2)
+    assert [r["id"] for r in page["requests"]] == ids[:0:-1]
+    assert page["requests"][0]["status"] == "sent" and page["requests"][0]["sent_at"]
+    rest = _mine(a, limit=2, cursor=page["next_cursor"])
+    assert [r["id"] for r in rest["requests"]] == ids[:1] and rest["next_cursor"] is None
+    assert client.get("/incident_requests/mine").status_code == 401
+
+def test_reply_forward_and_delivery_are_denormalized_onto_the_request():
+    a = _auth("status-a")
+    rid = _create(a, "77 Mission St")
+    reply = client.post("/inbound", data={"from": "sf@example.gov", "subject": "Re: report",
+                                          "text": "Address: 77 Mission St\nDate/Time: 2025-08-09 14:30\nCounty: San Francisco",
+                                          "headers": "Message-ID: <status-1@test>\n"}).json()
+    assert reply["match"] == rid
+    (mine,) = _mine(a)["requests"]
+    assert (mine["status"], mine["reply_count"]) == ("forwarded", 1)
+    assert mine["replied_at"] and mine["forwarded_at"] and mine["delivered_at"] is None
+
+    events = [{"event": "processed", "sg_message_id": "sg-fwd-1.filter0001.1.0"},
+              {"event": "delivered", "sg_message_id": "sg-fwd-1.filter0001.1.0", "timestamp": 1760000000},
+              {"event": "deferred", "sg_message_id": "sg-fwd-1.filter0001.1.0"}]
+    assert client.post("/sendgrid/events", json=events, auth=EVENTS_AUTH).json() == {"received": 3, "applied": 1}  # late deferred is a no-op
+    (mine,) = _mine(a)["requests"]
+    assert mine["status"] == "delivered" and mine["delivered_at"]
+    db = SessionLocal()
+    try:
+        assert db.get(InboundEmail, reply["inbound_id"]).forward_status == "delivered"
+    finally:
+        db.close()
+
+def test_failed_and_bounced_requests_are_marked(monkeypatch):
+    a = _auth("status-a")
+    rid = _create(a, "5 Bounce Way")
+    sg_id = SessionLocal().get(IncidentRequest, rid).request_sg_message_id
+    client.post("/sendgrid/events", json=[{"event": "bounce", "sg_message_id": f"{sg_id}.filter1"}], auth=EVENTS_AUTH)
+
+    def boom(**kw):
+        raise RuntimeError("sendgrid 500")
+    monkeypatch.setattr(requests_mod, "send_request_email", boom)
+    assert client.post("/incident_request", headers=a, json={"incident_address": "6 Fail St",
+                       "incident_datetime": "2025-08-09 14:30", "county": "San Francisco"}).status_code == 500
+    assert [r["status"] for r in _mine(a)["requests"]] == ["send_failed", "send_failed"]
+
+def test_event_webhook_requires_a_token_or_signature(monkeypatch):
+    assert client.post("/sendgrid/events", json=[]).status_code == 403
+    assert client.post("/sendgrid/events?token=s3cret", json=[]).status_code == 403  # never in the query string
+    assert client.post("/sendgrid/events", json=[], auth=("sendgrid", "wrong")).status_code == 403
+    assert client.post("/sendgrid/events", json=[], auth=EVENTS_AUTH).json() == {"received": 0, "applied": 0}
+    assert client.post("/sendgrid/events", json={"event": "x"}, auth=EVENTS_AUTH).status_code == 400
+
+    monkeypatch.setattr(inbound_mod, "SENDGRID_EVENT_TOKEN", None)  # nothing configured: reject everything
+    assert client.post("/sendgrid/events", json=[], auth=EVENTS_AUTH).status_code == 403
+
+def test_event_webhook_accepts_a_valid_sendgrid_signature(monkeypatch):
+    import base64
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    key = ec.generate_private_key(ec.SECP256R1())
+    der = key.public_key().public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    monkeypatch.setattr(inbound_mod, "SENDGRID_EVENT_TOKEN", None)
+    monkeypatch.setattr(inbound_mod, "SENDGRID_EVENT_PUBLIC_KEY", base64.b64encode(der).decode())
+
+    body, ts = b"[]", "1760000000"
+    sig = base64.b64encode(key.sign(ts.encode() + body, ec.ECDSA(hashes.SHA256()))).decode()
+    headers = {"Content-Type": "application/json", "X-Twilio-Email-Event-Webhook-Timestamp": ts}
+    ok = client.post("/sendgrid/events", content=body,
+                     headers={**headers, "X-Twilio-Email-Event-Webhook-Signature": sig})
+    assert ok.json() == {"received": 0, "applied": 0}
+    forged = client.post("/sendgrid/events", content=b'[{"event": "delivered"}]',
+                         headers={**headers, "X-Twilio-Email-Event-Webhook-Signature": sig})
+    assert forged.status_code == 403
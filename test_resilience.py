@@ -0,0 +1,151 @@
+# test_resilience.py
+import os
+import time
+import pytest
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from app.database import SessionLocal, Base, engine
+from app.models import User, IncidentRequest
+from app import resilience, email_io
+import app.routes_requests as requests_mod
+
+client = TestClient(app)
+
+
+class Boom(Exception):
+    pass
+
+
+class ClientError(Exception):
+    status_code = 400
+
+
+@pytest.fixture(autouse=True)
+def _reset_breakers():
+    for br in resilience.BREAKERS.values():
+        br.reset()
+    yield
+    for br in resilience.BREAKERS.values():
+        br.reset()
+
+
+def _fail(dependency, exc=Boom("down")):
+    with pytest.raises(type(exc)):
+        with resilience.protected(dependency, "test", "op"):
+            raise exc
+
+
+def test_breaker_opens_fails_fast_and_recovers_through_half_open(monkeypatch):
+    br = resilience.BREAKERS["openai"]
+    monkeypatch.setattr(br, "failures", 3)
+    monkeypatch.setattr(br, "reset_secs", 0.05)
+    for _ in range(3):
+        _fail("openai")
+    assert br.snapshot()["state"] == "open"
+
+    calls = []
+    with pytest.raises(resilience.CircuitOpen):
+        with resilience.protected("openai", "test", "op"):
+            calls.append(1)
+    assert calls == []
+
+    time.sleep(0.06)
+    _fail("openai")  # the half-open probe fails: open again
+    assert br.snapshot()["state"] == "open"
+
+    time.sleep(0.06)
+    with resilience.protected("openai", "test", "op"):
+        pass
+    snap = br.snapshot()
+    assert (snap["state"], snap["consecutive_failures"]) == ("closed", 0)
+
+
+def test_client_errors_do_not_trip_the_breaker(monkeypatch):
+    monkeypatch.setattr(resilience.BREAKERS["sendgrid_send"], "failures", 2)
+    for _ in range(5):
+        _fail("sendgrid_send", ClientError("bad request"))
+    assert resilience.BREAKERS["sendgrid_send"].snapshot()["state"] == "closed"
+
+
+def test_deadline_caps_call_timeouts_and_rejects_when_spent():
+    assert resilience.timeout_for(20) == 20
+    with resilience.deadline(5):
+        with resilience.deadline(60):  # an outer, earlier deadline wins
+            assert resilience.timeout_for(20) <= 5
+        with resilience.detached():
+            assert resilience.remaining() is None
+    with resilience.deadline(0):
+        with pytest.raises(resilience.DeadlineExceeded):
+            with resilience.protected("openai", "test", "op"):
+                pass
+    assert resilience.remaining() is None
+
+
+def test_send_passes_timeout_and_open_breaker_skips_sendgrid(monkeypatch):
+    seen = []
+
+    class FakeSG:
+        class client:
+            timeout = None
+
+        def send(self, msg):
+            seen.append(self.client.timeout)
+            return "ok"
+
+    monkeypatch.setattr(email_io, "_sg", lambda: FakeSG())
+    with resilience.deadline(3):
+        assert email_io._send(object(), "request") == "ok"
+    assert 0 < seen[0] <= 3
+
+    br = resilience.BREAKERS["sendgrid_send"]
+    for _ in range(br.failures):
+        br.failure(Boom("503"))
+    with pytest.raises(resilience.CircuitOpen):
+        email_io._send(object(), "request")
+    assert len(seen) == 1
+
+
+def test_incident_request_returns_503_while_sendgrid_breaker_is_open(monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.query(IncidentRequest).filter(IncidentRequest.created_by == "breaker-user").delete()
+        db.query(User).filter(User.username == "breaker-user").delete()
+        db.commit()
+    finally:
+        db.close()
+
+    def send(**kw):
+        raise resilience.CircuitOpen("sendgrid_send", 12.4)
+
+    monkeypatch.setattr(requests_mod, "send_request_email", send)
+    monkeypatch.setattr(requests_mod, "get_county_email", lambda c, state=None: "records@sf.example.gov")
+    client.post("/register", json={"username": "breaker-user", "password": "pw-123456", "email": "b@example.com"})
+    token = client.post("/token", data={"username": "breaker-user", "password": "pw-123456"}).json()["access_token"]
+    r = client.post("/incident_request", headers={"Authorization": f"Bearer {token}"},
+                    json={"incident_address": "77 Mission St", "incident_datetime": "2025-08-09 14:30",
+                          "county": "San Francisco"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "12"
+
+
+def test_breaker_state_is_exposed(monkeypatch):
+    from app import profiling
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "test-admin")
+    br = resilience.BREAKERS["sendgrid_activity"]
+    for _ in range(br.failures):
+        br.failure(Boom("timeout"))
+    assert client.get("/admin/breakers").status_code == 403
+    body = client.get("/admin/breakers", headers={"X-Admin-Token": "test-admin"}).json()
+    assert body["sendgrid_activity"]["state"] == "open"
+    assert body["openai"]["state"] == "closed"
+    assert 'irh_circuit_state{dependency="sendgrid_activity"} 2' in client.get("/metrics").text
@@ -0,0 +1,68 @@
+# test_search.py
+import os
+import pytest
+from fastapi.testclient import TestClient
+from dotenv import load_dotenv
+
+# force tests to use the test env file
+load_dotenv(dotenv_path=".env.test", override=True)
+
+# hard stop if pointed at render/prod by mistake
+if "render.com" in (os.getenv("DATABASE_URL") or ""):
+    raise SystemExit("Refusing to run tests against a Render DB. Set a test DATABASE_URL.")
+
+from main import app
+from sqlalchemy import text
+from app.database import SessionLocal, Base, engine
+from app.models import InboundEmail, InboundRaw, InboundIdempotency
+import app.profiling as profiling
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "search-admin"}
+
+@pytest.fixture(autouse=True)
+def _fresh_db(monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for m in (InboundIdempotency, InboundRaw, InboundEmail):
+            db.query(m).delete()
+        db.execute(text("DROP TABLE IF EXISTS inbound_search"))
+        db.commit()
+    finally:
+        db.close()
+    import app.search as search_mod
+    monkeypatch.setattr(search_mod, "_sqlite_ready", False)
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "search-admin")
+
+def _post(i, text_body, subject="Re: report"):
+    r = client.post("/inbound", data={"from": f"clerk{i}@county.example.gov", "subject": subject,
+                                      "text": text_body, "headers": f"Message-ID: <search-{i}@test>\n"})
+    return r.json()["inbound_id"]
+
+def test_search_ranks_and_paginates():
+    ids = [_post(i, f"Case No. 2025-00{i}7 for 334 Wilshire Blvd.\n" + "> quoted\n" * 50) for i in range(5)]
+    other = _post(9, "Address: 12 Oak Ave\nCounty: Fresno", subject="Wilshire records")
+
+    r = client.get("/admin/search", params={"q": "0037"}, headers=ADMIN).json()
+    assert [x["id"] for x in r["results"]] == [ids[3]]
+
+    # prefix match on an address fragment; subject hits (weighted) outrank body hits
+    seen, cursor = [], None
+    while True:
+        params = {"q": "wilsh", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/admin/search", params=params, headers=ADMIN).json()
+        seen += [x["id"] for x in page["results"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen[0] == other
+    assert sorted(seen) == sorted(ids + [other]) and len(seen) == len(set(seen))
+
+    # full body is indexed, not just the stored preview
+    deep = _post(10, "x " * 400 + "\nReference ZX-4411")
+    assert [x["id"] for x in client.get("/admin/search", params={"q": "zx 4411"}, headers=ADMIN).json()["results"]] == [deep]
+
+def test_search_requires_admin_and_valid_cursor():
+    assert client.get("/admin/search", params={"q": "x"}).status_code == 403
+    assert client.get("/admin/search", params={"q": "x", "cursor": "!!"}, headers=ADMIN).status_code == 400